@@ -1,16 +1,33 @@
+import asyncio
+import inspect
 from abc import ABCMeta
 import simplejson as json
 from functools import wraps
 from tornado.web import RequestHandler
 from acolyte.util import log
-from acolyte.util.json import to_json
-from acolyte.core.service import Result
+from acolyte.util.json import to_json_bytes
+from acolyte.util.concurrent import ExecutorFullException
+from acolyte.api.admission import RequestRejectedException
+from acolyte.core.service import Result, PreparedResult
 
 
 class BaseAPIHandler(RequestHandler, metaclass=ABCMeta):
 
+    # 当前进程中正在处理的请求数目，worker平滑退出时会等待其归零
+    inflight = 0
+
     def __init__(self, application, request):
         super().__init__(application, request)
+        self._inflight = False
+
+    def prepare(self):
+        BaseAPIHandler.inflight += 1
+        self._inflight = True
+
+    def on_finish(self):
+        if self._inflight:
+            BaseAPIHandler.inflight -= 1
+            self._inflight = False
 
     def _(self, service_id):
         return BaseAPIHandler.service_container.get_service(service_id)
@@ -22,21 +39,31 @@ class BaseAPIHandler(RequestHandler, metaclass=ABCMeta):
         return json.loads(self.request.body)
 
     def _check_token(self):
-        """检查请求头中的token是否合法
+        """检查请求头中的token是否合法，只校验签名以及本地的吊销黑名单，
+           不会访问数据库，因此直接在IOLoop上执行
         """
         try:
             token = self.request.headers["token"]
-            return self._("UserService").check_token(token)
         except KeyError:
             return Result.bad_request("token_not_exist",
                                       "Can't find token in request headers")
+        return self._("UserService").check_token(token)
 
     def _output_result(self, rs):
-        """将result对象按照json的格式输出
+        """将result对象按照json的格式输出，
+           PreparedResult直接输出预先序列化好的内容，ETag匹配时返回304
         """
         self.set_header('Content-Type', 'application/json;charset=utf-8')
         self.set_status(rs.status_code)
-        self.write(to_json(rs))
+        if isinstance(rs, PreparedResult):
+            self.set_header("Etag", rs.etag)
+            if self.check_etag_header():
+                self.set_status(304)
+                self.finish()
+                return
+            self.write(rs.body)
+        else:
+            self.write(to_json_bytes(rs))
         self.finish()
 
 
@@ -47,7 +74,7 @@ def response_json(func):
         rs = func(self, *args, **kwds)
         self.set_header('Content-Type', 'application/json;charset=utf-8')
         self.set_status(rs.status_code)
-        self.write(to_json(rs))
+        self.write(to_json_bytes(rs))
         self.finish()
 
     return _func
@@ -56,7 +83,10 @@ def response_json(func):
 class APIHandlerBuilder:
 
     """该类创建的Builder对象可以由Service方法自动创建出
-       对应的APIHandler
+       对应的APIHandler，生成的handler是一个coroutine，
+       如果service方法返回的是awaitable对象，那么会在IOLoop上等待其完成，
+       如果指定了线程池，那么普通的service方法会被提交到线程池中执行，
+       不会阻塞IOLoop上的其它请求
     """
 
     def __init__(self, service_id, method_name, http_mtd):
@@ -65,7 +95,24 @@ class APIHandlerBuilder:
         self._http_mtd = http_mtd
         self._bind_path_vars = {}
         self._bind_body_vars = {}
+        self._bind_query_vars = {}
         self._bind_context_vars = {}
+        self._executor = None
+        self._admission = None
+
+    def admission_control(self, admission):
+        """在执行service方法之前进行准入控制
+           :param admission: AdmissionControl对象，超过限制时返回429/503
+        """
+        self._admission = admission
+        return self
+
+    def run_in_executor(self, executor):
+        """在线程池中执行service方法
+           :param executor: BoundedExecutor对象，线程池满时返回503
+        """
+        self._executor = executor
+        return self
 
     def bind_path_var(self, path_var_index, mtd_arg_name, handler=None):
         """将tornado的path variable绑定到service方法的参数上
@@ -83,6 +130,14 @@ class APIHandlerBuilder:
         self._bind_body_vars[body_var_name] = mtd_arg_name, handler
         return self
 
+    def bind_query_var(self, query_var_name, mtd_arg_name, handler=None):
+        """将query string中的值提取出来，绑定到service方法的参数上
+           :param query_var_name: query参数名称
+           :param mtd_arg_name: 方法参数名
+        """
+        self._bind_query_vars[query_var_name] = mtd_arg_name, handler
+        return self
+
     def bind_context_var(self, context_var_name, mtd_arg_name, handler=None):
         self._bind_context_vars[context_var_name] = mtd_arg_name, handler
         return self
@@ -95,17 +150,14 @@ class APIHandlerBuilder:
 
         _bind_path_vars = self._bind_path_vars
         _bind_body_vars = self._bind_body_vars
+        _bind_query_vars = self._bind_query_vars
         _bind_context_vars = self._bind_context_vars
         _service_id = self._service_id
         _method_name = self._method_name
+        _executor = self._executor
+        _admission = self._admission
 
-        def handler(self, *args):
-
-            nonlocal _bind_path_vars
-            nonlocal _bind_body_vars
-            nonlocal _bind_context_vars
-            nonlocal _service_id
-            nonlocal _method_name
+        async def handler(self, *args):
 
             # 检查token
             check_token_rs = self._check_token()
@@ -131,6 +183,13 @@ class APIHandlerBuilder:
                 service_args[mtd_arg_name] = val if handler is None \
                     else handler(val)
 
+            # 填充query variable
+            for query_var_name, (mtd_arg_name, handler) in \
+                    _bind_query_vars.items():
+                val = self.get_query_argument(query_var_name, None)
+                service_args[mtd_arg_name] = val if handler is None \
+                    else handler(val)
+
             # 填充context variable
             for context_var_name, (mtd_arg_name, handler) in \
                     _bind_context_vars.items():
@@ -138,7 +197,36 @@ class APIHandlerBuilder:
                     service_args[mtd_arg_name] = current_user_id \
                         if handler is None else handler(current_user_id)
 
-            rs = getattr(self._(_service_id), _method_name)(**service_args)
+            # 准入控制
+            ticket = None
+            if _admission is not None:
+                try:
+                    ticket = await _admission.admit(current_user_id)
+                except RequestRejectedException as e:
+                    self.set_header("Retry-After", str(e.retry_after))
+                    self._output_result(e.result)
+                    return
+
+            service_mtd = getattr(self._(_service_id), _method_name)
+            try:
+                if _executor is None or \
+                        inspect.iscoroutinefunction(service_mtd):
+                    rs = service_mtd(**service_args)
+                    if inspect.isawaitable(rs):
+                        rs = await rs
+                else:
+                    try:
+                        future = _executor.submit(service_mtd, **service_args)
+                    except ExecutorFullException:
+                        self.set_header("Retry-After", "1")
+                        self._output_result(Result.service_unavailable(
+                            "server_busy",
+                            "Server is busy, please retry later"))
+                        return
+                    rs = await asyncio.wrap_future(future)
+            finally:
+                if ticket is not None:
+                    ticket.release()
 
             log.api.debug((
                 "execute service "
@@ -0,0 +1,289 @@
+"""API请求的准入控制
+
+   路由可以声明并发数目、排队长度以及令牌桶限流，分别按路由和按用户计算，
+   超过限制的请求会被立即拒绝并带上Retry-After，不会堆积在线程池或者数据库连接池中:
+
+   * 用户的请求频率或者并发数目超过限制: 429
+   * 路由的请求频率超过限制、并发已满且等待队列已满、排队超时: 503
+
+   状态都保存在进程内，只能在IOLoop线程中使用，多进程部署时每个worker单独计算
+"""
+
+import math
+import time
+import asyncio
+import collections
+from acolyte.core.service import Result
+from acolyte.exception import EasemobFlowException
+
+
+class TokenBucket:
+
+    """令牌桶，按照固定的速率生成令牌，最多积累burst个
+    """
+
+    def __init__(self, rate, burst):
+        """
+        :param rate: 每秒生成的令牌数目
+        :param burst: 令牌桶的容量，即允许的突发请求数目
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._last_time = time.monotonic()
+
+    def consume(self, now=None):
+        """消耗一个令牌
+           :return: 成功返回0，否则返回需要等待的秒数
+        """
+        self._refill(time.monotonic() if now is None else now)
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0
+        return (1 - self._tokens) / self.rate
+
+    def is_full(self, now=None):
+        self._refill(time.monotonic() if now is None else now)
+        return self._tokens >= self.burst
+
+    def _refill(self, now):
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._last_time) * self.rate)
+        self._last_time = now
+
+
+class ConcurrencyLimiter:
+
+    """并发数目限制，名额已满时请求进入有界的等待队列，
+       释放的名额会直接转交给最早等待的请求
+    """
+
+    def __init__(self, max_concurrency, max_waiting=0, wait_timeout=None):
+        """
+        :param max_concurrency: 最大并发数目
+        :param max_waiting: 最多允许排队等待的请求数目
+        :param wait_timeout: 最长等待时间(秒)，None为不限制
+        """
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.active = 0
+        self._waiters = collections.deque()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    def try_acquire(self):
+        """不等待，直接尝试获取名额
+        """
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            return True
+        return False
+
+    async def acquire(self):
+        """获取名额
+           :return: 是否获取成功，等待队列已满或者等待超时返回False
+        """
+        if self.try_acquire():
+            return True
+        if len(self._waiters) >= self.max_waiting:
+            return False
+
+        loop = asyncio.get_event_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        timeout_handle = None
+        if self.wait_timeout is not None:
+            timeout_handle = loop.call_later(
+                self.wait_timeout, self._expire, waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            # 名额已经转交过来了，需要归还
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                self.release()
+            raise
+        finally:
+            if timeout_handle is not None:
+                timeout_handle.cancel()
+
+    def _expire(self, waiter):
+        if not waiter.done():
+            self._waiters.remove(waiter)
+            waiter.set_result(False)
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.active -= 1
+
+
+class AdmissionControl:
+
+    """单个路由(或者共享同一配置的一组路由)的准入控制
+    """
+
+    # 按用户记录的状态超过该数目时清理空闲的用户
+    _SWEEP_THRESHOLD = 1024
+
+    def __init__(self, name, max_concurrency=None, max_waiting=0,
+                 wait_timeout=1, rate=None, burst=None,
+                 user_max_concurrency=None, user_rate=None, user_burst=None,
+                 retry_after=1):
+        """
+        :param name: 名称，用于日志
+        :param max_concurrency: 路由的最大并发数目，None为不限制
+        :param max_waiting: 路由并发已满时最多允许排队的请求数目
+        :param wait_timeout: 排队的最长时间(秒)
+        :param rate: 路由每秒允许的请求数目，None为不限制
+        :param burst: 路由允许的突发请求数目，默认与rate相同
+        :param user_max_concurrency: 单个用户的最大并发数目，超过时不排队直接拒绝
+        :param user_rate: 单个用户每秒允许的请求数目
+        :param user_burst: 单个用户允许的突发请求数目，默认与user_rate相同
+        :param retry_after: 因并发已满而拒绝时建议客户端重试的间隔(秒)
+        """
+        self.name = name
+        self.retry_after = retry_after
+
+        self._limiter = None
+        if max_concurrency is not None:
+            self._limiter = ConcurrencyLimiter(
+                max_concurrency, max_waiting, wait_timeout)
+
+        self._bucket = None
+        if rate is not None:
+            self._bucket = TokenBucket(
+                rate, burst if burst is not None else max(rate, 1))
+
+        self._user_max_concurrency = user_max_concurrency
+        self._user_rate = user_rate
+        self._user_burst = user_burst if user_burst is not None \
+            else max(user_rate or 1, 1)
+        self._users = {}  # user_id -> _UserState
+
+    async def admit(self, user_id):
+        """申请执行请求，执行完毕之后需要调用返回的Ticket的release方法
+           :raise RequestRejectedException: 请求被拒绝
+        """
+        user_state = None
+        if self._user_rate is not None or \
+                self._user_max_concurrency is not None:
+            user_state = self._get_user_state(user_id)
+
+        # 先检查限流，被限流的请求不占用任何名额
+        if user_state is not None and user_state.bucket is not None:
+            wait = user_state.bucket.consume()
+            if wait:
+                raise RequestRejectedException(Result.too_many_requests(
+                    "too_many_requests",
+                    "Too many requests, please retry later"), wait)
+
+        if self._bucket is not None:
+            wait = self._bucket.consume()
+            if wait:
+                raise RequestRejectedException(Result.service_unavailable(
+                    "server_busy", "Server is busy, please retry later"),
+                    wait)
+
+        if user_state is not None and \
+                self._user_max_concurrency is not None:
+            if user_state.active >= self._user_max_concurrency:
+                raise RequestRejectedException(Result.too_many_requests(
+                    "too_many_concurrent_requests",
+                    "Too many concurrent requests, please retry later"),
+                    self.retry_after)
+
+        # 排队期间也计入用户的并发数目
+        if user_state is not None:
+            user_state.active += 1
+        try:
+            acquired = self._limiter is None or await self._limiter.acquire()
+        except BaseException:
+            self._release_user(user_state)
+            raise
+        if not acquired:
+            self._release_user(user_state)
+            raise RequestRejectedException(Result.service_unavailable(
+                "server_busy", "Server is busy, please retry later"),
+                self.retry_after)
+
+        return Ticket(self, user_state)
+
+    def _release(self, user_state):
+        if self._limiter is not None:
+            self._limiter.release()
+        self._release_user(user_state)
+
+    def _release_user(self, user_state):
+        if user_state is not None:
+            user_state.active -= 1
+
+    def _get_user_state(self, user_id):
+        user_state = self._users.get(user_id)
+        if user_state is None:
+            if len(self._users) >= self._SWEEP_THRESHOLD:
+                self._sweep()
+            bucket = None
+            if self._user_rate is not None:
+                bucket = TokenBucket(self._user_rate, self._user_burst)
+            user_state = _UserState(bucket)
+            self._users[user_id] = user_state
+        return user_state
+
+    def _sweep(self):
+        """清理没有正在执行的请求并且令牌已经回满的用户
+        """
+        now = time.monotonic()
+        self._users = {
+            user_id: user_state
+            for user_id, user_state in self._users.items()
+            if user_state.active > 0 or (
+                user_state.bucket is not None and
+                not user_state.bucket.is_full(now))
+        }
+
+
+class _UserState:
+
+    __slots__ = ("bucket", "active")
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.active = 0
+
+
+class Ticket:
+
+    """准入凭证，请求执行完毕之后归还名额，重复调用release无副作用
+    """
+
+    def __init__(self, admission, user_state):
+        self._admission = admission
+        self._user_state = user_state
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._admission._release(self._user_state)
+
+
+class RequestRejectedException(EasemobFlowException):
+
+    """请求被准入控制拒绝时抛出此异常
+    """
+
+    def __init__(self, result, retry_after):
+        """
+        :param result: 返回给客户端的结果
+        :param retry_after: 建议客户端重试的间隔(秒)
+        """
+        super().__init__(result.msg)
+        self.result = result
+        self.retry_after = max(1, int(math.ceil(retry_after)))
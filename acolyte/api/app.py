@@ -1,34 +1,36 @@
 """本模块包含tornado application对象的创建，
-   以及WSGI钩子，您也可以直接通过该模块来启动API服务
+   您也可以直接通过该模块以单进程的方式启动API服务，
+   生产环境请使用多进程的acolyte-api命令(acolyte.tools.api_server)
+   注意：API handler都是coroutine，需要运行在基于asyncio的IOLoop上，
+   因此不再提供WSGI钩子
 """
 import tornado.ioloop
 import tornado.web
-import tornado.wsgi
 from acolyte.core.bootstrap import EasemobFlowBootstrap
 from acolyte.api import BaseAPIHandler
 from acolyte.api.route import URL_MAPPING
 
 
 def load_config():
-    return {"rest_api": {"port": 8888}}
+    return {"rest_api": {"port": 8888, "debug": True}}
 
 
-config = load_config()
-
-
-def make_app():
-    # 先初始化应用所需要的资源
+def make_app(config):
+    """初始化应用所需要的资源并创建application，
+       数据库连接池等资源不能跨进程共享，多进程模式下必须在fork之后调用
+       :param config: 配置数据
+    """
     bootstrap = EasemobFlowBootstrap()
     bootstrap.start(config)
     BaseAPIHandler.service_container = bootstrap.service_container
-    return tornado.web.Application(URL_MAPPING, debug=True)
-
-
-app = make_app()
-wsgi_app = tornado.wsgi.WSGIAdapter(app)
+    rest_api_cfg = config.get("rest_api", {})
+    return tornado.web.Application(
+        URL_MAPPING, debug=rest_api_cfg.get("debug", False))
 
 
 def main():
+    config = load_config()
+    app = make_app(config)
     app.listen(config["rest_api"]["port"])
     tornado.ioloop.IOLoop.current().start()
 
@@ -1,3 +1,19 @@
+# 查询数据库的接口在独立的线程池中执行，避免阻塞IOLoop
+_QUERY_EXECUTOR = {
+    "name": "flow_query",
+    "max_workers": 8,
+    "max_queue": 64
+}
+
+_QUERY_ADMISSION = {
+    "name": "flow_query",
+    "max_concurrency": 8,
+    "max_waiting": 64,
+    "wait_timeout": 2,
+    "user_rate": 20,
+    "user_burst": 40
+}
+
 handlers = [
 
     # get all flow meta
@@ -25,6 +41,8 @@ handlers = [
         "http_method": "put",
         "service": "FlowService",
         "method": "create_flow_template",
+        "admission": _QUERY_ADMISSION,
+        "executor": _QUERY_EXECUTOR,
         "body_variables": {
             "flow_meta_name": "flow_meta_name",
             "name": "name",
@@ -34,6 +52,74 @@ handlers = [
         "context_variables": {
             "current_user_id": "creator"
         }
-    }
+    },
+
+    # get flow instance by id
+    {
+        "url": r"/v1/flow/instance/(\d+)",
+        "http_method": "get",
+        "service": "FlowService",
+        "method": "get_flow_instance",
+        "admission": _QUERY_ADMISSION,
+        "executor": _QUERY_EXECUTOR,
+        "path_variables": [
+            "flow_instance_id",
+        ]
+    },
+
+    # query flow instances by status
+    {
+        "url": r"/v1/flow/instance/status/([a-z]+)",
+        "http_method": "get",
+        "service": "FlowService",
+        "method": "get_flow_instance_by_status",
+        "admission": _QUERY_ADMISSION,
+        "executor": _QUERY_EXECUTOR,
+        "path_variables": [
+            "status",
+        ],
+        "query_variables": {
+            "offset_id": "offset_id",
+            "limit": "limit",
+            "order": "order",
+        }
+    },
+
+    # query flow instances by template
+    {
+        "url": r"/v1/flow/template/(\d+)/instances",
+        "http_method": "get",
+        "service": "FlowService",
+        "method": "get_flow_instance_by_template",
+        "admission": _QUERY_ADMISSION,
+        "executor": _QUERY_EXECUTOR,
+        "path_variables": [
+            "template_id",
+        ],
+        "query_variables": {
+            "offset_id": "offset_id",
+            "limit": "limit",
+            "order": "order",
+        }
+    },
+
+    # query flow instances by template and status
+    {
+        "url": r"/v1/flow/template/(\d+)/instances/([a-z]+)",
+        "http_method": "get",
+        "service": "FlowService",
+        "method": "get_flow_instance_by_template_and_status",
+        "admission": _QUERY_ADMISSION,
+        "executor": _QUERY_EXECUTOR,
+        "path_variables": [
+            "template_id",
+            "status",
+        ],
+        "query_variables": {
+            "offset_id": "offset_id",
+            "limit": "limit",
+            "order": "order",
+        }
+    },
 
 ]
@@ -1,3 +1,40 @@
+# 启动flow、执行action会持有数据库锁，单独的线程池可以避免慢请求挤占查询接口，
+# 批量接口使用更小的线程池
+_EXECUTOR = {
+    "name": "flow_executor",
+    "max_workers": 8,
+    "max_queue": 32
+}
+
+_BATCH_EXECUTOR = {
+    "name": "flow_executor_batch",
+    "max_workers": 2,
+    "max_queue": 8
+}
+
+# 准入控制，路由的并发数目不超过线程池大小，避免请求在线程池中排队，
+# 单个用户的并发数目以及请求频率也受到限制，避免一个用户的突发请求挤占其他用户
+_ADMISSION = {
+    "name": "flow_executor",
+    "max_concurrency": 8,
+    "max_waiting": 32,
+    "wait_timeout": 3,
+    "user_max_concurrency": 2,
+    "user_rate": 5,
+    "user_burst": 10
+}
+
+_BATCH_ADMISSION = {
+    "name": "flow_executor_batch",
+    "max_concurrency": 2,
+    "max_waiting": 4,
+    "wait_timeout": 3,
+    "user_max_concurrency": 1,
+    "user_rate": 0.5,
+    "user_burst": 2,
+    "retry_after": 5
+}
+
 handlers = [
 
     # start a flow instance
@@ -6,6 +43,8 @@ handlers = [
         "http_method": "post",
         "service": "FlowExecutorService",
         "method": "start_flow",
+        "admission": _ADMISSION,
+        "executor": _EXECUTOR,
         "path_variables": [
             "flow_template_id"
         ],
@@ -18,12 +57,33 @@ handlers = [
         }
     },
 
+    # start many flow instances of the same template
+    {
+        "url": r"/v1/flow/template/(\d+)/start/batch",
+        "http_method": "post",
+        "service": "FlowExecutorService",
+        "method": "start_flows",
+        "admission": _BATCH_ADMISSION,
+        "executor": _BATCH_EXECUTOR,
+        "path_variables": [
+            "flow_template_id"
+        ],
+        "body_variables": {
+            "flows": "flows",
+        },
+        "context_variables": {
+            "current_user_id": "initiator"
+        }
+    },
+
     # run an action of the job
     {
         "url": r"/v1/flow/instance/(\d+)/([\w_]+)/([\w_]+)",
         "http_method": "post",
         "service": "FlowExecutorService",
         "method": "handle_job_action",
+        "admission": _ADMISSION,
+        "executor": _EXECUTOR,
         "path_variables": [
             "flow_instance_id",
             "target_step",
@@ -35,6 +95,27 @@ handlers = [
         "context_variables": {
             "current_user_id": "actor"
         }
+    },
+
+    # run the same action of the job on many flow instances
+    {
+        "url": r"/v1/flow/instance/batch/([\w_]+)/([\w_]+)",
+        "http_method": "post",
+        "service": "FlowExecutorService",
+        "method": "handle_job_action_batch",
+        "admission": _BATCH_ADMISSION,
+        "executor": _BATCH_EXECUTOR,
+        "path_variables": [
+            "target_step",
+            "target_action"
+        ],
+        "body_variables": {
+            "flow_instance_ids": "flow_instance_ids",
+            "action_args": "action_args"
+        },
+        "context_variables": {
+            "current_user_id": "actor"
+        }
     }
 
 ]
@@ -0,0 +1,65 @@
+_QUERY_EXECUTOR = {
+    "name": "job_query",
+    "max_workers": 8,
+    "max_queue": 64
+}
+
+_QUERY_ADMISSION = {
+    "name": "job_query",
+    "max_concurrency": 8,
+    "max_waiting": 64,
+    "wait_timeout": 2,
+    "user_rate": 20,
+    "user_burst": 40
+}
+
+handlers = [
+
+    # poll the status of a job action
+    {
+        "url": r"/v1/job/action/(\d+)/status",
+        "http_method": "get",
+        "service": "JobService",
+        "method": "get_action_status",
+        "admission": _QUERY_ADMISSION,
+        "executor": _QUERY_EXECUTOR,
+        "path_variables": [
+            "action_id"
+        ]
+    },
+
+    # get the job timeline of a flow instance
+    {
+        "url": r"/v1/flow/instance/(\d+)/jobs",
+        "http_method": "get",
+        "service": "JobService",
+        "method": "get_job_instance_list_by_flow_instance",
+        "admission": _QUERY_ADMISSION,
+        "executor": _QUERY_EXECUTOR,
+        "path_variables": [
+            "flow_instance_id"
+        ],
+        "query_variables": {
+            "with_data": "with_data"
+        }
+    },
+
+    # get job instance details with paged actions
+    {
+        "url": r"/v1/job/instance/(\d+)",
+        "http_method": "get",
+        "service": "JobService",
+        "method": "get_job_instance_details",
+        "admission": _QUERY_ADMISSION,
+        "executor": _QUERY_EXECUTOR,
+        "path_variables": [
+            "job_instance_id"
+        ],
+        "query_variables": {
+            "offset_id": "offset_id",
+            "limit": "limit",
+            "with_data": "with_data"
+        }
+    },
+
+]
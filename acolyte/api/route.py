@@ -4,15 +4,52 @@
 from acolyte.api import (
     flow,
     flow_executor,
+    job,
 )
 from acolyte.api import APIHandlerBuilder
+from acolyte.api.admission import AdmissionControl
+from acolyte.api.stream import (
+    FlowEventStreamHandler,
+    FlowEventTicketHandler
+)
+from acolyte.util.concurrent import BoundedExecutor
 
 
 URL_MAPPING = [
 
 ]
 
-_handler_modules = (flow, flow_executor)
+# 路由声明的线程池，同名的路由共享同一个线程池
+EXECUTORS = {}
+
+
+def _get_executor(executor_cfg):
+    name = executor_cfg["name"]
+    executor = EXECUTORS.get(name)
+    if executor is None:
+        executor = BoundedExecutor(
+            max_workers=executor_cfg.get("max_workers", 4),
+            max_queue=executor_cfg.get("max_queue", 16)
+        )
+        EXECUTORS[name] = executor
+    return executor
+
+
+# 路由声明的准入控制，同名的路由共享并发名额以及限流配额
+ADMISSIONS = {}
+
+
+def _get_admission(admission_cfg):
+    admission_cfg = dict(admission_cfg)
+    name = admission_cfg["name"]
+    admission = ADMISSIONS.get(name)
+    if admission is None:
+        admission = AdmissionControl(**admission_cfg)
+        ADMISSIONS[name] = admission
+    return admission
+
+
+_handler_modules = (flow, flow_executor, job)
 
 for handler_module in _handler_modules:
     handlers = getattr(handler_module, "handlers", [])
@@ -39,6 +76,14 @@ for handler_module in _handler_modules:
             else:
                 builder.bind_body_var(body_var_name, *arg_info)
 
+        # 绑定query变量
+        query_variables = handler.get("query_variables", {})
+        for query_var_name, arg_info in query_variables.items():
+            if isinstance(arg_info, str):
+                builder.bind_query_var(query_var_name, arg_info)
+            else:
+                builder.bind_query_var(query_var_name, *arg_info)
+
         # 绑定上下文变量
         context_variables = handler.get("context_variables", {})
         for context_var_name, arg_info in context_variables.items():
@@ -47,4 +92,18 @@ for handler_module in _handler_modules:
             else:
                 builder.bind_context_var(context_var_name, *arg_info)
 
+        # 准入控制
+        admission_cfg = handler.get("admission")
+        if admission_cfg is not None:
+            builder.admission_control(_get_admission(admission_cfg))
+
+        # 在线程池中执行
+        executor_cfg = handler.get("executor")
+        if executor_cfg is not None:
+            builder.run_in_executor(_get_executor(executor_cfg))
+
         URL_MAPPING.append((handler["url"], builder.build()))
+
+# 推送接口需要保持长连接，不通过APIHandlerBuilder生成
+URL_MAPPING.append((r"/v1/flow/events", FlowEventStreamHandler))
+URL_MAPPING.append((r"/v1/flow/events/ticket", FlowEventTicketHandler))
@@ -0,0 +1,179 @@
+"""基于Server-Sent Events的flow状态推送接口
+
+   POST /v1/flow/events/ticket
+   GET /v1/flow/events?ticket=t&flow_instance_id=1,2&flow_template_id=3&mine=1
+
+   * ticket: 通过ticket接口获取的短期推送凭证，也可以直接在请求头中携带token
+   * flow_instance_id: 订阅的flow instance，多个以逗号分隔
+   * flow_template_id: 订阅某些flow template下所有instance的事件
+   * mine: 为1时订阅当前用户发起的所有flow instance的事件
+   * last_event_id: 与Last-Event-ID请求头相同，凭证过期需要重新建立连接时使用
+
+   每个事件的id为事件编号，event为事件类型，data为json格式的FlowEvent，
+   客户端断线重连时会通过Last-Event-ID补发错过的事件，
+   收到reset事件时说明有事件被丢弃，客户端需要重新查询完整的状态
+"""
+
+from tornado.ioloop import IOLoop
+from tornado.iostream import StreamClosedError
+from acolyte.api import BaseAPIHandler
+from acolyte.util.json import to_json
+from acolyte.core.service import Result
+from acolyte.core.flow_event_hub import FlowEventHub
+
+
+class FlowEventStreamHandler(BaseAPIHandler):
+
+    # 每个进程最多同时保持的推送连接数目
+    MAX_STREAMS = 1000
+
+    # 没有事件时发送心跳的间隔(秒)，避免连接被中间代理断开
+    HEARTBEAT_INTERVAL = 15
+
+    # 每种频道最多订阅的ID数目
+    MAX_CHANNEL_IDS = 100
+
+    # 当前进程中的推送连接数目
+    streams = 0
+
+    def prepare(self):
+        # 推送连接不计入正在处理的请求，worker退出时直接关闭
+        pass
+
+    def _check_token(self):
+        """浏览器中的EventSource无法设置请求头，可以通过参数传递短期的推送凭证，
+           登录token不允许出现在URL中，避免被记录到访问日志里
+        """
+        if "token" in self.request.headers:
+            return super()._check_token()
+        ticket = self.get_query_argument("ticket", None)
+        if ticket is None:
+            return Result.bad_request(
+                "token_not_exist",
+                "Can't find token in request headers or ticket in query")
+        return self._("UserService").check_stream_ticket(ticket)
+
+    async def get(self):
+        check_token_rs = self._check_token()
+        if not check_token_rs.is_success():
+            self._output_result(check_token_rs)
+            return
+
+        try:
+            channels = self._parse_channels(check_token_rs.data["id"])
+        except ValueError:
+            self._output_result(Result.bad_request(
+                "invalid_channel", "Invalid flow_instance_id or "
+                "flow_template_id, at most {} ids are allowed".format(
+                    self.MAX_CHANNEL_IDS)))
+            return
+        if not channels:
+            self._output_result(Result.bad_request(
+                "no_channel", "Nothing to subscribe"))
+            return
+
+        if FlowEventStreamHandler.streams >= self.MAX_STREAMS:
+            self.set_header("Retry-After", str(self.HEARTBEAT_INTERVAL))
+            self._output_result(Result.service_unavailable(
+                "server_busy", "Server is busy, please retry later"))
+            return
+
+        FlowEventStreamHandler.streams += 1
+        hub = self._("flow_event_hub")
+        self._subscription = hub.subscribe(channels)
+        self._last_event_id = 0
+        self._replayed_ids = set()
+        try:
+            self.set_header("Content-Type", "text/event-stream;charset=utf-8")
+            self.set_header("Cache-Control", "no-cache")
+            self.set_header("X-Accel-Buffering", "no")
+            await self._replay(hub)
+            await self._stream()
+        except StreamClosedError:
+            pass
+        finally:
+            self._subscription.close()
+            FlowEventStreamHandler.streams -= 1
+
+    def on_connection_close(self):
+        subscription = getattr(self, "_subscription", None)
+        if subscription is not None:
+            subscription.close()
+
+    def _parse_channels(self, current_user_id):
+        channels = []
+        for arg_name, channel_type in (
+                ("flow_instance_id", FlowEventHub.CHANNEL_FLOW_INSTANCE),
+                ("flow_template_id", FlowEventHub.CHANNEL_FLOW_TEMPLATE)):
+            value = self.get_query_argument(arg_name, "")
+            if not value:
+                continue
+            ids = {int(id_) for id_ in value.split(",")}
+            if len(ids) > self.MAX_CHANNEL_IDS:
+                raise ValueError(arg_name)
+            channels.extend((channel_type, id_) for id_ in ids)
+        if self.get_query_argument("mine", "0") == "1":
+            channels.append(
+                (FlowEventHub.CHANNEL_INITIATOR, current_user_id))
+        return channels
+
+    async def _replay(self, hub):
+        """补发断线期间的事件
+        """
+        last_event_id = self.request.headers.get("Last-Event-ID") or \
+            self.get_query_argument("last_event_id", "")
+        if not last_event_id.isdigit():
+            await self.flush()
+            return
+        events, complete = await IOLoop.current().run_in_executor(
+            None, hub.replay, self._subscription, int(last_event_id))
+        if not complete:
+            self._write_reset()
+        self._write_events(events)
+        self._replayed_ids = {event.id for event in events}
+        await self.flush()
+
+    async def _stream(self):
+        subscription = self._subscription
+        while not subscription.closed:
+            events = await subscription.get(self.HEARTBEAT_INTERVAL)
+            if subscription.overflowed:
+                subscription.overflowed = False
+                self._write_reset()
+            if events:
+                self._write_events(events)
+            elif not subscription.closed:
+                self.write(": heartbeat\n\n")
+            await self.flush()
+
+    def _write_events(self, events):
+        for event in events:
+            # 补发的事件与实时推送的事件可能重复
+            if event.id in self._replayed_ids:
+                continue
+            # 后提交的事件ID可能小于已经推送过的事件，
+            # 此时不更新客户端的Last-Event-ID，避免重连时重复补发
+            if event.id > self._last_event_id:
+                self._last_event_id = event.id
+                self.write("id: {}\n".format(event.id))
+            self.write((
+                "event: {event_type}\ndata: {data}\n\n"
+            ).format(event_type=event.event_type, data=to_json(event)))
+
+    def _write_reset(self):
+        self.write("event: reset\ndata: {}\n\n")
+
+
+class FlowEventTicketHandler(BaseAPIHandler):
+
+    """签发推送凭证，需要在请求头中携带登录token
+    """
+
+    def post(self):
+        token = self.request.headers.get("token")
+        if token is None:
+            self._output_result(Result.bad_request(
+                "token_not_exist", "Can't find token in request headers"))
+            return
+        self._output_result(
+            self._("UserService").issue_stream_ticket(token))
@@ -0,0 +1,246 @@
+"""基于MySQL的持久化action队列，
+   API节点在接受后台action的同一个事务中将其入队，
+   任意数目的worker进程通过租约领取并执行，worker崩溃后租约到期的任务会被重新领取
+
+   队列未启用时，后台action在API进程内执行，同样在队列中记录一条由本进程持有的租约，
+   进程存活期间定时续约，进程崩溃或者被强制结束之后租约到期，
+   对应的action被标记为exception，不再永远停留在running状态
+"""
+
+import os
+import socket
+import binascii
+import datetime
+import threading
+from acolyte.util import log
+from acolyte.util.concurrent import BoundedExecutor
+from acolyte.core.job import ActionStatus
+from acolyte.core.storage.action_queue import ActionQueueDAO
+from acolyte.core.storage.job_action_data import JobActionDataDAO
+
+
+class ActionQueue:
+
+    """持久化的action队列
+    """
+
+    def __init__(self, db, enabled=False, lease_time=300,
+                 max_attempts=3, skip_locked=True):
+        """
+        :param db: 数据源
+        :param enabled: 是否启用，启用后后台action都会进入队列而不是在本进程中执行
+        :param lease_time: 租约时长(秒)，worker在执行过程中会不断续约
+        :param max_attempts: 最多领取次数，超出后action会被标记为exception
+        :param skip_locked: 领取时是否使用skip locked，需要MySQL 8.0+
+        """
+        self._db = db
+        self.enabled = enabled
+        self.lease_time = lease_time
+        self.max_attempts = max_attempts
+        self.skip_locked = skip_locked
+        self._queue_dao = ActionQueueDAO(db)
+        self._job_action_dao = JobActionDataDAO(db)
+        self._local_owner = None
+        self._stopped = threading.Event()
+
+    @property
+    def local_owner(self):
+        """本进程内执行的后台action的租约持有者，
+           带有随机后缀，避免重启之后复用的进程号为前一个进程遗留的租约续约
+        """
+        if self._local_owner is None:
+            self._local_owner = "{}:{}:{}".format(
+                socket.gethostname(), os.getpid(),
+                binascii.hexlify(os.urandom(4)).decode("ascii"))
+        return self._local_owner
+
+    def enqueue(self, job_action_id):
+        """入队，如果当前处于事务中，那么随事务一同提交
+        """
+        return self._queue_dao.insert(job_action_id)
+
+    def claim(self, owner, limit):
+        """领取租约已经到期的任务
+           :param owner: worker标识
+           :param limit: 最多领取的数目
+           :return: 任务列表，包含id、job_action_id以及包括本次在内的领取次数attempts
+        """
+        with self._db.transaction():
+            tasks = self._queue_dao.query_claimable(limit, self.skip_locked)
+            if tasks:
+                self._queue_dao.lease(
+                    [task["id"] for task in tasks], owner,
+                    self._lease_expire())
+        for task in tasks:
+            task["attempts"] += 1
+        return tasks
+
+    def renew(self, owner, id_list):
+        """为正在执行的任务续约
+        """
+        if id_list:
+            self._queue_dao.renew(id_list, owner, self._lease_expire())
+
+    def ack(self, owner, queue_id):
+        """任务执行完毕，从队列中移除
+        """
+        self._queue_dao.delete(queue_id, owner)
+
+    def give_up(self, task):
+        """领取次数过多，不再执行该任务
+        """
+        with self._db.transaction():
+            self._job_action_dao.update_status(
+                task["job_action_id"], ActionStatus.STATUS_EXCEPTION,
+                data={"error": "too_many_attempts"})
+            self._queue_dao.delete_by_id(task["id"])
+
+    def lease_local(self, job_action_id):
+        """记录一个由本进程执行的后台action，如果当前处于事务中，那么随事务一同提交
+        """
+        return self._queue_dao.insert_leased(
+            job_action_id, self.local_owner, self._lease_expire())
+
+    def release_local(self, job_action_id):
+        """本进程内的后台action执行完毕，移除租约
+        """
+        self._queue_dao.delete_by_job_action_id(
+            job_action_id, self.local_owner)
+
+    def renew_local(self):
+        """为本进程持有的所有租约续约
+        """
+        self._queue_dao.renew_by_owner(
+            self.local_owner, self._lease_expire())
+
+    def expire_local(self, limit=100):
+        """将租约已经到期的本地action标记为exception，
+           持有者已经不存在，action所在的事务早已回滚
+           :return: 被标记的数目
+        """
+        tasks = self.claim(self.local_owner, limit)
+        for task in tasks:
+            with self._db.transaction():
+                # 已经执行完毕只是没能移除租约的action保持原有状态
+                if self._job_action_dao.transfer_status(
+                        task["job_action_id"], ActionStatus.STATUS_RUNNING,
+                        ActionStatus.STATUS_EXCEPTION,
+                        {"error": "lease_expired"}):
+                    log.acolyte.error((
+                        "job action {} lease expired, "
+                        "the process running it is gone"
+                    ).format(task["job_action_id"]))
+                self._queue_dao.delete_by_id(task["id"])
+        return len(tasks)
+
+    def start(self):
+        """队列未启用时，启动为本地租约续约以及清理过期租约的线程
+        """
+        if self.enabled or self.lease_time <= 0:
+            return
+        keeper_thread = threading.Thread(
+            target=self._keep_local_leases, name="acolyte-action-lease")
+        keeper_thread.daemon = True
+        keeper_thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _keep_local_leases(self):
+        while not self._stopped.wait(self.lease_time / 3):
+            try:
+                self.renew_local()
+                self.expire_local()
+            except Exception:
+                log.acolyte.exception("keep local action leases error")
+
+    def _lease_expire(self):
+        return datetime.datetime.now() + datetime.timedelta(
+            seconds=self.lease_time)
+
+
+class ActionWorker:
+
+    """从ActionQueue中领取任务并执行，可以在多台机器上启动任意数目的worker
+    """
+
+    def __init__(self, flow_executor, action_queue,
+                 concurrency=4, poll_interval=1, name=None):
+        """
+        :param flow_executor: FlowExecutorService对象
+        :param action_queue: ActionQueue对象
+        :param concurrency: 同时执行的任务数目
+        :param poll_interval: 队列为空时的轮询间隔(秒)
+        :param name: worker标识，默认为 主机名:进程号
+        """
+        self._flow_executor = flow_executor
+        self._queue = action_queue
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.name = name or "{}:{}".format(socket.gethostname(), os.getpid())
+        # 只会领取空闲数目的任务，留出余量避免任务结束与槽位释放之间的时间差
+        self._executor = BoundedExecutor(concurrency, concurrency)
+        self._in_flight = {}  # queue id -> task
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def run(self):
+        """执行任务直到stop被调用，退出前会等待正在执行的任务完成
+        """
+        log.acolyte.info("action worker {} started".format(self.name))
+        last_renew_time = datetime.datetime.now()
+        renew_interval = self._queue.lease_time / 3
+
+        while not self._stopped.is_set():
+            try:
+                claimed = self._claim()
+
+                now = datetime.datetime.now()
+                if (now - last_renew_time).total_seconds() >= renew_interval:
+                    with self._lock:
+                        in_flight = list(self._in_flight.keys())
+                    self._queue.renew(self.name, in_flight)
+                    last_renew_time = now
+            except Exception:
+                log.acolyte.exception("action worker loop error")
+                claimed = 0
+
+            if not claimed:
+                self._stopped.wait(self.poll_interval)
+
+        self._executor.shutdown(wait=True)
+        log.acolyte.info("action worker {} stopped".format(self.name))
+
+    def stop(self):
+        self._stopped.set()
+
+    def _claim(self):
+        with self._lock:
+            free = self.concurrency - len(self._in_flight)
+        if free <= 0:
+            return 0
+
+        tasks = self._queue.claim(self.name, free)
+        for task in tasks:
+            with self._lock:
+                self._in_flight[task["id"]] = task
+            self._executor.submit(self._execute, task)
+        return len(tasks)
+
+    def _execute(self, task):
+        try:
+            if task["attempts"] > self._queue.max_attempts:
+                log.acolyte.error(
+                    "give up job action {}, too many attempts".format(
+                        task["job_action_id"]))
+                self._queue.give_up(task)
+                return
+            self._flow_executor.run_action(task["job_action_id"])
+            self._queue.ack(self.name, task["id"])
+        except Exception:
+            # 未能ack的任务会在租约到期后被重新领取
+            log.acolyte.exception(
+                "execute job action {} error".format(task["job_action_id"]))
+        finally:
+            with self._lock:
+                self._in_flight.pop(task["id"], None)
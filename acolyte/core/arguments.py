@@ -0,0 +1,125 @@
+"""本模块用于将参数的合并与检查逻辑预先编译为执行计划，
+   flow template一旦创建就不再变化，因此const和static参数的值以及检查结果
+   只需要计算一次，请求时只需要检查请求中传入的auto参数
+"""
+
+from acolyte.core.job import JobArg
+from acolyte.util.validate import InvalidFieldException
+
+
+class _FixedArg:
+
+    """值在编译期就已经确定的参数，保存检查后的值或者检查时产生的异常
+    """
+
+    __slots__ = ("name", "value", "error")
+
+    def __init__(self, name, field, value):
+        self.name = name
+        self.value, self.error = None, None
+        try:
+            self.value = field(value)
+        except InvalidFieldException as e:
+            self.error = e
+
+    def resolve(self, request_args):
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class _AutoArg(_FixedArg):
+
+    """auto参数，请求中传入时需要重新检查，否则使用绑定值的检查结果
+    """
+
+    __slots__ = ("field", )
+
+    def __init__(self, name, field, bind_value):
+        super().__init__(name, field, bind_value)
+        self.field = field
+
+    def resolve(self, request_args):
+        if self.name in request_args:
+            return self.field(request_args[self.name])
+        return super().resolve(request_args)
+
+
+class ArgumentPlan:
+
+    """编译好的参数解析计划
+    """
+
+    def __init__(self, action_name, args, base=None):
+        """
+        :param action_name: 用于生成错误信息的参数前缀
+        :param args: 按声明顺序排列的参数列表
+        :param base: 不需要检查，直接透传的参数
+        """
+        self.action_name = action_name
+        self._args = tuple(args)
+        self._base = base
+
+    def resolve(self, request_args):
+        """合并请求参数并执行检查
+           :param request_args: 请求中传入的参数
+           :return: 最终参数字典
+           :raise InvalidFieldException: 参数检查失败，
+                  field_name会被替换为 action_name.field_name的形式
+        """
+        if self._base is None:
+            args = {}
+        else:
+            args = dict(self._base)
+            args.update(request_args)
+        for arg in self._args:
+            try:
+                args[arg.name] = arg.resolve(request_args)
+            except InvalidFieldException as e:
+                raise InvalidFieldException(
+                    "{action_name}.{field_name}".format(
+                        action_name=self.action_name, field_name=arg.name),
+                    e.value, e.reason, e.expect)
+        return args
+
+
+def compile_action_args(job_def, job_ref, flow_template, action):
+    """编译job action的参数解析计划
+       const类型的参数值来自flow meta，static类型的参数值来自flow template，
+       auto类型的参数值依次从请求、flow template、flow meta中获取
+       :param job_def: job定义
+       :param job_ref: flow meta中对job的引用
+       :param flow_template: flow template
+       :param action: action名称
+    """
+    meta_bind_args = job_ref.bind_args.get(action, {})
+    tpl_bind_args = flow_template.bind_args.get(
+        job_ref.step_name, {}).get(action, {})
+
+    args = []
+    for job_arg_define in job_def.job_args.get(action) or []:
+        name, field = job_arg_define.name, job_arg_define.field_info
+        if job_arg_define.mark == JobArg.MARK_AUTO:
+            args.append(_AutoArg(name, field, tpl_bind_args.get(
+                name, meta_bind_args.get(name))))
+        elif job_arg_define.mark == JobArg.MARK_STATIC:
+            args.append(_FixedArg(name, field, tpl_bind_args.get(name)))
+        elif job_arg_define.mark == JobArg.MARK_CONST:
+            args.append(_FixedArg(name, field, meta_bind_args.get(name)))
+
+    return ArgumentPlan("{step}.{action}".format(
+        step=job_ref.step_name, action=action), args)
+
+
+def compile_start_args(flow_meta):
+    """编译flow meta on_start回调的参数解析计划
+       请求参数会覆盖flow meta中声明的start_args，on_start没有声明检查规则的参数直接透传
+       :param flow_meta: flow meta对象
+    """
+    field_rules = getattr(flow_meta.on_start, "field_rules", [])
+    start_args = flow_meta.start_args
+    args = [
+        _AutoArg(field.name, field, start_args.get(field.name))
+        for field in field_rules
+    ]
+    return ArgumentPlan("start", args, base=start_args)
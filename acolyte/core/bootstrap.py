@@ -5,11 +5,17 @@ from abc import (
 from typing import Dict, Any
 from acolyte.util import db
 from acolyte.util import log
+from acolyte.util.concurrent import BoundedExecutor
+from acolyte.util.sec import TokenSigner, new_token_id
 from acolyte.util.service_container import ServiceContainer
 from acolyte.core.mgr import (
     job_manager,
     flow_meta_manager
 )
+from acolyte.core.entity_cache import EntityCache
+from acolyte.core.token_revocation import TokenRevocationList
+from acolyte.core.flow_event_hub import FlowEventHub
+from acolyte.core.action_queue import ActionQueue
 from acolyte.core.flow_service import FlowService
 from acolyte.core.user_service import UserService
 from acolyte.core.job_service import JobService
@@ -58,9 +64,66 @@ class EasemobFlowBootstrap(AbstractBootstrap):
             "db": "easemob_flow",
         })
 
-        connection_pool = db.ConnectionPool(db_connect_cfg, max_pool_size)
+        connection_pool = db.ConnectionPool(
+            db_connect_cfg, max_pool_size,
+            min_pool_size=db_pool_cfg.get("min_pool_size", 0),
+            checkout_timeout=db_pool_cfg.get("checkout_timeout", 10),
+            max_idle_time=db_pool_cfg.get("max_idle_time", 600),
+            keepalive_interval=db_pool_cfg.get("keepalive_interval", 60),
+            lock_max_idle=db_pool_cfg.get("lock_max_idle", 16),
+            lock_timeout=db_pool_cfg.get("lock_timeout", 10)
+        )
         self._pool = connection_pool
 
+        # 执行长时间运行的job action的后台线程池
+        action_executor_cfg = config.get("action_executor", {})
+        self._action_executor = BoundedExecutor(
+            max_workers=action_executor_cfg.get("max_workers", 8),
+            max_queue=action_executor_cfg.get("max_queue", 64)
+        )
+
+        # 持久化的action队列，启用后后台action交由独立的worker进程执行
+        action_queue_cfg = config.get("action_queue", {})
+        self._action_queue = ActionQueue(
+            connection_pool,
+            enabled=action_queue_cfg.get("enabled", False),
+            lease_time=action_queue_cfg.get("lease_time", 300),
+            max_attempts=action_queue_cfg.get("max_attempts", 3),
+            skip_locked=action_queue_cfg.get("skip_locked", True)
+        )
+
+        # flow template、user、role等实体的缓存
+        entity_cache_cfg = config.get("entity_cache", {})
+        self._entity_cache = EntityCache(
+            connection_pool,
+            max_size=entity_cache_cfg.get("max_size", 1024),
+            ttl=entity_cache_cfg.get("ttl", 300),
+            poll_interval=entity_cache_cfg.get("poll_interval", 5)
+        )
+
+        # 无状态token的签名以及吊销黑名单
+        token_cfg = config.get("token", {})
+        token_secret = token_cfg.get("secret")
+        if not token_secret:
+            token_secret = new_token_id()
+            log.acolyte.warning((
+                "token.secret is not configured, use a random secret, "
+                "tokens can't be shared between processes"))
+        self._token_signer = TokenSigner(
+            token_secret, ttl=token_cfg.get("ttl", 86400 * 7))
+        self._token_revocation = TokenRevocationList(
+            connection_pool,
+            poll_interval=token_cfg.get("revocation_poll_interval", 5)
+        )
+
+        # flow状态变更事件的推送，有订阅者时才会启动同步线程
+        flow_event_cfg = config.get("flow_event", {})
+        self._flow_event_hub = FlowEventHub(
+            connection_pool,
+            poll_interval=flow_event_cfg.get("poll_interval", 1),
+            retention=flow_event_cfg.get("retention", 86400)
+        )
+
         self._service_container = ServiceContainer()
         self._service_binding(self._service_container)
         log.acolyte.info("Acolyte started .")
@@ -78,6 +141,39 @@ class EasemobFlowBootstrap(AbstractBootstrap):
             service_obj=self._pool
         )
 
+        service_container.register(
+            service_id="action_executor",
+            service_obj=self._action_executor
+        )
+
+        service_container.register(
+            service_id="action_queue",
+            service_obj=self._action_queue,
+            init_callback=lambda service_obj: service_obj.start()
+        )
+
+        service_container.register(
+            service_id="entity_cache",
+            service_obj=self._entity_cache,
+            init_callback=lambda service_obj: service_obj.start()
+        )
+
+        service_container.register(
+            service_id="token_signer",
+            service_obj=self._token_signer
+        )
+
+        service_container.register(
+            service_id="token_revocation",
+            service_obj=self._token_revocation,
+            init_callback=lambda service_obj: service_obj.start()
+        )
+
+        service_container.register(
+            service_id="flow_event_hub",
+            service_obj=self._flow_event_hub
+        )
+
         service_container.register(
             service_id="job_manager",
             service_obj=job_manager,
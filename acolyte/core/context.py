@@ -1,10 +1,9 @@
-import simplejson as json
-import collections
+import collections.abc
 from abc import ABCMeta
 from acolyte.core.storage.job_action_data import JobActionDataDAO
 
 
-class AbstractFlowContext(collections.Mapping, metaclass=ABCMeta):
+class AbstractFlowContext(collections.abc.Mapping, metaclass=ABCMeta):
 
     """上下文对象用于在Flow运行中的Job之间传递数据
     """
@@ -38,6 +37,8 @@ class AbstractFlowContext(collections.Mapping, metaclass=ABCMeta):
 class MySQLContext(AbstractFlowContext):
 
     """基于MySQL的上下文
+       第一次访问时通过一次查询加载该flow instance的所有数据，之后的读取都在内存中完成，
+       写入和删除操作会被缓冲起来，直到调用flush时才批量写回数据库
     """
 
     def __init__(self, flow_executor, db, flow_instance_id,
@@ -60,6 +61,10 @@ class MySQLContext(AbstractFlowContext):
         self._flow_meta = flow_meta
         self._current_step = current_step
 
+        self._cache = None  # 已加载的数据，None表示尚未加载
+        self._dirty = {}  # 尚未写回的修改
+        self._deleted = set()  # 尚未写回的删除
+
     @property
     def flow_instance_id(self):
         return self._flow_instance_id
@@ -80,34 +85,47 @@ class MySQLContext(AbstractFlowContext):
     def current_step(self):
         return self._current_step
 
+    @property
+    def _data(self):
+        if self._cache is None:
+            rs = self._db.query_all((
+                "select k, v from flow_context where "
+                "flow_instance_id = %s"
+            ), (self._flow_instance_id,))
+            cache = {row["k"]: row["v"] for row in rs}
+
+            # 在加载之前缓冲的修改需要覆盖到加载的数据上
+            for key in self._deleted:
+                cache.pop(key, None)
+            cache.update(self._dirty)
+            self._cache = cache
+        return self._cache
+
     def __getitem__(self, key):
-        return self._db.query_one_field((
-            "select v from flow_context where "
-            "flow_instance_id = %s and k = %s"
-        ), (self._flow_instance_id, key))
+        return self._data.get(key)
 
     def __setitem__(self, key, value):
-        self._db.execute((
-            "insert into flow_context ("
-            "flow_instance_id, k, v) values ("
-            "%s, %s, %s) on duplicate key update "
-            "v = %s"
-        ), (self._flow_instance_id, key, value, value))
+        # 与数据库中保存的形式保持一致
+        value = str(value)
+        self._dirty[key] = value
+        self._deleted.discard(key)
+        if self._cache is not None:
+            self._cache[key] = value
 
     def __delitem__(self, key):
-        return self._db.execute((
-            "delete from flow_context where "
-            "flow_instance_id = %s and k = %s limit 1"
-        ), (self._flow_instance_id, key))
+        self._dirty.pop(key, None)
+        self._deleted.add(key)
+        if self._cache is not None:
+            self._cache.pop(key, None)
+
+    def __contains__(self, key):
+        return key in self._data
 
     def __len__(self):
-        return self._db.query_one_field((
-            "select count(*) as c from flow_context where "
-            "flow_instance_id = %s"
-        ), (self._flow_instance_id,))
+        return len(self._data)
 
     def __iter__(self):
-        return self.keys()
+        return iter(self.keys())
 
     def get(self, key, value=None):
         v = self[key]
@@ -115,33 +133,74 @@ class MySQLContext(AbstractFlowContext):
             return value
         return v
 
+    def get_many(self, keys, default=None):
+        """批量获取多个key的值
+           :param keys: key列表
+           :param default: key不存在时的默认值
+           :return: key到值的字典
+        """
+        data = self._data
+        return {key: data.get(key, default) for key in keys}
+
+    def update(self, data=None, **kwds):
+        """批量写入数据，用法同dict.update
+        """
+        if data is not None:
+            for key, value in dict(data).items():
+                self[key] = value
+        for key, value in kwds.items():
+            self[key] = value
+
     def items(self):
-        rs = self._db.query_all((
-            "select k, v from flow_context where "
-            "flow_instance_id = %s"
-        ), (self._flow_instance_id,))
-        return [(row["k"], row["v"]) for row in rs]
+        return list(self._data.items())
 
     def keys(self):
-        rs = self._db.query_all((
-            "select k from flow_context where "
-            "flow_instance_id = %s"
-        ), (self._flow_instance_id,))
-        return [row['k'] for row in rs]
+        return list(self._data.keys())
 
     def values(self):
-        rs = self._db.query_all((
-            "select v from flow_context where "
-            "flow_instance_id = %s"
-        ), (self._flow_instance_id,))
-        return [row['v'] for row in rs]
+        return list(self._data.values())
+
+    def flush(self):
+        """将缓冲的修改和删除批量写回数据库，
+           修改通过一条多行的upsert语句完成，删除通过一条delete语句完成
+        """
+        if not self._dirty and not self._deleted:
+            return
+
+        with self._db.transaction():
+            if self._deleted:
+                deleted = list(self._deleted)
+                holders = ",".join(("%s", ) * len(deleted))
+                self._db.execute((
+                    "delete from flow_context where "
+                    "flow_instance_id = %s and k in ({holders})"
+                ).format(holders=holders),
+                    [self._flow_instance_id] + deleted)
+
+            if self._dirty:
+                rows = list(self._dirty.items())
+                holders = ",".join(("(%s, %s, %s)", ) * len(rows))
+                args = []
+                for key, value in rows:
+                    args += [self._flow_instance_id, key, value]
+                self._db.execute((
+                    "insert into flow_context ("
+                    "flow_instance_id, k, v) values {holders} "
+                    "on duplicate key update v = values(v)"
+                ).format(holders=holders), args)
+
+        self._dirty.clear()
+        self._deleted.clear()
 
     def destroy(self):
         self._db.execute((
             "delete from flow_context where "
             "flow_instance_id = %s"
         ), (self._flow_instance_id,))
+        self._cache = {}
+        self._dirty.clear()
+        self._deleted.clear()
 
     def save(self, data):
         action_dao = JobActionDataDAO(self._db)
-        action_dao.update_data(self._job_action_id, json.dumps(data))
+        action_dao.update_data(self._job_action_id, data)
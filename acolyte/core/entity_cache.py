@@ -0,0 +1,163 @@
+import datetime
+import threading
+from acolyte.util import log
+from acolyte.util.cache import LRUCache
+from acolyte.core.storage.change_log import ChangeLogDAO
+from acolyte.core.storage.flow_template import FlowTemplateDAO
+from acolyte.core.storage.user import UserDAO
+from acolyte.core.storage.role import RoleDAO
+
+
+class EntityCache:
+
+    """flow template、user、role等很少变化的实体的进程内缓存
+       每种实体对应一个LRUCache，DAO在查询时会先从这里读取，
+       在实体发生变化时通过invalidate让本地缓存失效，并写入change_log，
+       其它节点通过后台线程轮询change_log来让自己的缓存失效
+    """
+
+    ENTITY_FLOW_TEMPLATE = "flow_template"
+
+    ENTITY_USER = "user"
+
+    ENTITY_ROLE = "role"
+
+    def __init__(self, db, max_size=1024, ttl=300, poll_interval=5,
+                 change_log_retention=86400):
+        """
+        :param db: 数据源
+        :param max_size: 每种实体最多缓存的数目
+        :param ttl: 缓存条目的存活时间(秒)，即使错过了变更通知，也最多只会读到这么久之前的数据
+        :param poll_interval: 轮询change_log的间隔(秒)，小于等于0则不启动轮询线程
+        :param change_log_retention: change_log的保留时间(秒)
+        """
+        self._db = db
+        self.max_size = max_size
+        self.poll_interval = poll_interval
+        self.change_log_retention = change_log_retention
+        self._regions = {
+            entity: LRUCache(max_size, ttl) for entity in (
+                EntityCache.ENTITY_FLOW_TEMPLATE,
+                EntityCache.ENTITY_USER,
+                EntityCache.ENTITY_ROLE,
+            )
+        }
+        self._change_log_dao = ChangeLogDAO(db)
+        self._last_change_id = 0
+        self._last_purge_time = None
+        self._stopped = threading.Event()
+
+    def region(self, entity):
+        """获取某一种实体的缓存
+        """
+        return self._regions[entity]
+
+    def get(self, entity, entity_id, loader):
+        """从缓存中获取实体，如果没有命中，则通过loader加载，
+           实体不存在时不做缓存
+           :param entity: 实体类型
+           :param entity_id: 实体ID
+           :param loader: 加载函数，接受实体ID，返回实体对象或None
+        """
+        region = self._regions[entity]
+        obj = region.get(entity_id)
+        if obj is not None:
+            return obj
+        obj = loader(entity_id)
+        if obj is not None:
+            region.put(entity_id, obj)
+        return obj
+
+    def get_many(self, entity, entity_id_list, loader):
+        """批量获取实体，只为未命中的部分调用一次loader
+           :param entity: 实体类型
+           :param entity_id_list: 实体ID列表
+           :param loader: 批量加载函数，接受实体ID列表，返回实体对象列表
+           :return: 实体ID到实体对象的字典
+        """
+        region = self._regions[entity]
+        result = region.get_many(entity_id_list)
+        missing = [id_ for id_ in entity_id_list if id_ not in result]
+        if missing:
+            loaded = {obj.id: obj for obj in loader(missing)}
+            region.put_many(loaded)
+            result.update(loaded)
+        return result
+
+    def invalidate(self, entity, entity_id_list):
+        """实体发生了变化，让本地缓存失效，并通知其它节点
+           :param entity: 实体类型
+           :param entity_id_list: 发生变化的实体ID列表
+        """
+        if not isinstance(entity_id_list, list):
+            entity_id_list = [entity_id_list]
+        region = self._regions[entity]
+        for entity_id in entity_id_list:
+            region.invalidate(entity_id)
+        self._change_log_dao.insert(entity, entity_id_list)
+
+    def start(self):
+        """预热缓存并启动轮询线程
+        """
+        self._last_change_id = self._change_log_dao.query_max_id()
+        self.warm_up()
+        if self.poll_interval > 0:
+            poll_thread = threading.Thread(
+                target=self._poll_loop, name="acolyte-entity-cache")
+            poll_thread.daemon = True
+            poll_thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def warm_up(self):
+        """预先加载所有的flow template和role，以及最近活跃的用户
+        """
+        templates = FlowTemplateDAO(self._db).query_all_templates()
+        self.region(EntityCache.ENTITY_FLOW_TEMPLATE).put_many(
+            {tpl.id: tpl for tpl in templates})
+
+        roles = RoleDAO(self._db).query_all_roles()
+        self.region(EntityCache.ENTITY_ROLE).put_many(
+            {role.id: role for role in roles})
+
+        users = UserDAO(self._db).query_recent_users(self.max_size)
+        self.region(EntityCache.ENTITY_USER).put_many(
+            {user.id: user for user in users})
+
+        log.acolyte.info((
+            "entity cache warmed up: "
+            "{} flow templates, {} roles, {} users"
+        ).format(len(templates), len(roles), len(users)))
+
+    def _poll_loop(self):
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception:
+                log.acolyte.exception("poll change log error")
+
+    def poll(self):
+        """读取新的变更记录并让对应的本地缓存失效，
+           自己写入的变更也会被再次处理，这样可以覆盖掉事务提交前被重新加载的旧数据
+        """
+        while True:
+            changes = self._change_log_dao.query_after(self._last_change_id)
+            for change in changes:
+                region = self._regions.get(change["entity"])
+                if region is not None:
+                    region.invalidate(change["entity_id"])
+                self._last_change_id = change["id"]
+            if len(changes) < 1000:
+                break
+        self._purge_change_log()
+
+    def _purge_change_log(self):
+        # 每小时最多清理一次过期的变更记录
+        now = datetime.datetime.now()
+        if self._last_purge_time is not None and \
+                (now - self._last_purge_time).total_seconds() < 3600:
+            return
+        self._last_purge_time = now
+        self._change_log_dao.delete_before(
+            now - datetime.timedelta(seconds=self.change_log_retention))
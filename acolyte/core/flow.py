@@ -1,7 +1,100 @@
 import datetime
 from typing import List, Dict, Any
 from abc import ABCMeta, abstractmethod
-from acolyte.core.job import JobRef
+from acolyte.core.job import JobRef, ParallelRef
+from acolyte.exception import InvalidArgumentException
+
+
+class StepGraph:
+
+    """由FlowMeta的jobs声明编译得到的step依赖图，
+       start和finish是两个保留的虚拟step，所有step都可以通过名称直接索引到其前驱和后继
+    """
+
+    START = "start"
+
+    FINISH = "finish"
+
+    def __init__(self, jobs):
+        """
+        :param jobs: JobRef、ParallelRef组成的声明列表
+        """
+        self._job_refs = []
+        self._prev = {StepGraph.START: frozenset()}
+        self._next = {}
+
+        exits = self._compile(jobs, frozenset((StepGraph.START, )))
+        self._prev[StepGraph.FINISH] = exits
+
+        for step, prev_steps in self._prev.items():
+            self._next.setdefault(step, set())
+            for prev_step in prev_steps:
+                self._next.setdefault(prev_step, set()).add(step)
+        self._next = {
+            step: frozenset(next_steps)
+            for step, next_steps in self._next.items()
+        }
+
+        # 每个step的所有祖先
+        self._ancestors = {StepGraph.START: frozenset()}
+        for job_ref in self._job_refs:
+            self._ancestors[job_ref.step_name] = self._collect_ancestors(
+                job_ref.step_name)
+        self._ancestors[StepGraph.FINISH] = self._collect_ancestors(
+            StepGraph.FINISH)
+
+    def _compile(self, item, prev_steps):
+        """编译声明，返回该声明的出口step集合
+        """
+        if isinstance(item, JobRef):
+            step_name = item.step_name
+            if step_name in (StepGraph.START, StepGraph.FINISH):
+                raise InvalidArgumentException(
+                    "step name can't be '{}'".format(step_name))
+            if step_name in self._prev:
+                raise InvalidArgumentException(
+                    "duplicated step name '{}'".format(step_name))
+            self._job_refs.append(item)
+            self._prev[step_name] = prev_steps
+            return frozenset((step_name, ))
+
+        if isinstance(item, ParallelRef):
+            exits = frozenset()
+            for branch in item.branches:
+                exits |= self._compile(branch, prev_steps)
+            return exits
+
+        if isinstance(item, (tuple, list)):
+            for sub_item in item:
+                prev_steps = self._compile(sub_item, prev_steps)
+            return prev_steps
+
+        raise InvalidArgumentException(
+            "unsupported job declaration: '{}'".format(item))
+
+    def _collect_ancestors(self, step):
+        ancestors, stack = set(), list(self._prev[step])
+        while stack:
+            prev_step = stack.pop()
+            if prev_step not in ancestors:
+                ancestors.add(prev_step)
+                stack.extend(self._prev[prev_step])
+        return frozenset(ancestors)
+
+    @property
+    def job_refs(self):
+        """按声明顺序排列的所有JobRef
+        """
+        return self._job_refs
+
+    def get_prev_steps(self, step):
+        return self._prev.get(step, frozenset())
+
+    def get_next_steps(self, step):
+        return self._next.get(step, frozenset())
+
+    def get_ancestors(self, step):
+        return self._ancestors.get(step, frozenset())
 
 
 class FlowMeta(metaclass=ABCMeta):
@@ -11,20 +104,22 @@ class FlowMeta(metaclass=ABCMeta):
     """
 
     def __init__(self, name: str, jobs: List[JobRef],
-                 start_args: Dict[str, Any]=None,
-                 stop_args: Dict[str, Any]=None,
-                 description: str=""):
+                 start_args: Dict[str, Any] = None,
+                 stop_args: Dict[str, Any] = None,
+                 description: str = ""):
         """
         :param name: flow meta名称
-        :param jobs: 包含的JobRef对象列表
+        :param jobs: 包含的JobRef对象列表，可以通过ParallelRef声明并行执行的分支
         :param bind_args: 绑定的静态参数，格式 {start: {args}, stop: {args}}
         """
         self._name = name
-        self._jobs = jobs
+        self._step_graph = StepGraph(jobs)
+        self._jobs = self._step_graph.job_refs
         self._start_args = start_args
         self._stop_args = stop_args
         self._description = description
-        self._job_ref_map = {job_ref.step_name: job_ref for job_ref in jobs}
+        self._job_ref_map = {
+            job_ref.step_name: job_ref for job_ref in self._jobs}
 
     @property
     def name(self):
@@ -32,8 +127,14 @@ class FlowMeta(metaclass=ABCMeta):
 
     @property
     def jobs(self):
+        """所有的JobRef，并行分支会被展开
+        """
         return self._jobs
 
+    @property
+    def step_graph(self):
+        return self._step_graph
+
     @property
     def start_args(self):
         if self._start_args is None:
@@ -74,22 +175,27 @@ class FlowMeta(metaclass=ABCMeta):
         pass
 
     def get_next_step(self, current_step):
-        """根据当前步骤获取下一个执行步骤
+        """根据当前步骤获取下一个执行步骤，
+           如果存在多个并行的后继，那么返回声明顺序中最靠前的那个
         """
+        next_steps = self._step_graph.get_next_steps(current_step)
+        if not next_steps:
+            return None
+        if StepGraph.FINISH in next_steps:
+            return StepGraph.FINISH
+        for job_ref in self._jobs:
+            if job_ref.step_name in next_steps:
+                return job_ref.step_name
+
+    def get_next_steps(self, step):
+        """获取某个step完成后可以执行的所有step
+        """
+        return self._step_graph.get_next_steps(step)
 
-        # 当前step为start的情况
-        if current_step == "start":
-            if self._jobs:
-                return self._jobs[0].step_name
-            else:
-                return "finish"
-
-        for idx, job_ref in enumerate(self._jobs):
-            if job_ref.step_name == current_step:
-                if idx < len(self._jobs) - 1:
-                    return self._jobs[idx + 1].step_name
-                else:
-                    return "finish"
+    def get_prev_steps(self, step):
+        """获取某个step执行之前必须完成的所有step
+        """
+        return self._step_graph.get_prev_steps(step)
 
     def get_job_ref_by_step_name(self, step_name):
         return self._job_ref_map.get(step_name, None)
@@ -142,15 +248,16 @@ class FlowInstance:
 
     def __init__(self, id_: int, flow_template_id: int, initiator: int,
                  current_step: str, status, description, created_on,
-                 updated_on):
+                 updated_on, version=0):
         """
         :param id_: 每个flow运行实例都会有一个唯一ID
         :param flow_template_id: 所属的flow_template
         :param initiator: 发起人
-        :param current_step: 当前执行到的步骤
+        :param current_step: 当前执行到的步骤，存在并行分支时以逗号分隔
         :param status: 执行状态
         :param created_on: 创建时间
         :param updated_on: 最新更新步骤时间
+        :param version: 版本号，每次状态变化时递增
         """
 
         self.id = id_
@@ -161,3 +268,129 @@ class FlowInstance:
         self.description = description
         self.created_on = created_on
         self.updated_on = updated_on
+        self.version = version
+
+    @property
+    def current_steps(self):
+        """当前所有活跃的step集合
+        """
+        return parse_steps(self.current_step)
+
+
+class FlowEventType:
+
+    """flow instance的状态变更事件
+    """
+
+    FLOW_START = "flow_start"  # flow开始运行
+
+    STEP_TRIGGER = "step_trigger"  # step被触发
+
+    STEP_FINISH = "step_finish"  # step完成
+
+    FLOW_FINISH = "flow_finish"  # flow完成
+
+    FLOW_STOP = "flow_stop"  # flow被终止
+
+
+class FlowEvent:
+
+    """flow instance的状态变更事件，与状态变更在同一个事务中写入，
+       通过FlowEventHub推送给订阅者
+    """
+
+    def __init__(self, id_: int, flow_instance_id: int,
+                 flow_template_id: int, initiator: int, event_type: str,
+                 step: str, created_on):
+        """
+        :param id_: 事件编号，单调递增，可用于断线之后的续传
+        :param flow_instance_id: 所属的flow instance
+        :param flow_template_id: flow instance所属的flow template
+        :param initiator: flow instance的发起人
+        :param event_type: 事件类型，见FlowEventType
+        :param step: 事件相关的step，flow级别的事件可能为空
+        :param created_on: 事件发生时间
+        """
+        self.id = id_
+        self.flow_instance_id = flow_instance_id
+        self.flow_template_id = flow_template_id
+        self.initiator = initiator
+        self.event_type = event_type
+        self.step = step
+        self.created_on = created_on
+
+
+def parse_steps(steps_str):
+    """将逗号分隔的step字符串解析为集合
+    """
+    if not steps_str:
+        return frozenset()
+    return frozenset(steps_str.split(","))
+
+
+def format_steps(steps):
+    """将step集合转换为逗号分隔的字符串，按名称排序以保证结果稳定
+    """
+    return ",".join(sorted(steps))
+
+
+class FlowExecutionState:
+
+    """执行一个action之前所需的flow运行状态快照，
+       包括flow instance、flow template、各个step的job instance以及已经执行过的action，
+       该对象在创建之后不可修改
+    """
+
+    __slots__ = (
+        "_flow_instance",
+        "_flow_template",
+        "_actor_existed",
+        "_job_instances",
+        "_executed_actions",
+    )
+
+    def __init__(self, flow_instance, flow_template, actor_existed,
+                 job_instances, executed_actions):
+        """
+        :param flow_instance: flow实例
+        :param flow_template: flow实例所属的flow模板，可能为None
+        :param actor_existed: action执行者是否存在
+        :param job_instances: step_name到job instance的映射
+        :param executed_actions: step_name到已执行action名称集合的映射
+        """
+        object.__setattr__(self, "_flow_instance", flow_instance)
+        object.__setattr__(self, "_flow_template", flow_template)
+        object.__setattr__(self, "_actor_existed", actor_existed)
+        object.__setattr__(self, "_job_instances", dict(job_instances))
+        object.__setattr__(self, "_executed_actions", {
+            step: frozenset(actions)
+            for step, actions in executed_actions.items()
+        })
+
+    def __setattr__(self, name, value):
+        raise AttributeError("FlowExecutionState is immutable")
+
+    @property
+    def flow_instance(self):
+        return self._flow_instance
+
+    @property
+    def flow_template(self):
+        return self._flow_template
+
+    @property
+    def actor_existed(self):
+        return self._actor_existed
+
+    def get_job_instance(self, step_name):
+        """获取指定step的job instance，不存在则返回None
+        """
+        return self._job_instances.get(step_name)
+
+    def get_executed_actions(self, step_name):
+        """获取指定step已经执行过的action名称集合
+        """
+        return self._executed_actions.get(step_name, frozenset())
+
+    def is_action_executed(self, step_name, action):
+        return action in self.get_executed_actions(step_name)
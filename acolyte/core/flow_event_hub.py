@@ -0,0 +1,275 @@
+"""flow状态变更事件的推送
+
+   FlowExecutorService在变更状态的同一个事务中写入flow_event记录，
+   各进程中的FlowEventHub通过后台线程按ID增量读取新的事件，再分发给本进程中的订阅者，
+   因此多进程、多节点部署时任何一个节点上的订阅者都能收到全部的事件。
+   同步线程在第一个订阅者出现时才会启动，不提供推送服务的进程没有额外的开销
+"""
+
+import time
+import asyncio
+import datetime
+import threading
+import collections
+from acolyte.util import log
+from acolyte.core.storage.flow_event import FlowEventDAO
+
+
+class FlowEventHub:
+
+    """进程内的事件分发中心，订阅者按频道订阅，频道由(频道类型, ID)组成
+    """
+
+    CHANNEL_FLOW_INSTANCE = "flow_instance"  # 单个flow instance
+
+    CHANNEL_FLOW_TEMPLATE = "flow_template"  # 某个template的所有instance
+
+    CHANNEL_INITIATOR = "initiator"  # 某个用户发起的所有instance
+
+    # 每次同步以及补发读取的最大事件数目
+    BATCH_SIZE = 1000
+
+    # ID较小的事务可能晚于ID较大的事务提交，同步时跳过的ID会在该时间(秒)内被重新查询，
+    # 超过该时间仍未出现的ID视为所在的事务已经回滚
+    GAP_TIMEOUT = 60
+
+    # 最多跟踪的空缺ID数目，超过时放弃最早的空缺
+    MAX_GAPS = 1000
+
+    # 清理过期事件时使用的分布式锁，保证同一时间只有一个进程在执行清理
+    PURGE_LOCK = "acolyte_flow_event_purge"
+
+    def __init__(self, db, poll_interval=1, retention=86400):
+        """
+        :param db: 数据源
+        :param poll_interval: 同步事件的间隔(秒)，小于等于0则不启动同步线程
+        :param retention: 事件记录的保留时间(秒)，断线之后只能补发该时间内的事件
+        """
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._db = db
+        self._dao = FlowEventDAO(db)
+        self._subscriptions = {}  # channel -> set(Subscription)
+        self._lock = threading.Lock()
+        self._last_id = None
+        self._gaps = collections.OrderedDict()  # 空缺的ID -> 发现的时间
+        self._started = False
+        self._last_purge_time = None
+        self._stopped = threading.Event()
+
+    def subscribe(self, channels, max_pending=1000):
+        """订阅事件，需要在event loop中调用，事件会被投递到当前的event loop
+           :param channels: (频道类型, ID)列表
+           :param max_pending: 最多积压的事件数目，超过时积压的事件会被丢弃
+        """
+        subscription = Subscription(self, channels, max_pending)
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscriptions.setdefault(
+                    channel, set()).add(subscription)
+            start = not self._started and self.poll_interval > 0
+            self._started = True
+
+        if start:
+            poll_thread = threading.Thread(
+                target=self._poll_loop, name="acolyte-flow-event")
+            poll_thread.daemon = True
+            poll_thread.start()
+
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscriptions = self._subscriptions.get(channel)
+                if subscriptions is None:
+                    continue
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[channel]
+
+    def stop(self):
+        self._stopped.set()
+
+    def _poll_loop(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                log.acolyte.exception("poll flow event error")
+            if self._stopped.wait(self.poll_interval):
+                break
+
+    def poll(self):
+        """读取新的事件并分发，第一次调用时只记录当前的最大ID
+        """
+        if self._last_id is None:
+            self._last_id = self._dao.query_max_id()
+            return
+
+        while True:
+            events = self._dao.query_after(self._last_id, self.BATCH_SIZE)
+            if events:
+                self._track_gaps(events)
+                self.dispatch(events)
+            if len(events) < self.BATCH_SIZE:
+                break
+        self._poll_gaps()
+        self._purge()
+
+    def _track_gaps(self, events):
+        """记录两次读取之间跳过的ID，并推进_last_id
+        """
+        now = time.time()
+        for event in events:
+            first_missing = max(
+                self._last_id + 1, event.id - self.MAX_GAPS)
+            for missing_id in range(first_missing, event.id):
+                self._gaps[missing_id] = now
+            self._last_id = event.id
+        while len(self._gaps) > self.MAX_GAPS:
+            self._gaps.popitem(last=False)
+
+    def _poll_gaps(self):
+        """重新查询空缺的ID，分发后来提交的事件
+        """
+        if not self._gaps:
+            return
+        events = self._dao.query_by_id_list(list(self._gaps))
+        for event in events:
+            del self._gaps[event.id]
+        expire_time = time.time() - self.GAP_TIMEOUT
+        while self._gaps and \
+                next(iter(self._gaps.values())) < expire_time:
+            self._gaps.popitem(last=False)
+        if events:
+            self.dispatch(events)
+
+    def dispatch(self, events):
+        """将事件分发给订阅了相关频道的订阅者，可以在任意线程中调用
+        """
+        matched = collections.OrderedDict()
+        with self._lock:
+            for event in events:
+                for channel in event_channels(event):
+                    for subscription in self._subscriptions.get(channel, ()):
+                        subscription_events = matched.setdefault(
+                            subscription, [])
+                        # 同一个事件可能匹配订阅者的多个频道
+                        if not subscription_events or \
+                                subscription_events[-1] is not event:
+                            subscription_events.append(event)
+        for subscription, subscription_events in matched.items():
+            subscription.put(subscription_events)
+
+    def replay(self, subscription, last_event_id):
+        """查询指定事件之后订阅者错过的事件，用于断线重连
+           :return: (事件列表, 是否完整)，错过的事件过多时只返回一部分
+        """
+        column_values = collections.OrderedDict()
+        for channel_type, id_ in sorted(subscription.channels):
+            column_values.setdefault(
+                _CHANNEL_COLUMNS[channel_type], []).append(id_)
+        events = self._dao.query_after_by_columns(
+            last_event_id, column_values, self.BATCH_SIZE)
+        return events, len(events) < self.BATCH_SIZE
+
+    def _purge(self):
+        # 每小时最多清理一次过期的事件记录
+        now = datetime.datetime.now()
+        if self._last_purge_time is not None and \
+                (now - self._last_purge_time).total_seconds() < 3600:
+            return
+        self._last_purge_time = now
+
+        # 所有同步事件的进程都会走到这里，没能获取到锁说明其它进程正在清理
+        lock_manager = self._db.lock_manager
+        if not lock_manager.acquire(self.PURGE_LOCK, 0):
+            return
+        try:
+            self._dao.delete_before(
+                now - datetime.timedelta(seconds=self.retention))
+        finally:
+            lock_manager.release(self.PURGE_LOCK)
+
+
+# 频道类型在flow_event表中对应的列
+_CHANNEL_COLUMNS = {
+    FlowEventHub.CHANNEL_FLOW_INSTANCE: "flow_instance_id",
+    FlowEventHub.CHANNEL_FLOW_TEMPLATE: "flow_template_id",
+    FlowEventHub.CHANNEL_INITIATOR: "initiator",
+}
+
+
+def event_channels(event):
+    """事件所属的所有频道
+    """
+    return (
+        (FlowEventHub.CHANNEL_FLOW_INSTANCE, event.flow_instance_id),
+        (FlowEventHub.CHANNEL_FLOW_TEMPLATE, event.flow_template_id),
+        (FlowEventHub.CHANNEL_INITIATOR, event.initiator),
+    )
+
+
+class Subscription:
+
+    """订阅者，事件由同步线程投递到订阅者所在的event loop
+    """
+
+    def __init__(self, hub, channels, max_pending):
+        self.channels = frozenset(channels)
+        self.closed = False
+        # 积压的事件过多而被丢弃，订阅者需要重新获取完整的状态
+        self.overflowed = False
+        self._hub = hub
+        self._max_pending = max_pending
+        self._loop = asyncio.get_event_loop()
+        self._events = collections.deque()
+        self._waiter = None
+
+    def matches(self, event):
+        return any(channel in self.channels
+                   for channel in event_channels(event))
+
+    def put(self, events):
+        try:
+            self._loop.call_soon_threadsafe(self._put, events)
+        except RuntimeError:
+            # event loop已经关闭
+            self.closed = True
+
+    def _put(self, events):
+        if self.closed:
+            return
+        self._events.extend(events)
+        if len(self._events) > self._max_pending:
+            self._events.clear()
+            self.overflowed = True
+        self._wake()
+
+    def _wake(self):
+        if self._waiter is not None and not self._waiter.done():
+            self._waiter.set_result(None)
+
+    async def get(self, timeout):
+        """等待新的事件
+           :param timeout: 最长等待时间(秒)，超时返回空列表
+        """
+        if not self._events and not self.closed and not self.overflowed:
+            self._waiter = self._loop.create_future()
+            try:
+                await asyncio.wait_for(self._waiter, timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._waiter = None
+        events = list(self._events)
+        self._events.clear()
+        return events
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self._hub.unsubscribe(self)
+        self._wake()
@@ -1,6 +1,8 @@
 import locale
+import threading
+import collections
 import simplejson as json
-from collections import ChainMap
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Dict, Any
 from acolyte.util import log
 from acolyte.util.json import to_json
@@ -9,41 +11,133 @@ from acolyte.core.service import (
     AbstractService,
     Result,
 )
-from acolyte.core.flow import FlowStatus
-from acolyte.core.job import JobStatus, JobArg
+from acolyte.core.flow import (
+    FlowStatus,
+    FlowEventType,
+    StepGraph,
+    format_steps,
+)
+from acolyte.core.job import JobStatus, ActionStatus
+from acolyte.core.arguments import compile_action_args, compile_start_args
 from acolyte.core.context import MySQLContext
 from acolyte.core.storage.user import UserDAO
 from acolyte.core.storage.flow_template import FlowTemplateDAO
 from acolyte.core.storage.flow_instance import FlowInstanceDAO
+from acolyte.core.storage.flow_instance_counter import FlowInstanceCounterDAO
 from acolyte.core.storage.job_instance import JobInstanceDAO
 from acolyte.core.storage.job_action_data import JobActionDataDAO
-from acolyte.core.message import default_validate_messages
+from acolyte.core.storage.flow_execution_state import FlowExecutionStateDAO
+from acolyte.core.storage.flow_event import FlowEventDAO
+from acolyte.core.message import messages, default_validate_messages
 from acolyte.util.validate import (
     IntField,
     StrField,
     Field,
     check,
+    bad_req_result,
     BadReq,
     InvalidFieldException
 )
-from acolyte.exception import ObjectNotFoundException
+from acolyte.util.concurrent import ExecutorFullException
+from acolyte.util.lang import get_from_nested_dict
+from acolyte.util.cache import LRUCache
+from acolyte.exception import (
+    ObjectNotFoundException,
+    ConcurrentModificationException
+)
+
+
+def _check_flow_instance_id_list(field_name, value):
+    """检查批量操作的flow instance id列表，去重并保持原有顺序
+    """
+    if not value:
+        raise InvalidFieldException(
+            field_name, value, "less_than_min_length", 1)
+    try:
+        id_list = list(collections.OrderedDict.fromkeys(
+            int(flow_instance_id) for flow_instance_id in value))
+    except (TypeError, ValueError):
+        raise InvalidFieldException(field_name, value, "invalid_type", list)
+    if len(id_list) > FlowExecutorService.MAX_BATCH_SIZE:
+        raise InvalidFieldException(
+            field_name, value, "more_than_max_length",
+            FlowExecutorService.MAX_BATCH_SIZE)
+    return id_list
+
+
+def _check_start_flow_list(field_name, value):
+    """检查批量开启的flow列表，并为每项填充默认值
+    """
+    if not value:
+        raise InvalidFieldException(
+            field_name, value, "less_than_min_length", 1)
+    if len(value) > FlowExecutorService.MAX_BATCH_SIZE:
+        raise InvalidFieldException(
+            field_name, value, "more_than_max_length",
+            FlowExecutorService.MAX_BATCH_SIZE)
+
+    description_field = StrField("description", required=True, max_len=20)
+    start_flow_args_field = Field(
+        "start_flow_args", type_=dict, required=False, default=None)
+
+    flows = []
+    for idx, flow in enumerate(value):
+        try:
+            if not isinstance(flow, dict):
+                raise InvalidFieldException("", flow, "invalid_type", dict)
+            flows.append({
+                "description": description_field(flow.get("description")),
+                "start_flow_args": start_flow_args_field(
+                    flow.get("start_flow_args")) or {}
+            })
+        except InvalidFieldException as e:
+            raise InvalidFieldException(
+                "{field_name}.{idx}.{sub_field}".format(
+                    field_name=field_name, idx=idx, sub_field=e.field_name
+                ).rstrip("."), e.value, e.reason, e.expect)
+    return flows
 
 
 class FlowExecutorService(AbstractService):
 
+    # 批量执行action时最多允许的flow instance数目
+    MAX_BATCH_SIZE = 100
+
+    # 批量执行action时的并发数
+    BATCH_CONCURRENCY = 4
+
+    # 后台action因为版本冲突而重试的次数
+    MAX_CONFLICT_RETRIES = 3
+
     def __init__(self, service_container: ServiceContainer):
         super().__init__(service_container)
 
     def _after_register(self):
         # 获取各种所依赖的服务
         self._db = self._("db")
-        self._flow_tpl_dao = FlowTemplateDAO(self._db)
+        entity_cache = self._("entity_cache")
+        self._flow_tpl_dao = FlowTemplateDAO(self._db, entity_cache)
         self._flow_meta_mgr = self._("flow_meta_manager")
         self._job_mgr = self._("job_manager")
         self._flow_instance_dao = FlowInstanceDAO(self._db)
-        self._user_dao = UserDAO(self._db)
+        self._flow_instance_counter_dao = FlowInstanceCounterDAO(self._db)
+        self._user_dao = UserDAO(self._db, entity_cache)
         self._job_instance_dao = JobInstanceDAO(self._db)
         self._job_action_dao = JobActionDataDAO(self._db)
+        self._flow_execution_state_dao = FlowExecutionStateDAO(self._db)
+        self._flow_event_dao = FlowEventDAO(self._db)
+        self._action_executor = self._("action_executor")
+        self._action_queue = self._("action_queue")
+        # 已经分发到后台线程池尚未执行完毕的action，action_id -> future
+        self._dispatched = {}
+        self._dispatched_lock = threading.Lock()
+        # 编译好的参数解析计划，flow template不可变，因此永不过期，
+        # flow meta和job重新加载之后管理器的版本号会变化，旧的计划随之失效
+        self._action_arg_plans = LRUCache(max_size=4096, ttl=0)
+        self._start_arg_plans = LRUCache(max_size=256, ttl=0)
+        # 所有批量请求共享，限制批量action对数据库连接的占用
+        self._batch_executor = ThreadPoolExecutor(
+            max_workers=self.BATCH_CONCURRENCY)
 
     @check(
         IntField("flow_template_id", required=True),
@@ -59,10 +153,12 @@ class FlowExecutorService(AbstractService):
 
            S1. 根据flow_template_id获取flow_template，然后获取flow_meta，如果获取失败，返回错误
            S2. 检查并合并参数
-           S3. 检查max_run_instance
-           S4. 创建一条新的flow_instance记录
+           S3. 创建一条新的flow_instance记录
+           S4. 通过计数器的条件更新占用max_run_instance名额
            S5. 创建context
            S6. 回调flow meta中on_start方法的逻辑
+           S3 - S6 在同一个事务中执行，on_start出现异常或者名额不足时不会留下任何记录，
+           名额在回调on_start之前占用，名额不足时on_start不会被执行
 
            :param flow_template_id: 使用的flow template
            :param initiator: 发起人
@@ -73,6 +169,102 @@ class FlowExecutorService(AbstractService):
         if start_flow_args is None:
             start_flow_args = {}
 
+        flow_template, flow_meta, plan = self._check_start_flow(
+            flow_template_id, initiator)
+
+        # 检查并合并start_flow_args
+        rs = self._resolve_args(plan, start_flow_args)
+        if rs.status_code == Result.STATUS_BADREQUEST:
+            return rs
+        start_flow_args = rs.data
+
+        # 名额已满时尽早拒绝，最终以事务中的条件更新为准
+        self._check_instance_capacity(flow_template, 1)
+
+        with self._db.transaction():
+
+            flow_instance = self._flow_instance_dao.insert(
+                flow_template_id, initiator, description)
+
+            # on_start可能产生外部的副作用，必须先确认占用到了名额
+            self._acquire_instance_slots(flow_template, 1)
+
+            # 创建Context
+            ctx = MySQLContext(self, self._db, flow_instance.id)
+
+            # 回调on_start
+            flow_meta.on_start(ctx, **start_flow_args)
+
+            # 将on_start中写入上下文的数据一次性写回
+            ctx.flush()
+
+            # 将状态更新到running
+            self._flow_instance_dao.update_status(
+                flow_instance.id, FlowStatus.STATUS_RUNNING,
+                flow_instance.version)
+            self._flow_event_dao.insert(
+                flow_instance.id, FlowEventType.FLOW_START)
+
+        log.acolyte.info(
+            "start flow instance {}".format(to_json(flow_instance)))
+
+        return Result.ok(data=flow_instance)
+
+    @check(
+        IntField("flow_template_id", required=True),
+        IntField("initiator", required=True),
+        Field("flows", type_=list, required=True, value_of=json.loads,
+              check_logic=_check_start_flow_list),
+    )
+    def start_flows(self, flow_template_id: int, initiator: int,
+                    flows: list) -> Result:
+        """基于同一个flow template批量开启flow进程
+
+           S1. 检查flow template、flow meta以及发起者，只执行一次
+           S2. 检查并合并每个实例的参数，任何一个不合法都不会创建实例
+           S3. 通过一条insert语句创建所有实例，并一次性占用max_run_instance名额，
+               S3在同一个事务中执行，名额不足时一个实例也不会创建
+           S4. 在有界的线程池中并发回调on_start，每个实例使用独立的事务，
+               on_start出现异常的实例会被删除，不影响其它实例
+
+           :param flow_template_id: 使用的flow template
+           :param initiator: 发起人
+           :param flows: 实例列表，每项包含description以及start_flow_args
+           :return: 按照请求顺序排列的每个实例的创建结果
+        """
+        flow_template, flow_meta, plan = self._check_start_flow(
+            flow_template_id, initiator)
+
+        start_flow_args_list = []
+        for idx, flow in enumerate(flows):
+            try:
+                start_flow_args_list.append(
+                    plan.resolve(flow["start_flow_args"]))
+            except InvalidFieldException as e:
+                return self._gen_bad_req_result(
+                    e, "flows.{idx}.{field_name}".format(
+                        idx=idx, field_name=e.field_name))
+
+        self._check_instance_capacity(flow_template, len(flows))
+        with self._db.transaction():
+            flow_instances = self._flow_instance_dao.insert_many(
+                flow_template_id, initiator,
+                [flow["description"] for flow in flows])
+            self._acquire_instance_slots(flow_template, len(flows))
+
+        futures = [
+            self._batch_executor.submit(
+                self._run_on_start, flow_meta, flow_instance, start_flow_args)
+            for flow_instance, start_flow_args in zip(
+                flow_instances, start_flow_args_list)
+        ]
+        return Result.ok(data=[future.result() for future in futures])
+
+    def _check_start_flow(self, flow_template_id, initiator):
+        """检查flow template、flow meta以及发起者
+           :return: flow template、flow meta以及编译好的start参数解析计划
+        """
+
         # 检查flow_template_id是否合法
         flow_template = self._flow_tpl_dao.query_flow_template_by_id(
             flow_template_id)
@@ -88,46 +280,72 @@ class FlowExecutorService(AbstractService):
         if initiator_user is None:
             raise BadReq("invalid_initiator", initiator=initiator)
 
-        # 检查并合并start_flow_args
-        field_rules = getattr(flow_meta.on_start, "field_rules", [])
-        rs = self._combine_and_check_args(
-            "start", field_rules, start_flow_args, flow_meta.start_args)
-        if rs.status_code == Result.STATUS_BADREQUEST:
-            return rs
-        start_flow_args = rs.data
+        plan_key = (flow_meta.name, self._flow_meta_mgr.version)
+        plan = self._start_arg_plans.get(plan_key)
+        if plan is None:
+            plan = compile_start_args(flow_meta)
+            self._start_arg_plans.put(plan_key, plan)
 
-        # 锁定检查instance数目并创建第一条记录
-        flow_instance = None
-        if flow_template.max_run_instance > 0:
-            lock_key = "lock_instance_create_{tpl_id}".format(
-                tpl_id=flow_template_id)
-            with self._db.lock(lock_key):
-                current_instance_num = self._flow_instance_dao.\
-                    query_running_instance_num_by_tpl_id(flow_template_id)
-                if current_instance_num >= flow_template.max_run_instance:
-                    raise BadReq(
-                        reason="too_many_instance",
-                        allow_instance_num=flow_template.max_run_instance
-                    )
-                flow_instance = self._flow_instance_dao.insert(
-                    flow_template_id, initiator, description)
-        else:
-            flow_instance = self._flow_instance_dao.insert(
-                flow_template_id, initiator, description)
+        return flow_template, flow_meta, plan
 
-        # 创建Context
-        ctx = MySQLContext(self, self._db, flow_instance.id)
+    def _check_instance_capacity(self, flow_template, instance_num):
+        """通过非锁定读检查是否还有instance_num个名额，只用于提前拒绝，
+           计数不存在时在事务之外根据现有实例进行初始化
+        """
+        if flow_template.max_run_instance <= 0:
+            return
+        running_num = self._flow_instance_counter_dao.query_running_num(
+            flow_template.id)
+        if running_num is None:
+            self._flow_instance_counter_dao.init_by_instances(
+                flow_template.id)
+            running_num = self._flow_instance_counter_dao.query_running_num(
+                flow_template.id)
+        if running_num + instance_num > \
+                flow_template.max_run_instance:
+            raise BadReq(
+                reason="too_many_instance",
+                allow_instance_num=flow_template.max_run_instance
+            )
 
-        # 回调on_start
-        flow_meta.on_start(ctx, **start_flow_args)
+    def _acquire_instance_slots(self, flow_template, instance_num):
+        """在当前事务中占用instance_num个名额，名额不足时抛出BadReq使事务回滚
+        """
+        if flow_template.max_run_instance <= 0:
+            return
+        if not self._flow_instance_counter_dao.acquire(
+                flow_template.id, instance_num,
+                flow_template.max_run_instance):
+            raise BadReq(
+                reason="too_many_instance",
+                allow_instance_num=flow_template.max_run_instance
+            )
 
-        # 将状态更新到running
-        self._flow_instance_dao.update_status(
-            flow_instance.id, FlowStatus.STATUS_RUNNING)
+    def _run_on_start(self, flow_meta, flow_instance, start_flow_args):
+        """在独立的事务中回调on_start并将实例更新为running状态
+        """
+        try:
+            with self._db.transaction():
+                ctx = MySQLContext(self, self._db, flow_instance.id)
+                flow_meta.on_start(ctx, **start_flow_args)
+                ctx.flush()
+                self._flow_instance_dao.update_status(
+                    flow_instance.id, FlowStatus.STATUS_RUNNING,
+                    flow_instance.version)
+                self._flow_event_dao.insert(
+                    flow_instance.id, FlowEventType.FLOW_START)
+        except Exception as e:
+            log.acolyte.exception(
+                "on_start of flow instance {} error".format(flow_instance.id))
+            with self._db.transaction():
+                self._flow_instance_counter_dao.release_by_instance_id(
+                    flow_instance.id)
+                self._flow_instance_dao.delete_by_instance_id(
+                    flow_instance.id)
+            return Result.service_error("on_start_exception", msg=str(e))
 
         log.acolyte.info(
             "start flow instance {}".format(to_json(flow_instance)))
-
         return Result.ok(data=flow_instance)
 
     @check(
@@ -151,75 +369,238 @@ class FlowExecutorService(AbstractService):
            S6. 回调相关Action逻辑
            S7. 返回回调函数的返回值
 
+           整个过程(包括action通过context回调的finish/stop)在同一个事务中执行，
+           出现异常时所有的修改都会被回滚
+
+           被background_action修饰的action会在记录之后被分发到后台线程池执行，
+           此时会立即返回action_id以及running状态，调用者可通过JobService轮询执行结果
+
+           每个action都会比较并递增flow instance的版本号，
+           同一个实例上的并发请求只有一个能够成功，其余的返回409，调用者可以重试
+
            :param flow_instance_id: flow的标识
            :param target_step: 要执行的Step
            :param target_action: 自定义的动作名称
            :param actor: 执行人
            :param action_args: 执行该自定义动作所需要的参数
         """
+        try:
+            with self._db.transaction():
+                rs, background_action_id = self._handle_job_action(
+                    flow_instance_id, target_step, target_action,
+                    actor, action_args)
+        except ConcurrentModificationException:
+            return self._conflict_result()
+
+        # 后台action要在事务提交之后再分发，保证后台线程能读取到action记录
+        if background_action_id is not None:
+            return self._dispatch_action(background_action_id)
+
+        return rs
+
+    @check(
+        Field("flow_instance_ids", type_=list, required=True,
+              value_of=json.loads, check_logic=_check_flow_instance_id_list),
+        StrField("target_step", required=True),
+        StrField("target_action", required=True),
+        IntField("actor", required=True),
+        Field("action_args", type_=dict, required=False,
+              default=None, value_of=json.loads)
+    )
+    def handle_job_action_batch(self, flow_instance_ids: list,
+                                target_step: str, target_action: str,
+                                actor: int,
+                                action_args: Dict[str, Any]) -> Result:
+        """对多个flow instance执行同一个step的同一个action
+
+           S1. 通过一次查询加载所有flow instance的执行状态
+           S2. 每个flow template的参数只合并检查一次
+           S3. 在有界的线程池中并发执行，每个flow instance使用独立的事务，
+               一个实例的失败不会影响其它实例
+
+           :param flow_instance_ids: flow实例ID列表
+           :param target_step: 要执行的Step
+           :param target_action: 自定义的动作名称
+           :param actor: 执行人
+           :param action_args: 执行该自定义动作所需要的参数
+           :return: 按照请求顺序排列的每个实例的执行结果
+        """
+        states = self._flow_execution_state_dao.query_states(
+            flow_instance_ids, actor)
+
+        # flow template id -> 参数合并检查的结果，
+        # 在提交到线程池之前由请求线程完成，执行线程只读取结果
+        arg_results = {}
+        for state in states.values():
+            flow_template = state.flow_template
+            if flow_template is None or flow_template.id in arg_results:
+                continue
+            arg_results[flow_template.id] = self._check_batch_action_args(
+                flow_template, target_step, target_action, action_args)
+
+        futures = [
+            self._batch_executor.submit(
+                self._handle_job_action_in_batch, flow_instance_id,
+                target_step, target_action, actor, action_args,
+                states.get(flow_instance_id), arg_results)
+            for flow_instance_id in flow_instance_ids
+        ]
+
+        return Result.ok(data=[
+            {"flow_instance_id": flow_instance_id, "result": future.result()}
+            for flow_instance_id, future in zip(flow_instance_ids, futures)
+        ])
+
+    def _check_batch_action_args(self, flow_template, target_step,
+                                 target_action, action_args):
+        """批量执行之前合并检查某个flow template的参数，
+           template、step或者action本身不合法时返回None，由每个实例的检查流程给出具体的错误
+        """
+        try:
+            flow_meta = self._flow_meta_mgr.get(flow_template.flow_meta)
+            job_ref = flow_meta.get_job_ref_by_step_name(target_step)
+            if job_ref is None:
+                return None
+            job_def = self._job_mgr.get(job_ref.job_name)
+        except ObjectNotFoundException:
+            return None
+        if getattr(job_def, "on_" + target_action, None) is None:
+            return None
+        return self._check_and_combine_action_args(
+            job_def, target_action,
+            {} if action_args is None else action_args,
+            job_ref, flow_template)
+
+    def _handle_job_action_in_batch(
+            self, flow_instance_id, target_step, target_action,
+            actor, action_args, state, arg_results):
+        try:
+            if state is None:
+                raise BadReq("invalid_flow_instance",
+                             flow_instance_id=flow_instance_id)
+            with self._db.transaction():
+                rs, background_action_id = self._handle_job_action(
+                    flow_instance_id, target_step, target_action,
+                    actor, action_args, state, arg_results)
+        except BadReq as e:
+            return bad_req_result(self, "handle_job_action", e)
+        except ConcurrentModificationException:
+            return self._conflict_result()
+        except Exception as e:
+            log.acolyte.exception(
+                "Job action on flow instance {} error".format(
+                    flow_instance_id))
+            return Result.service_error("action_exception", msg=str(e))
+
+        if background_action_id is not None:
+            return self._dispatch_action(background_action_id)
+
+        return rs
+
+    def _handle_job_action(self, flow_instance_id, target_step,
+                           target_action, actor, action_args,
+                           state=None, arg_results=None):
+        """
+        :param state: 预先加载的执行状态，为None时在此加载
+        :param arg_results: 批量执行时预先完成的参数检查结果，
+           flow template id -> Result，被多个线程共享，只读
+        """
 
         if action_args is None:
             action_args = {}
 
+        # 一次性加载flow instance、template、job instance以及已执行的action
+        if state is None:
+            state = self._flow_execution_state_dao.query_state(
+                flow_instance_id, actor)
+
         # 检查flow instance的id合法性
-        flow_instance = self._flow_instance_dao.query_by_instance_id(
-            flow_instance_id)
-        if flow_instance is None:
+        if state is None:
             raise BadReq("invalid_flow_instance",
                          flow_instance_id=flow_instance_id)
+        flow_instance = state.flow_instance
 
         # 检查flow instance的状态
         if flow_instance.status != FlowStatus.STATUS_RUNNING:
             raise BadReq("invalid_status", status=flow_instance.status)
 
         # 获取对应的flow template和flow meta
-        flow_template = self._flow_tpl_dao\
-            .query_flow_template_by_id(flow_instance.flow_template_id)
+        flow_template = state.flow_template
         if flow_template is None:
             raise BadReq("unknown_flow_template",
                          flow_template_id=flow_instance.flow_template_id)
         try:
             flow_meta = self._flow_meta_mgr.get(flow_template.flow_meta)
         except ObjectNotFoundException:
-            raise BadReq("unknown_flow_meta", flow_meta=flow_meta)
+            raise BadReq("unknown_flow_meta",
+                         flow_meta=flow_template.flow_meta)
 
-        actor_info = self._user_dao.query_user_by_id(actor)
-        if actor_info is None:
+        if not state.actor_existed:
             raise BadReq("invalid_actor", actor=actor)
 
         # 检查当前step以及当前step是否完成
         # 检查下一个状态是否是目标状态
         handler_mtd, job_def, job_ref = self._check_step(
-            flow_meta, flow_instance, target_step, target_action)
+            flow_meta, state, target_step, target_action)
 
         # 合并检查参数 request_args - template_bind_args - meta_bind_args
-        rs = self._check_and_combine_action_args(
-            job_def, target_action, action_args, job_ref, flow_template)
+        rs = None if arg_results is None else \
+            arg_results.get(flow_template.id)
+        if rs is None:
+            rs = self._check_and_combine_action_args(
+                job_def, target_action, action_args, job_ref, flow_template)
         if rs.status_code == Result.STATUS_BADREQUEST:
-            return rs
-
-        job_instance = self._job_instance_dao.query_by_instance_id_and_step(
-            instance_id=flow_instance_id,
-            step=target_step
-        )
-
-        # 如果是trigger事件，需要创建job_instance记录
-        if target_action == "trigger":
+            return rs, None
+
+        background = getattr(handler_mtd, "background", False)
+        if background and not self._action_queue.enabled and \
+                self._action_executor.is_full():
+            return self._executor_busy_result(), None
+
+        job_instance = state.get_job_instance(target_step)
+
+        # 如果是trigger事件，需要创建job_instance记录，
+        # 被触发的step取代其前驱成为活跃的step，
+        # 后台执行失败的trigger重试时，job_instance已经存在
+        # 所有的修改都以快照中的版本号为前提，版本号不一致说明快照已经过期
+        if target_action == "trigger" and job_instance is None:
+            current_steps = (flow_instance.current_steps -
+                             flow_meta.get_prev_steps(target_step)) | \
+                {target_step}
+            if not self._flow_instance_dao.update_current_step(
+                    flow_instance_id, format_steps(current_steps),
+                    flow_instance.version):
+                raise self._conflict(flow_instance)
             job_instance = self._job_instance_dao.insert(
                 flow_instance_id, target_step, actor)
-            self._flow_instance_dao.update_current_step(
-                flow_instance_id, target_step)
+            self._flow_event_dao.insert(
+                flow_instance_id, FlowEventType.STEP_TRIGGER, target_step)
+        elif not self._flow_instance_dao.increase_version(
+                flow_instance_id, flow_instance.version):
+            raise self._conflict(flow_instance)
 
-        action_args = rs.data
+        # 批量执行时参数检查结果被多个实例共享，复制之后再交给action
+        action_args = dict(rs.data)
 
         action = self._job_action_dao.insert(
             job_instance_id=job_instance.id,
             action=target_action,
             actor=actor,
             arguments=action_args,
-            data={}
+            data={},
+            status=ActionStatus.STATUS_RUNNING if background
+            else ActionStatus.STATUS_FINISHED
         )
 
+        if background:
+            if self._action_queue.enabled:
+                # 与action记录在同一个事务中入队，由worker进程领取执行
+                self._action_queue.enqueue(action.id)
+                return self._background_action_result(action.id), None
+            # 在本进程中执行，通过租约记录归属，进程崩溃之后action会被标记为exception
+            self._action_queue.lease_local(action.id)
+            return None, action.id
+
         ctx = MySQLContext(
             flow_executor=self,
             db=self._db,
@@ -230,9 +611,7 @@ class FlowExecutorService(AbstractService):
             current_step=target_step
         )
 
-        rs = handler_mtd(ctx, **action_args)
-        if not isinstance(rs, Result):
-            rs = Result.ok(data=rs)
+        rs = self._invoke_handler(handler_mtd, ctx, action_args)
 
         if not rs.is_success():
             # 如果返回结果不成功，那么允许重来
@@ -247,56 +626,218 @@ class FlowExecutorService(AbstractService):
             action_result=to_json(rs)
         ))
 
-        return rs
+        return rs, None
 
-    def _check_and_combine_action_args(
-            self, job_def, target_action, request_args,
-            job_ref, flow_template):
+    def _invoke_handler(self, handler_mtd, ctx, action_args):
+        """回调action handler，并将上下文的修改写回
+        """
+        rs = handler_mtd(ctx, **action_args)
+        if not isinstance(rs, Result):
+            rs = Result.ok(data=rs)
 
-        job_arg_defines = job_def.job_args.get(target_action)
+        # action以及on_finish、on_stop等回调对上下文的修改在这里统一写回
+        ctx.flush()
+        return rs
 
-        # 无参数定义
-        if not job_arg_defines:
-            return Result.ok(data={})
+    def _dispatch_action(self, action_id):
+        """将已经记录的action分发到后台线程池执行
+        """
+        try:
+            future = self._action_executor.submit(self.run_action, action_id)
+        except ExecutorFullException:
+            self._job_action_dao.update_status(
+                action_id, ActionStatus.STATUS_EXCEPTION,
+                data={"error": "executor_busy"})
+            self._action_queue.release_local(action_id)
+            return self._executor_busy_result()
+        with self._dispatched_lock:
+            self._dispatched[action_id] = future
+        future.add_done_callback(
+            lambda _: self._undispatch(action_id))
 
-        # 获取各级的参数绑定
-        meta_bind_args = job_ref.bind_args.get(target_action, {})
-        tpl_bind_args = flow_template.bind_args.get(
-            job_ref.step_name, {}).get(target_action, {})
+        log.acolyte.info(
+            "Job action {} dispatched to background".format(action_id))
+        return self._background_action_result(action_id)
 
-        args_chain = ChainMap(request_args, tpl_bind_args, meta_bind_args)
+    def _undispatch(self, action_id):
+        with self._dispatched_lock:
+            self._dispatched.pop(action_id, None)
+        try:
+            self._action_queue.release_local(action_id)
+        except Exception:
+            # 租约到期之后action会被标记为exception
+            log.acolyte.exception(
+                "release lease of job action {} error".format(action_id))
+
+    def drain_actions(self, timeout):
+        """进程退出之前调用，尚未开始执行的后台action直接取消并记为exception，
+           正在执行的action最多等待timeout秒，之后关闭后台线程池
+           :param timeout: 最长等待时间(秒)
+           :return: 超时之后依然没有执行完毕的action编号列表
+        """
+        with self._dispatched_lock:
+            dispatched = dict(self._dispatched)
+
+        for action_id, future in dispatched.items():
+            if future.cancel():
+                self._job_action_dao.update_status(
+                    action_id, ActionStatus.STATUS_EXCEPTION,
+                    data={"error": "worker_exit"})
+        running = [future for future in dispatched.values()
+                   if not future.cancelled()]
+        if running:
+            wait(running, timeout)
+        self._action_executor.shutdown(wait=False)
+
+        # 正在执行的action持有记录的行锁，进程退出之后事务回滚，
+        # 记录依然是running状态，由过期检查将其记为exception
+        unfinished = [action_id for action_id, future in dispatched.items()
+                      if not future.done()]
+        if unfinished:
+            log.acolyte.error(
+                "Job actions {} are still running when worker exit".format(
+                    unfinished))
+        return unfinished
+
+    def _conflict(self, flow_instance):
+        return ConcurrentModificationException((
+            "flow instance {id} has been modified, expected version {version}"
+        ).format(id=flow_instance.id, version=flow_instance.version))
+
+    def _conflict_result(self):
+        loc, _ = locale.getlocale(locale.LC_ALL)
+        msg = get_from_nested_dict(
+            messages, loc, "FlowExecutorService",
+            "handle_job_action", "concurrent_modification")
+        return Result.conflict("concurrent_modification", msg=msg)
+
+    def _background_action_result(self, action_id):
+        return Result.ok(data={
+            "action_id": action_id,
+            "status": ActionStatus.STATUS_RUNNING
+        })
+
+    def _executor_busy_result(self):
+        loc, _ = locale.getlocale(locale.LC_ALL)
+        msg = get_from_nested_dict(
+            messages, loc, "FlowExecutorService",
+            "handle_job_action", "executor_busy")
+        return Result.service_unavailable("executor_busy", msg=msg)
+
+    def run_action(self, action_id):
+        """执行一个已经被记录的后台action，执行所需的一切都从action记录中重建，
+           执行结果会被记录到action的status上，出现异常时action中的修改会被回滚，
+           由后台线程池或者action worker调用，对于已经不在running状态的action不会重复执行
+           :param action_id: job_action_data的编号
+        """
+        try:
+            rs = self._run_recorded_action_with_retry(action_id)
+        except Exception as e:
+            log.acolyte.exception(
+                "Job action {} executed with exception".format(action_id))
+            self._job_action_dao.update_status(
+                action_id, ActionStatus.STATUS_EXCEPTION,
+                data={"error": "{}: {}".format(e.__class__.__name__, e)})
+            return Result.service_error("action_exception", msg=str(e))
 
-        # 最终生成使用的参数集合
-        args = {}
+        log.acolyte.info((
+            "Background job action executed, "
+            "action_id = {action_id}, "
+            "action_result = {action_result}"
+        ).format(action_id=action_id, action_result=to_json(rs)))
+        return rs
 
-        for job_arg_define in job_arg_defines:
+    def _run_recorded_action_with_retry(self, action_id):
+        # 与前台请求发生冲突时，由后台自行重试
+        for _ in range(self.MAX_CONFLICT_RETRIES):
             try:
-                arg_name = job_arg_define.name
-
-                # auto 类型，直接从chain中取值
-                if job_arg_define.mark == JobArg.MARK_AUTO:
-                    value = args_chain[arg_name]
-                # static类型，从template中取值
-                elif job_arg_define.mark == JobArg.MARK_STATIC:
-                    value = tpl_bind_args.get(arg_name, None)
-                # const类型，从meta中取值
-                elif job_arg_define.mark == JobArg.MARK_CONST:
-                    value = meta_bind_args.get(arg_name, None)
-
-                args[arg_name] = job_arg_define.field_info(value)
-            except InvalidFieldException as e:
-                full_field_name = "{step}.{action}.{arg}".format(
-                    step=job_ref.step_name,
-                    action=target_action,
-                    arg=arg_name
-                )
-                return self._gen_bad_req_result(e, full_field_name)
+                with self._db.transaction():
+                    return self._run_recorded_action(action_id)
+            except ConcurrentModificationException:
+                log.acolyte.info(
+                    "Job action {} conflicted, retry".format(action_id))
+        with self._db.transaction():
+            return self._run_recorded_action(action_id)
+
+    def _run_recorded_action(self, action_id):
+        # 锁定action记录，避免同一个action被重复执行
+        action = self._job_action_dao.query_by_id_for_update(action_id)
+        if action is None or action.status != ActionStatus.STATUS_RUNNING:
+            log.acolyte.warning(
+                "Job action {} is not running, skip it".format(action_id))
+            return Result.bad_request("action_not_running")
+
+        job_instance = self._job_instance_dao.query_by_id(
+            action.job_instance_id)
+        flow_instance = self._flow_instance_dao.query_by_instance_id(
+            job_instance.flow_instance_id)
+
+        # 等待期间flow已经被终止
+        if flow_instance.status != FlowStatus.STATUS_RUNNING:
+            self._job_action_dao.update_status(
+                action_id, ActionStatus.STATUS_FAILED,
+                data={"reason": "invalid_status",
+                      "status": flow_instance.status})
+            return Result.bad_request(
+                "invalid_status", data={"status": flow_instance.status})
 
-        return Result.ok(data=args)
+        if not self._flow_instance_dao.increase_version(
+                flow_instance.id, flow_instance.version):
+            raise self._conflict(flow_instance)
 
-    def _check_step(self, flow_meta, flow_instance,
-                    target_step, target_action):
-        current_step = flow_instance.current_step
+        flow_template = self._flow_tpl_dao.query_flow_template_by_id(
+            flow_instance.flow_template_id)
+        flow_meta = self._flow_meta_mgr.get(flow_template.flow_meta)
+        job_ref = flow_meta.get_job_ref_by_step_name(job_instance.step_name)
+        job_def = self._job_mgr.get(job_ref.job_name)
+        handler_mtd = getattr(job_def, "on_" + action.action)
+
+        ctx = MySQLContext(
+            flow_executor=self,
+            db=self._db,
+            flow_instance_id=flow_instance.id,
+            job_instance_id=job_instance.id,
+            job_action_id=action.id,
+            flow_meta=flow_meta,
+            current_step=job_instance.step_name
+        )
+
+        rs = self._invoke_handler(handler_mtd, ctx, action.arguments)
+
+        if rs.is_success():
+            self._job_action_dao.update_status(
+                action_id, ActionStatus.STATUS_FINISHED)
+        else:
+            # 不成功的action不计入已执行，允许重来
+            self._job_action_dao.update_status(
+                action_id, ActionStatus.STATUS_FAILED,
+                data={"reason": rs.reason, "msg": rs.msg})
+        return rs
+
+    def _check_and_combine_action_args(
+            self, job_def, target_action, request_args,
+            job_ref, flow_template):
+        """使用编译好的参数解析计划合并检查参数，
+           计划按照 (flow template, step, action) 以及管理器的版本号进行缓存
+        """
+        plan_key = (flow_template.id, job_ref.step_name, target_action,
+                    self._flow_meta_mgr.version, self._job_mgr.version)
+        plan = self._action_arg_plans.get(plan_key)
+        if plan is None:
+            plan = compile_action_args(
+                job_def, job_ref, flow_template, target_action)
+            self._action_arg_plans.put(plan_key, plan)
+        return self._resolve_args(plan, request_args)
+
+    def _check_step(self, flow_meta, state, target_step, target_action):
+        """基于执行状态快照检查目标step和action是否可以执行，
+           目标step已经被触发时，检查step是否完成以及action是否执行过，
+           目标step尚未被触发时，要求其所有前驱step都已完成
+           :param flow_meta: flow元信息
+           :param state: FlowExecutionState对象
+           :param target_step: 目标step
+           :param target_action: 目标action
+        """
 
         # 检查当前action的方法是否存在
         target_job_ref = flow_meta.get_job_ref_by_step_name(target_step)
@@ -311,91 +852,68 @@ class FlowExecutorService(AbstractService):
         if handler_mtd is None:
             raise BadReq("unknown_action_handler", action=target_action)
 
-        # 当前step即目标step
-        if current_step == target_step:
-
-            job_instance = self._job_instance_dao.\
-                query_by_instance_id_and_step(
-                    instance_id=flow_instance.id,
-                    step=current_step
-                )
+        # 目标step已经被触发
+        job_instance = state.get_job_instance(target_step)
+        if job_instance is not None:
 
             if job_instance.status == JobStatus.STATUS_FINISHED:
                 raise BadReq("step_already_runned", step=target_step)
 
             # 检查当前action是否被执行过
-            action = self._job_action_dao.\
-                query_by_job_instance_id_and_action(
-                    job_instance_id=job_instance.id,
-                    action=target_action
-                )
-
-            if action is not None:
+            if state.is_action_executed(target_step, target_action):
                 raise BadReq("action_already_runned", action=target_action)
 
             # 如果非trigger，则检查trigger是否执行过
-            if target_action != "trigger":
-                trigger_action = self._job_action_dao.\
-                    query_by_job_instance_id_and_action(
-                        job_instance_id=job_instance.id,
-                        action="trigger"
-                    )
-                if trigger_action is None:
-                    raise BadReq("no_trigger")
+            if target_action != "trigger" and \
+                    not state.is_action_executed(target_step, "trigger"):
+                raise BadReq("no_trigger")
 
             return handler_mtd, job_def, target_job_ref
 
-        if current_step != "start":
-            # 当前step非目标step
-            job_instance = self._job_instance_dao.\
-                query_by_instance_id_and_step(
-                    instance_id=flow_instance.id,
-                    step=current_step
-                )
-
-            # 流程记录了未知的current_step
-            if job_instance is None:
-                raise BadReq("unknown_current_step", current_step=current_step)
-
-            # 当前的step尚未完成
-            if job_instance.status != JobStatus.STATUS_FINISHED:
-                raise BadReq("current_step_unfinished",
-                             current_step=current_step)
-
-        # 获取下一个该运行的步骤
-        next_step = flow_meta.get_next_step(current_step)
-        if next_step != target_step:
-            raise BadReq("invalid_target_step", next_step=next_step)
+        # 目标step尚未被触发，检查所有前驱step是否都已经完成
+        if not all(self._is_step_finished(state, step)
+                   for step in flow_meta.get_prev_steps(target_step)):
+
+            # 目标step的祖先中有正在执行的step
+            ancestors = flow_meta.step_graph.get_ancestors(target_step)
+            for job_ref in flow_meta.jobs:
+                step = job_ref.step_name
+                if step in ancestors and \
+                        state.get_job_instance(step) is not None and \
+                        not self._is_step_finished(state, step):
+                    raise BadReq("current_step_unfinished",
+                                 current_step=step)
+
+            raise BadReq("invalid_target_step", next_step=format_steps(
+                self._get_ready_steps(flow_meta, state)))
+
         if target_action != "trigger":
             raise BadReq("no_trigger")
 
         return handler_mtd, job_def, target_job_ref
 
-    def _combine_and_check_args(
-            self, action_name, field_rules, *args_dict):
-        """合并 & 检查参数 先合并，后检查
-           :param field_rules: 字段规则
-           :param old_args
-        """
-        _combined_args = ChainMap(*args_dict).new_child()
-
-        # 木有验证规则，直接返回数据
-        if not field_rules:
-            return Result.ok(data=_combined_args)
+    def _is_step_finished(self, state, step):
+        if step == StepGraph.START:
+            return True
+        job_instance = state.get_job_instance(step)
+        return job_instance is not None and \
+            job_instance.status == JobStatus.STATUS_FINISHED
 
+    def _get_ready_steps(self, flow_meta, state):
+        """获取所有前驱都已完成，但自身尚未被触发的step
+        """
+        return [
+            job_ref.step_name for job_ref in flow_meta.jobs
+            if state.get_job_instance(job_ref.step_name) is None and all(
+                self._is_step_finished(state, step)
+                for step in flow_meta.get_prev_steps(job_ref.step_name))
+        ]
+
+    def _resolve_args(self, plan, request_args):
         try:
-            for field_rule in field_rules:
-                # 检查并替换掉相关参数
-                val = field_rule(_combined_args[field_rule.name])
-                _combined_args[field_rule.name] = val
+            return Result.ok(data=plan.resolve(request_args))
         except InvalidFieldException as e:
-            full_field_name = "{action_name}.{field_name}".format(
-                action_name=action_name,
-                field_name=e.field_name
-            )
-            return self._gen_bad_req_result(e, full_field_name)
-        else:
-            return Result.ok(data=_combined_args)
+            return self._gen_bad_req_result(e, e.field_name)
 
     def _gen_bad_req_result(self, e, full_field_name):
         loc, _ = locale.getlocale(locale.LC_ALL)
@@ -414,7 +932,7 @@ class FlowExecutorService(AbstractService):
     def _finish_step(self, ctx):
         """标记一个job instance完成，通常由action通过context进行回调
            S1. 将job_instance的状态更新为finish
-           S2. 检查整个flow是否已经完成
+           S2. 检查所有通向finish的step是否都已经完成
            S3. 如果整个流程已经完成，那么标记flow_instance的status
            S4. 回调flow_meta中的on_finish事件
         """
@@ -423,22 +941,32 @@ class FlowExecutorService(AbstractService):
             ctx.job_instance_id
         )
 
+        # 调用方已经在当前事务中递增了flow instance的版本号，该行已被锁定，
+        # 并行分支同时完成时不会互相看不到对方的结果
         self._job_instance_dao.update_status(
             job_instance_id=job_instance_id,
             status=JobStatus.STATUS_FINISHED
         )
-
-        next_step = ctx.flow_meta.get_next_step(ctx.current_step)
-
-        # 尚未完成，继续处理
-        if next_step != "finish":
+        self._flow_event_dao.insert(
+            flow_instance_id, FlowEventType.STEP_FINISH, ctx.current_step)
+
+        # 所有通向finish的step都已经完成，整个flow才算完成
+        finished_steps = self._job_instance_dao.query_finished_steps(
+            flow_instance_id) | {StepGraph.START}
+        if not ctx.flow_meta.get_prev_steps(
+                StepGraph.FINISH) <= finished_steps:
             return
 
-        # 修改flow_instance的状态
-        self._flow_instance_dao.update_status(
-            flow_instance_id=flow_instance_id,
-            status=FlowStatus.STATUS_FINISHED
-        )
+        # 修改flow_instance的状态，并释放所占用的名额，
+        # 状态已经被其它请求修改(例如已经被终止)时不再回调on_finish
+        if not self._flow_instance_dao.transfer_status(
+                flow_instance_id, FlowStatus.STATUS_RUNNING,
+                FlowStatus.STATUS_FINISHED):
+            return
+        self._flow_instance_counter_dao.release_by_instance_id(
+            flow_instance_id)
+        self._flow_event_dao.insert(
+            flow_instance_id, FlowEventType.FLOW_FINISH)
 
         # 回调on_finish事件
         on_finish_handler = getattr(ctx.flow_meta, "on_finish", None)
@@ -448,13 +976,19 @@ class FlowExecutorService(AbstractService):
 
     def _stop_whole_flow(self, ctx):
         """终止整个flow的运行，通常由action通过context进行回调
-           S1. 标记flow_instance的status为stop
+           S1. 标记flow_instance的status为stop，并释放所占用的名额
            S2. 回调flow_meta中的on_stop事件
         """
-        self._flow_instance_dao.update_status(
-            flow_instance_id=ctx.flow_instance_id,
-            status=FlowStatus.STATUS_STOPPED
-        )
+        # flow已经结束或者已经被终止，不再重复回调on_stop
+        if not self._flow_instance_dao.transfer_status(
+                ctx.flow_instance_id, FlowStatus.STATUS_RUNNING,
+                FlowStatus.STATUS_STOPPED):
+            return
+        self._flow_instance_counter_dao.release_by_instance_id(
+            ctx.flow_instance_id)
+        self._flow_event_dao.insert(
+            ctx.flow_instance_id, FlowEventType.FLOW_STOP,
+            ctx.current_step or "")
 
         # 回调on_stop事件
         on_stop_handler = getattr(ctx.flow_meta, "on_stop", None)
@@ -0,0 +1,74 @@
+"""flow meta目录
+
+   flow meta只会在插件加载时发生变化，目录在此时一次性构建好所有的视图、
+   序列化之后的响应以及ETag，之后的查询都直接返回构建好的结果
+"""
+
+import threading
+from acolyte.core.service import Result, PreparedResult
+from acolyte.core.view import FlowMetaView
+
+
+class FlowMetaCatalog:
+
+    """flow meta目录，manager中的内容发生变化时会自动重建
+    """
+
+    def __init__(self, flow_meta_mgr, job_mgr):
+        """
+        :param flow_meta_mgr: flow meta管理器
+        :param job_mgr: job管理器，用于获取job的参数声明
+        """
+        self._flow_meta_mgr = flow_meta_mgr
+        self._job_mgr = job_mgr
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def all(self):
+        """获取所有flow meta的PreparedResult
+        """
+        return self._get_snapshot().all_result
+
+    def get(self, flow_meta_name):
+        """获取单个flow meta的PreparedResult，不存在时返回None
+        """
+        return self._get_snapshot().results.get(flow_meta_name)
+
+    def _get_snapshot(self):
+        version = self._current_version()
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.version != version:
+                snapshot = self._build(version)
+                self._snapshot = snapshot
+            return snapshot
+
+    def _current_version(self):
+        return self._flow_meta_mgr.version, self._job_mgr.version
+
+    def _build(self, version):
+        views = [FlowMetaView.from_flow_meta(meta, self._job_mgr)
+                 for meta in self._flow_meta_mgr.all()]
+        results = {
+            view.name: PreparedResult.prepare(Result.ok(data=view))
+            for view in views
+        }
+        all_result = PreparedResult.prepare(Result.ok(data=views))
+        return _Snapshot(version, all_result, results)
+
+
+class _Snapshot:
+
+    """某个版本的目录，构建完成之后不再修改
+    """
+
+    __slots__ = ("version", "all_result", "results")
+
+    def __init__(self, version, all_result, results):
+        self.version = version
+        self.all_result = all_result
+        self.results = results
@@ -21,15 +21,37 @@ from acolyte.core.service import (
 )
 from acolyte.core.mgr import ObjectNotFoundException
 from acolyte.core.storage.flow_template import FlowTemplateDAO
+from acolyte.core.storage.flow_instance import FlowInstanceDAO
+from acolyte.core.storage.flow_instance_counter import FlowInstanceCounterDAO
 from acolyte.core.storage.user import UserDAO
+from acolyte.core.flow_meta_catalog import FlowMetaCatalog
 from acolyte.core.view import (
-    FlowMetaView,
-    FlowTemplateView
+    FlowTemplateView,
+    PageView
 )
+from acolyte.core.view_builder import FlowInstanceViewBuilder
+from acolyte.core.flow import FlowStatus
 from acolyte.core.job import JobArg
 from acolyte.core.message import default_validate_messages
 
 
+# 分页查询的公共参数
+_PAGE_FIELDS = (
+    IntField("offset_id", required=False, default=0, min_=0),
+    IntField("limit", required=False, default=20, min_=1, max_=100),
+    StrField("order", required=False, default="asc", regex=r"^(asc|desc)$"),
+)
+
+_FLOW_STATUS_REGEX = r"^({})$".format("|".join((
+    FlowStatus.STATUS_WAITING,
+    FlowStatus.STATUS_INIT,
+    FlowStatus.STATUS_RUNNING,
+    FlowStatus.STATUS_FINISHED,
+    FlowStatus.STATUS_STOPPED,
+    FlowStatus.STATUS_EXCEPTION,
+)))
+
+
 class FlowService(AbstractService):
 
     def __init__(self, service_container):
@@ -39,12 +61,20 @@ class FlowService(AbstractService):
         # 注入两个manager
         self._flow_meta_mgr = self._("flow_meta_manager")
         self._job_mgr = self._("job_manager")
+        self._flow_meta_catalog = FlowMetaCatalog(
+            self._flow_meta_mgr, self._job_mgr)
         db = self._("db")
-        self._flow_tpl_dao = FlowTemplateDAO(db)
-        self._user_dao = UserDAO(db)
+        self._db = db
+        entity_cache = self._("entity_cache")
+        self._flow_tpl_dao = FlowTemplateDAO(db, entity_cache)
+        self._user_dao = UserDAO(db, entity_cache)
+        self._flow_instance_dao = FlowInstanceDAO(db)
+        self._instance_view_builder = FlowInstanceViewBuilder(
+            db, entity_cache, self._flow_meta_mgr)
+        self._flow_instance_counter_dao = FlowInstanceCounterDAO(db)
 
     def get_all_flow_meta(self) -> Result:
-        """获得所有注册到容器的flow_meta信息
+        """获得所有注册到容器的flow_meta信息，结果由FlowMetaCatalog预先构建
            :return [
 
                 {
@@ -66,11 +96,7 @@ class FlowService(AbstractService):
                 },
            ]
         """
-        all_flow_meta = [
-            FlowMetaView.from_flow_meta(meta, self._job_mgr)
-            for meta in self._flow_meta_mgr.all()
-        ]
-        return Result.ok(data=all_flow_meta)
+        return self._flow_meta_catalog.all()
 
     @check(
         StrField("flow_meta_name", required=True),
@@ -78,14 +104,10 @@ class FlowService(AbstractService):
     def get_flow_meta_info(self, flow_meta_name) -> Result:
         """获取单个的flow_meta详情
         """
-
-        try:
-            flow_meta = self._flow_meta_mgr.get(flow_meta_name)
-        except ObjectNotFoundException:
+        rs = self._flow_meta_catalog.get(flow_meta_name)
+        if rs is None:
             raise BadReq("flow_meta_not_exist", flow_meta=flow_meta_name)
-
-        return Result.ok(data=FlowMetaView.from_flow_meta(
-            flow_meta, self._job_mgr))
+        return rs
 
     @check(
         StrField("flow_meta_name", required=True),
@@ -124,9 +146,13 @@ class FlowService(AbstractService):
         created_on = datetime.datetime.now()
 
         # 插入吧!
-        flow_template = self._flow_tpl_dao.insert_flow_template(
-            flow_meta_name, name, json.dumps(bind_args),
-            max_run_instance, creator, created_on)
+        with self._db.transaction():
+            flow_template = self._flow_tpl_dao.insert_flow_template(
+                flow_meta_name, name, json.dumps(bind_args),
+                max_run_instance, creator, created_on)
+            # 限制了实例数目的模板需要维护实例计数
+            if max_run_instance > 0:
+                self._flow_instance_counter_dao.create(flow_template.id)
 
         log.acolyte.info(
             "New flow template created, {}".format(to_json(flow_template)))
@@ -212,24 +238,78 @@ class FlowService(AbstractService):
         """
         pass
 
-    def get_flow_instance_by_status(self, status, offsert_id, limit, order):
+    @check(
+        StrField("status", required=True, regex=_FLOW_STATUS_REGEX),
+        *_PAGE_FIELDS
+    )
+    def get_flow_instance_by_status(self, status, offset_id=0,
+                                    limit=20, order="asc"):
         """根据当前的状态获取flow instance列表
+           :param status: flow instance状态
+           :param offset_id: 上一页返回的next_offset_id，为0时从头开始
+           :param limit: 每页数目
+           :param order: 按ID排序的方向，asc或desc
         """
-        pass
+        flow_instances = self._flow_instance_dao.query_by_page(
+            offset_id, limit, order, status=status)
+        return Result.ok(data=self._build_instance_page(
+            flow_instances, limit))
 
-    def get_flow_instance_by_template(self, template_id,
-                                      offet_id, limit, order):
+    @check(
+        IntField("template_id", required=True, min_=1),
+        *_PAGE_FIELDS
+    )
+    def get_flow_instance_by_template(self, template_id, offset_id=0,
+                                      limit=20, order="asc"):
         """依据flow_template来查询flow实例
+           :param template_id: flow template ID
+           :param offset_id: 上一页返回的next_offset_id，为0时从头开始
+           :param limit: 每页数目
+           :param order: 按ID排序的方向，asc或desc
         """
-        pass
+        flow_instances = self._flow_instance_dao.query_by_page(
+            offset_id, limit, order, flow_template_id=template_id)
+        return Result.ok(data=self._build_instance_page(
+            flow_instances, limit))
 
-    def get_flow_instance_by_template_and_status(self, template_id, status,
-                                                 offset_id, limit, order):
+    @check(
+        IntField("template_id", required=True, min_=1),
+        StrField("status", required=True, regex=_FLOW_STATUS_REGEX),
+        *_PAGE_FIELDS
+    )
+    def get_flow_instance_by_template_and_status(
+            self, template_id, status, offset_id=0, limit=20, order="asc"):
         """依据flow_template和status来查询flow实例
+           :param template_id: flow template ID
+           :param status: flow instance状态
+           :param offset_id: 上一页返回的next_offset_id，为0时从头开始
+           :param limit: 每页数目
+           :param order: 按ID排序的方向，asc或desc
         """
-        pass
+        flow_instances = self._flow_instance_dao.query_by_page(
+            offset_id, limit, order,
+            flow_template_id=template_id, status=status)
+        return Result.ok(data=self._build_instance_page(
+            flow_instances, limit))
 
+    @check(
+        IntField("flow_instance_id", required=True, min_=1),
+    )
     def get_flow_instance(self, flow_instance_id):
-        """根据id获取flow实例
+        """根据id获取flow实例，包含各个job的运行情况
         """
-        pass
+        flow_instance = self._flow_instance_dao.query_by_instance_id(
+            flow_instance_id)
+        if flow_instance is None:
+            raise BadReq("flow_instance_not_found",
+                         flow_instance_id=flow_instance_id)
+        return Result.ok(data=self._instance_view_builder.build(
+            [flow_instance], with_jobs=True)[0])
+
+    def _build_instance_page(self, flow_instances, limit):
+        # 取满一页时才可能还有下一页
+        next_offset_id = flow_instances[-1].id \
+            if len(flow_instances) == limit else None
+        return PageView(
+            self._instance_view_builder.build(flow_instances),
+            next_offset_id)
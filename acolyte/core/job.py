@@ -17,7 +17,7 @@ class AbstractJob(metaclass=ABCMeta):
     """
 
     def __init__(self, name: str, description: str,
-                 job_args: Dict[str, Any]=None):
+                 job_args: Dict[str, Any] = None):
         """
         :param name: Job名称
         :param description: Job描述
@@ -62,6 +62,29 @@ class JobStatus:
     STATUS_EXCEPTION = "exception"
 
 
+class ActionStatus:
+
+    """Job Action的执行状态
+    """
+
+    STATUS_RUNNING = "running"  # 正在后台执行
+
+    STATUS_FINISHED = "finished"  # 执行完毕
+
+    STATUS_FAILED = "failed"  # 执行完毕，但返回了不成功的结果
+
+    STATUS_EXCEPTION = "exception"  # 执行过程中出现异常
+
+
+def background_action(f):
+    """该decorator用于将Job的action标记为需要长时间运行的action，
+       这类action会被分发到后台线程池执行，请求会立即返回action编号，
+       调用者可以通过action编号轮询执行状态
+    """
+    f.background = True
+    return f
+
+
 class JobInstance:
 
     """描述一个Job的运行状态
@@ -98,7 +121,8 @@ class JobActionData:
                  arguments: Dict[str, Any],
                  data: Dict[str, Any],
                  created_on: datetime.datetime,
-                 updated_on: datetime.datetime):
+                 updated_on: datetime.datetime,
+                 status: str = ActionStatus.STATUS_FINISHED):
         """
         :param id_: Action实例编号
         :param job_instance_id: 隶属的job instance
@@ -107,7 +131,8 @@ class JobActionData:
         :param arguments: 执行该Action时所使用的参数
         :param data: 该Action执行后回填的数据
         :param created_on: 执行时间
-        :param finished_on: 执行结束时间
+        :param updated_on: 最近更新时间
+        :param status: 执行状态
         """
 
         self.id = id_
@@ -118,6 +143,7 @@ class JobActionData:
         self.data = data
         self.created_on = created_on
         self.updated_on = updated_on
+        self.status = status
 
 
 class JobRef:
@@ -146,6 +172,34 @@ class JobRef:
         return self._bind_args
 
 
+class ParallelRef:
+
+    """在FlowMeta的jobs声明中表示一组可以并行执行的分支，
+       每个分支可以是一个JobRef，也可以是由JobRef、ParallelRef组成的tuple(按顺序执行)，
+       ParallelRef之后的step需要等待所有分支都完成后才可以执行:
+
+       jobs=(
+           JobRef("build", "build"),
+           ParallelRef(
+               JobRef("sql_review", "sql_review"),
+               JobRef("qa", "qa"),
+               (JobRef("scan", "scan"), JobRef("fix", "fix")),
+           ),
+           JobRef("deploy", "deploy"),
+       )
+    """
+
+    def __init__(self, *branches):
+        """
+        :param branches: 并行执行的分支
+        """
+        self._branches = branches
+
+    @property
+    def branches(self):
+        return self._branches
+
+
 class JobArg:
 
     """参数声明
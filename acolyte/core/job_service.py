@@ -1,7 +1,37 @@
 """本模块包含跟Job相关的Facade接口
 """
 
-from acolyte.core.service import AbstractService
+from acolyte.core.service import (
+    AbstractService,
+    Result
+)
+import collections
+from acolyte.core.view import (
+    JobActionStatusView,
+    JobInstanceView,
+    JobInstanceDetailsView
+)
+from acolyte.core.storage.job_instance import JobInstanceDAO
+from acolyte.core.storage.job_action_data import JobActionDataDAO
+from acolyte.util.validate import (
+    Field,
+    IntField,
+    check,
+    BadReq
+)
+
+
+def _to_bool(value):
+    """将query string中的"true"/"1"等值转换为bool
+    """
+    if isinstance(value, str):
+        value = value.strip().lower()
+        if value in ("true", "1", "yes"):
+            return True
+        if value in ("false", "0", "no", ""):
+            return False
+        raise ValueError("invalid bool value: {}".format(value))
+    return bool(value)
 
 
 class JobService(AbstractService):
@@ -9,17 +39,90 @@ class JobService(AbstractService):
     def __init__(self, service_container):
         super().__init__(service_container)
 
+    def _after_register(self):
+        db = self._("db")
+        self._job_instance_dao = JobInstanceDAO(db)
+        self._job_action_dao = JobActionDataDAO(db)
+
     def get_all_job_definations(self):
         """获取所有的Job定义
         """
         pass
 
-    def get_job_instance_list_by_flow_instance(self, flow_instance_id):
-        """根据flow_instance_id获取job_instance列表
+    @check(
+        IntField("flow_instance_id", required=True, min_=1),
+        Field("with_data", type_=bool, required=False,
+              default=False, value_of=_to_bool),
+    )
+    def get_job_instance_list_by_flow_instance(
+            self, flow_instance_id, with_data=False):
+        """根据flow_instance_id获取job_instance列表，包含每个job执行过的action，
+           整个时间线只需要两次查询
+           :param flow_instance_id: flow instance编号
+           :param with_data: 是否包含action的arguments和data，
+                             不需要时不会加载和解析这两个字段
         """
-        pass
+        job_instances = self._job_instance_dao.query_by_flow_instance_id(
+            flow_instance_id)
+        if not job_instances:
+            return Result.ok(data=[])
+
+        actions = collections.defaultdict(list)
+        for action in self._job_action_dao.query_by_job_instance_id_list(
+                [ji.id for ji in job_instances], with_data):
+            actions[action.job_instance_id].append(action)
+
+        return Result.ok(data=[
+            JobInstanceView.from_job_instance(ji, actions[ji.id])
+            for ji in job_instances
+        ])
 
-    def get_job_instance_details(self, job_instance_id):
-        """获取某个job_instance的详情数据，包括每个其中每个event的数据
+    @check(
+        IntField("job_instance_id", required=True, min_=1),
+        IntField("offset_id", required=False, default=0, min_=0),
+        IntField("limit", required=False, default=50, min_=1, max_=500),
+        Field("with_data", type_=bool, required=False,
+              default=True, value_of=_to_bool),
+    )
+    def get_job_instance_details(self, job_instance_id, offset_id=0,
+                                 limit=50, with_data=True):
+        """获取某个job_instance的详情数据，包括其中每个action的数据，
+           action按ID分页返回
+           :param job_instance_id: job instance编号
+           :param offset_id: 上一页返回的next_offset_id，为0时从头开始
+           :param limit: 每页action数目
+           :param with_data: 是否包含action的arguments和data
         """
-        pass
+        job_instance = self._job_instance_dao.query_by_id(job_instance_id)
+        if job_instance is None:
+            raise BadReq("job_instance_not_found",
+                         job_instance_id=job_instance_id)
+
+        actions = self._job_action_dao.query_by_job_instance_id_page(
+            job_instance_id, offset_id, limit, with_data)
+        # 取满一页时才可能还有下一页
+        next_offset_id = actions[-1].id if len(actions) == limit else None
+
+        return Result.ok(data=JobInstanceDetailsView(
+            id_=job_instance.id,
+            step_name=job_instance.step_name,
+            status=job_instance.status,
+            trigger_actor=job_instance.trigger_actor,
+            created_on=job_instance.created_on,
+            updated_on=job_instance.updated_on,
+            actions=[JobActionStatusView.from_job_action_data(action)
+                     for action in actions],
+            next_offset_id=next_offset_id
+        ))
+
+    @check(
+        IntField("action_id", required=True, min_=1),
+    )
+    def get_action_status(self, action_id: int) -> Result:
+        """获取action的执行状态，用于轮询在后台执行的action
+           :param action_id: action编号
+        """
+        action = self._job_action_dao.query_by_id(action_id)
+        if action is None:
+            raise BadReq("action_not_found", action_id=action_id)
+        return Result.ok(data=JobActionStatusView.from_job_action_data(action))
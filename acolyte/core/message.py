@@ -23,6 +23,10 @@ messages = {
                 "name_already_exist": "flow template '{name}' 已存在",
                 "invalid_creator_id": "创建者ID '{creator}' 不合法",
                 "not_allow_bind_const": "参数 '{arg_name}' 是const类型，不允许被覆盖"
+            },
+
+            "get_flow_instance": {
+                "flow_instance_not_found": "找不到ID为'{flow_instance_id}'的flow实例"
             }
         },
 
@@ -35,6 +39,14 @@ messages = {
                 "too_many_instance":
                 "无法创建更多的运行时实例，允许最大实例数目为: {allow_instance_num}"
             },
+            "start_flows": {
+                "invalid_flow_template":
+                "不合法的flow template id: {flow_template_id}",
+                "invalid_flow_meta": "不合法的flow meta: {flow_meta}",
+                "invalid_initiator": "不合法的发起者ID: {initiator}",
+                "too_many_instance":
+                "无法创建更多的运行时实例，允许最大实例数目为: {allow_instance_num}"
+            },
             "handle_job_action": {
                 "invalid_flow_instance":
                 "不合法的flow instance id: {flow_instance_id}",
@@ -52,6 +64,18 @@ messages = {
                 "unknown_current_step": "当前step未知: '{current_step}'",
                 "current_step_unfinished": "当前step '{current_step}' 尚未完成",
                 "invalid_target_step": "下一个目标step为 '{next_step}'",
+                "executor_busy": "后台任务过多，请稍后再试",
+                "concurrent_modification": "flow instance已被其它请求修改，请重试",
+            }
+        },
+
+        "JobService": {
+            "get_action_status": {
+                "action_not_found": "找不到编号为'{action_id}'的action"
+            },
+            "get_job_instance_details": {
+                "job_instance_not_found":
+                "找不到编号为'{job_instance_id}'的job instance"
             }
         },
 
@@ -70,6 +94,14 @@ messages = {
 
             "check_token": {
                 "invalid_token": "不合法的token"
+            },
+
+            "issue_stream_ticket": {
+                "invalid_token": "不合法的token"
+            },
+
+            "check_stream_ticket": {
+                "invalid_token": "不合法或者已经过期的推送凭证"
             }
         },
 
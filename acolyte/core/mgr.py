@@ -63,12 +63,24 @@ class ManagerChain(AbstractManager):
             result += mgr.all()
         return result
 
+    @property
+    def version(self):
+        return tuple(mgr.version for mgr in self._mgr_list)
+
 
 class DictBasedManager(AbstractManager):
 
     def __init__(self):
         super().__init__()
         self._container = {}
+        self._version = 0
+
+    @property
+    def version(self):
+        """容器中的对象每发生一次变化，版本号都会增加，
+           依赖容器内容的缓存可以据此判断是否需要重建
+        """
+        return self._version
 
     def load(self):
         raise UnsupportOperationException.build(DictBasedManager, "load")
@@ -77,6 +89,7 @@ class DictBasedManager(AbstractManager):
         if name in self._container:
             raise ObjectAlreadyExistedException(name)
         self._container[name] = obj
+        self._version += 1
 
     def get(self, name):
         try:
@@ -99,6 +112,7 @@ class EntryPointManager(DictBasedManager):
         for ep in pkg_resources.iter_entry_points(self._entry_point):
             obj = ep.load()()
             self._container[obj.name] = obj
+        self._version += 1
 
 
 # managers for job and flow_meta
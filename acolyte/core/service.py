@@ -1,4 +1,6 @@
+import hashlib
 from abc import ABCMeta
+from acolyte.util.json import to_json_bytes
 
 
 class AbstractService(metaclass=ABCMeta):
@@ -36,8 +38,14 @@ class Result(ViewObject):
 
     STATUS_NOT_FOUND = 404
 
+    STATUS_CONFLICT = 409
+
+    STATUS_TOO_MANY_REQUESTS = 429
+
     STATUS_SERVICE_ERROR = 500
 
+    STATUS_SERVICE_UNAVAILABLE = 503
+
     @classmethod
     def ok(cls, data=None):
         return cls(Result.STATUS_SUCCESS, None, None, data)
@@ -50,10 +58,22 @@ class Result(ViewObject):
     def not_allow_access(cls, reason, msg=None, data=None):
         return cls(Result.STATUS_FORBIDDEN, reason, msg, data)
 
+    @classmethod
+    def conflict(cls, reason, msg=None, data=None):
+        return cls(Result.STATUS_CONFLICT, reason, msg, data)
+
+    @classmethod
+    def too_many_requests(cls, reason, msg=None, data=None):
+        return cls(Result.STATUS_TOO_MANY_REQUESTS, reason, msg, data)
+
     @classmethod
     def service_error(cls, reason, msg=None, data=None):
         return cls(Result.STATUS_SERVICE_ERROR, reason, msg, data)
 
+    @classmethod
+    def service_unavailable(cls, reason, msg=None, data=None):
+        return cls(Result.STATUS_SERVICE_UNAVAILABLE, reason, msg, data)
+
     def __init__(self, status_code, reason, msg, data):
         """
         :param status_code: 状态码
@@ -68,3 +88,35 @@ class Result(ViewObject):
 
     def is_success(self):
         return self.status_code == Result.STATUS_SUCCESS
+
+
+class PreparedResult(Result):
+
+    """预先序列化好的Result，用于很少变化却被频繁读取的数据，
+       输出时直接使用body，并且可以依据etag响应条件请求
+    """
+
+    @classmethod
+    def prepare(cls, rs):
+        """从普通的Result构建
+        """
+        body = to_json_bytes(rs)
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        return cls(rs.status_code, rs.reason, rs.msg, rs.data, body, etag)
+
+    def __init__(self, status_code, reason, msg, data, body, etag):
+        """
+        :param body: 序列化之后的UTF-8字节
+        :param etag: body的ETag
+        """
+        super().__init__(status_code, reason, msg, data)
+        self.body = body
+        self.etag = etag
+
+    def _to_dict(self):
+        return {
+            "status_code": self.status_code,
+            "reason": self.reason,
+            "msg": self.msg,
+            "data": self.data,
+        }
@@ -0,0 +1,76 @@
+import datetime
+from acolyte.core.storage import AbstractDAO
+
+
+class ActionQueueDAO(AbstractDAO):
+
+    """针对action_queue表的操作
+    """
+
+    def __init__(self, db):
+        super().__init__(db)
+
+    def insert(self, job_action_id):
+        now = datetime.datetime.now()
+        return self._db.insert((
+            "insert into action_queue ("
+            "job_action_id, lease_owner, lease_expire, attempts, "
+            "created_on) values (%s, '', %s, 0, %s)"
+        ), (job_action_id, now, now))
+
+    def insert_leased(self, job_action_id, owner, lease_expire):
+        """插入一条已经被owner领取的任务
+        """
+        now = datetime.datetime.now()
+        return self._db.insert((
+            "insert into action_queue ("
+            "job_action_id, lease_owner, lease_expire, attempts, "
+            "created_on) values (%s, %s, %s, 1, %s)"
+        ), (job_action_id, owner, lease_expire, now))
+
+    def query_claimable(self, limit, skip_locked=True):
+        """查询租约已经到期的任务并加锁，需要在事务中执行
+           :param limit: 最多查询的数目
+           :param skip_locked: 跳过已经被其它worker锁定的行，需要MySQL 8.0+
+        """
+        return self._db.query_all((
+            "select id, job_action_id, attempts from action_queue "
+            "where lease_expire <= %s order by id limit %s "
+            "for update{skip_locked}"
+        ).format(skip_locked=" skip locked" if skip_locked else ""),
+            (datetime.datetime.now(), limit))
+
+    def lease(self, id_list, owner, lease_expire):
+        holders = ",".join(("%s", ) * len(id_list))
+        return self._db.execute((
+            "update action_queue set lease_owner = %s, lease_expire = %s, "
+            "attempts = attempts + 1 where id in ({holders})"
+        ).format(holders=holders), [owner, lease_expire] + list(id_list))
+
+    def renew(self, id_list, owner, lease_expire):
+        holders = ",".join(("%s", ) * len(id_list))
+        return self._db.execute((
+            "update action_queue set lease_expire = %s "
+            "where lease_owner = %s and id in ({holders})"
+        ).format(holders=holders), [lease_expire, owner] + list(id_list))
+
+    def renew_by_owner(self, owner, lease_expire):
+        return self._db.execute((
+            "update action_queue set lease_expire = %s "
+            "where lease_owner = %s"
+        ), (lease_expire, owner))
+
+    def delete(self, id_, owner):
+        return self._db.execute((
+            "delete from action_queue where id = %s and lease_owner = %s"
+        ), (id_, owner))
+
+    def delete_by_id(self, id_):
+        return self._db.execute(
+            "delete from action_queue where id = %s", (id_,))
+
+    def delete_by_job_action_id(self, job_action_id, owner):
+        return self._db.execute((
+            "delete from action_queue where job_action_id = %s "
+            "and lease_owner = %s"
+        ), (job_action_id, owner))
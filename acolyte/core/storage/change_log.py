@@ -0,0 +1,38 @@
+import datetime
+from acolyte.core.storage import AbstractDAO
+
+
+class ChangeLogDAO(AbstractDAO):
+
+    """记录实体的变更，供其它节点轮询以便让本地缓存失效
+    """
+
+    def __init__(self, db):
+        super().__init__(db)
+
+    def insert(self, entity, entity_id_list):
+        if not entity_id_list:
+            return 0
+        now = datetime.datetime.now()
+        holders = ",".join(("(%s, %s, %s)", ) * len(entity_id_list))
+        args = []
+        for entity_id in entity_id_list:
+            args += [entity, entity_id, now]
+        return self._db.execute((
+            "insert into change_log (entity, entity_id, created_on) "
+            "values {holders}"
+        ).format(holders=holders), args)
+
+    def query_max_id(self):
+        return self._db.query_one_field(
+            "select ifnull(max(id), 0) from change_log", tuple())
+
+    def query_after(self, last_id, limit=1000):
+        return self._db.query_all((
+            "select id, entity, entity_id from change_log "
+            "where id > %s order by id limit %s"
+        ), (last_id, limit))
+
+    def delete_before(self, created_on):
+        return self._db.execute(
+            "delete from change_log where created_on < %s", (created_on,))
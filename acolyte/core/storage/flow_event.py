@@ -0,0 +1,81 @@
+import datetime
+from acolyte.core.storage import AbstractDAO
+from acolyte.core.flow import FlowEvent
+
+
+def _mapper(result):
+    result["id_"] = result.pop("id")
+    return FlowEvent(**result)
+
+
+class FlowEventDAO(AbstractDAO):
+
+    """flow状态变更事件，各节点按照ID增量同步之后推送给订阅者
+    """
+
+    def __init__(self, db):
+        super().__init__(db)
+
+    def insert(self, flow_instance_id, event_type, step=""):
+        """在当前事务中记录事件，template与发起人直接从flow instance中读取，
+           事务回滚时事件也不会被推送
+        """
+        now = datetime.datetime.now()
+        return self._db.execute((
+            "insert into flow_event ("
+            "flow_instance_id, flow_template_id, initiator, "
+            "event_type, step, created_on) "
+            "select id, flow_template_id, initiator, %s, %s, %s "
+            "from flow_instance where id = %s"
+        ), (event_type, step, now, flow_instance_id))
+
+    def query_max_id(self):
+        return self._db.query_one_field(
+            "select ifnull(max(id), 0) from flow_event", tuple())
+
+    def query_after(self, last_id, limit=1000):
+        return self._db.query_all((
+            "select * from flow_event where id > %s order by id limit %s"
+        ), (last_id, limit), _mapper)
+
+    def query_after_by_columns(self, last_id, column_values, limit=1000):
+        """查询指定ID之后，任意一列的值落在给定集合中的事件
+           每一列单独通过(列, id)索引查询前limit条，合并之后再取前limit条
+           :param column_values: 列名 -> 值的集合
+        """
+        parts, args = [], []
+        for column, values in column_values.items():
+            if not values:
+                continue
+            parts.append((
+                "(select * from flow_event where {column} in ({holders}) "
+                "and id > %s order by id limit %s)"
+            ).format(column=column,
+                     holders=",".join(["%s"] * len(values))))
+            args.extend(values)
+            args.extend((last_id, limit))
+        if not parts:
+            return []
+        args.append(limit)
+        return self._db.query_all((
+            "select * from ({parts}) e order by id limit %s"
+        ).format(parts=" union ".join(parts)), args, _mapper)
+
+    def query_by_id_list(self, id_list):
+        if not id_list:
+            return []
+        return self._db.query_all((
+            "select * from flow_event where id in ({}) order by id"
+        ).format(",".join(["%s"] * len(id_list))), id_list, _mapper)
+
+    def delete_by_flow_instance_id(self, flow_instance_id_list):
+        if not flow_instance_id_list:
+            return 0
+        return self._db.execute((
+            "delete from flow_event where flow_instance_id in ({})"
+        ).format(",".join(["%s"] * len(flow_instance_id_list))),
+            flow_instance_id_list)
+
+    def delete_before(self, created_on):
+        return self._db.execute(
+            "delete from flow_event where created_on < %s", (created_on,))
@@ -0,0 +1,133 @@
+import simplejson as json
+from acolyte.core.storage import AbstractDAO
+from acolyte.core.flow import (
+    FlowInstance,
+    FlowTemplate,
+    FlowExecutionState,
+)
+from acolyte.core.job import JobInstance, ActionStatus
+
+
+class FlowExecutionStateDAO(AbstractDAO):
+
+    """通过一次关联查询加载执行action所需的全部flow运行状态
+    """
+
+    def __init__(self, db):
+        super().__init__(db)
+
+    def query_state(self, flow_instance_id, actor):
+        """加载flow instance及其模板、job instance、已执行的action，
+           同时检查actor是否存在，执行失败或者出现异常的后台action不计入已执行
+           :param flow_instance_id: flow实例ID
+           :param actor: action执行者
+           :return: FlowExecutionState对象，flow instance不存在时返回None
+        """
+        return self.query_states([flow_instance_id], actor).get(
+            flow_instance_id)
+
+    def query_states(self, flow_instance_id_list, actor):
+        """批量加载多个flow instance的执行状态
+           :param flow_instance_id_list: flow实例ID列表
+           :param actor: action执行者
+           :return: flow instance id到FlowExecutionState对象的字典，
+                    不存在的flow instance不会出现在结果中
+        """
+        if not flow_instance_id_list:
+            return {}
+
+        holders = ",".join(("%s", ) * len(flow_instance_id_list))
+        rows = self._db.query_all((
+            "select "
+            "fi.id as fi_id, fi.flow_template_id as fi_flow_template_id, "
+            "fi.initiator as fi_initiator, "
+            "fi.current_step as fi_current_step, fi.status as fi_status, "
+            "fi.description as fi_description, "
+            "fi.created_on as fi_created_on, "
+            "fi.updated_on as fi_updated_on, fi.version as fi_version, "
+            "ft.id as ft_id, ft.flow_meta as ft_flow_meta, "
+            "ft.name as ft_name, ft.bind_args as ft_bind_args, "
+            "ft.max_run_instance as ft_max_run_instance, "
+            "ft.creator as ft_creator, ft.created_on as ft_created_on, "
+            "ji.id as ji_id, ji.step_name as ji_step_name, "
+            "ji.status as ji_status, ji.trigger_actor as ji_trigger_actor, "
+            "ji.created_on as ji_created_on, "
+            "ji.updated_on as ji_updated_on, "
+            "ja.action as ja_action, "
+            "(select count(*) from user where id = %s) as actor_num "
+            "from flow_instance fi "
+            "left join flow_template ft on ft.id = fi.flow_template_id "
+            "left join job_instance ji on ji.flow_instance_id = fi.id "
+            "left join job_action_data ja on ja.job_instance_id = ji.id "
+            "and ja.status in (%s, %s) "
+            "where fi.id in ({holders}) order by fi.id, ji.id, ja.id"
+        ).format(holders=holders), [
+            actor, ActionStatus.STATUS_RUNNING, ActionStatus.STATUS_FINISHED
+        ] + list(flow_instance_id_list))
+
+        grouped_rows = {}
+        for row in rows:
+            grouped_rows.setdefault(row["fi_id"], []).append(row)
+
+        # 同一个模板只解析一次
+        flow_templates = {}
+        return {
+            flow_instance_id: self._build_state(rows, flow_templates)
+            for flow_instance_id, rows in grouped_rows.items()
+        }
+
+    def _build_state(self, rows, flow_templates):
+        first = rows[0]
+        flow_instance = FlowInstance(
+            id_=first["fi_id"],
+            flow_template_id=first["fi_flow_template_id"],
+            initiator=first["fi_initiator"],
+            current_step=first["fi_current_step"],
+            status=first["fi_status"],
+            description=first["fi_description"],
+            created_on=first["fi_created_on"],
+            updated_on=first["fi_updated_on"],
+            version=first["fi_version"]
+        )
+
+        flow_template = flow_templates.get(first["ft_id"])
+        if flow_template is None and first["ft_id"] is not None:
+            flow_template = flow_templates[first["ft_id"]] = FlowTemplate(
+                id_=first["ft_id"],
+                flow_meta=first["ft_flow_meta"],
+                name=first["ft_name"],
+                bind_args=json.loads(first["ft_bind_args"]),
+                max_run_instance=first["ft_max_run_instance"],
+                creator=first["ft_creator"],
+                created_on=first["ft_created_on"]
+            )
+
+        job_instances, executed_actions, job_instance_steps = {}, {}, {}
+        for row in rows:
+            if row["ji_id"] is None:
+                continue
+            step_name = row["ji_step_name"]
+            # 同一个step以最早创建的job instance为准
+            if step_name not in job_instances:
+                job_instances[step_name] = JobInstance(
+                    id_=row["ji_id"],
+                    flow_instance_id=flow_instance.id,
+                    step_name=step_name,
+                    status=row["ji_status"],
+                    trigger_actor=row["ji_trigger_actor"],
+                    created_on=row["ji_created_on"],
+                    updated_on=row["ji_updated_on"]
+                )
+                job_instance_steps[row["ji_id"]] = step_name
+                executed_actions[step_name] = set()
+            if row["ja_action"] is not None and \
+                    job_instance_steps.get(row["ji_id"]) == step_name:
+                executed_actions[step_name].add(row["ja_action"])
+
+        return FlowExecutionState(
+            flow_instance=flow_instance,
+            flow_template=flow_template,
+            actor_existed=first["actor_num"] > 0,
+            job_instances=job_instances,
+            executed_actions=executed_actions
+        )
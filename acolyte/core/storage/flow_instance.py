@@ -12,12 +12,43 @@ class FlowInstanceDAO(AbstractDAO):
 
     def __init__(self, db):
         super().__init__(db)
+        self._autoinc_loaded = False
+        self._autoinc = None
 
     def query_by_instance_id(self, instance_id):
         return self._db.query_one((
             "select * from flow_instance where id = %s limit 1"
         ), (instance_id,), _mapper)
 
+    def query_by_page(self, offset_id, limit, order="asc",
+                      flow_template_id=None, status=None):
+        """基于ID进行键集分页，每次查询的代价与翻到第几页无关
+           :param offset_id: 上一页最后一条记录的ID，为0时从头开始
+           :param limit: 每页的数目
+           :param order: asc或desc
+           :param flow_template_id: 按flow template过滤
+           :param status: 按状态过滤
+        """
+        conditions, args = [], []
+        if flow_template_id is not None:
+            conditions.append("flow_template_id = %s")
+            args.append(flow_template_id)
+        if status is not None:
+            conditions.append("status = %s")
+            args.append(status)
+        if offset_id:
+            conditions.append("id > %s" if order == "asc" else "id < %s")
+            args.append(offset_id)
+        args.append(limit)
+
+        return self._db.query_all((
+            "select * from flow_instance {where} "
+            "order by id {order} limit %s"
+        ).format(
+            where="where " + " and ".join(conditions) if conditions else "",
+            order="asc" if order == "asc" else "desc"
+        ), args, _mapper)
+
     def query_running_instance_num_by_tpl_id(self, tpl_id):
         return int(self._db.query_one_field((
             "select count(*) as c from flow_instance "
@@ -27,40 +58,117 @@ class FlowInstanceDAO(AbstractDAO):
 
     def insert(self, flow_template_id, initiator, description):
         now = datetime.datetime.now()
-        with self._db.connection() as conn:
-            with conn.cursor() as csr:
-                csr.execute((
-                    "insert into flow_instance ("
-                    "flow_template_id, initiator, current_step, status, "
-                    "description, created_on, updated_on) values ("
-                    "%s, %s, %s, %s, %s, %s, %s)"
-                ), (flow_template_id, initiator, "start",
-                    FlowStatus.STATUS_INIT, description, now, now))
-                conn.commit()
-                return FlowInstance(
-                    id_=csr.lastrowid,
-                    flow_template_id=flow_template_id,
-                    initiator=initiator,
-                    current_step="start",
-                    status=FlowStatus.STATUS_INIT,
-                    description=description,
-                    created_on=now,
-                    updated_on=now
-                )
-
-    def update_status(self, flow_instance_id, status):
+        return self._db.insert((
+            "insert into flow_instance ("
+            "flow_template_id, initiator, current_step, status, "
+            "description, created_on, updated_on) values ("
+            "%s, %s, %s, %s, %s, %s, %s)"
+        ), (flow_template_id, initiator, "start",
+            FlowStatus.STATUS_INIT, description, now, now),
+            lambda id_: FlowInstance(
+                id_=id_,
+                flow_template_id=flow_template_id,
+                initiator=initiator,
+                current_step="start",
+                status=FlowStatus.STATUS_INIT,
+                description=description,
+                created_on=now,
+                updated_on=now
+            ))
+
+    def insert_many(self, flow_template_id, initiator, description_list):
+        """批量创建实例，
+           innodb_autoinc_lock_mode为0或者1时，InnoDB为单条insert语句分配的自增ID
+           是一段连续的区间，步长为auto_increment_increment，此时通过一条insert语句完成；
+           为2时并发的insert语句会交错分配ID，只能逐条插入，由调用者的事务保证原子性
+        """
+        autoinc = self._query_autoinc()
+        if autoinc is None:
+            return [self.insert(flow_template_id, initiator, description)
+                    for description in description_list]
+
         now = datetime.datetime.now()
-        return self._db.execute((
-            "update flow_instance set status = %s, "
-            "updated_on = %s where id = %s limit 1"
-        ), (status, now, flow_instance_id))
+        holders = ",".join(
+            ("(%s, %s, %s, %s, %s, %s, %s)", ) * len(description_list))
+        args = []
+        for description in description_list:
+            args.extend((flow_template_id, initiator, "start",
+                         FlowStatus.STATUS_INIT, description, now, now))
+        first_id = self._db.insert((
+            "insert into flow_instance ("
+            "flow_template_id, initiator, current_step, status, "
+            "description, created_on, updated_on) values {holders}"
+        ).format(holders=holders), args)
+        return [
+            FlowInstance(
+                id_=first_id + idx * autoinc,
+                flow_template_id=flow_template_id,
+                initiator=initiator,
+                current_step="start",
+                status=FlowStatus.STATUS_INIT,
+                description=description,
+                created_on=now,
+                updated_on=now
+            ) for idx, description in enumerate(description_list)
+        ]
+
+    def _query_autoinc(self):
+        """查询自增ID的分配方式，这两个变量只能在MySQL启动时指定，查询一次即可
+           :return: 单条insert语句的ID连续时返回步长，否则返回None
+        """
+        if not self._autoinc_loaded:
+            rs = self._db.query_one((
+                "select @@innodb_autoinc_lock_mode as lock_mode, "
+                "@@auto_increment_increment as increment"
+            ), tuple())
+            if int(rs["lock_mode"]) in (0, 1):
+                self._autoinc = int(rs["increment"])
+            else:
+                self._autoinc = None
+            self._autoinc_loaded = True
+        return self._autoinc
 
-    def update_current_step(self, flow_instance_id, current_step):
+    def update_status(self, flow_instance_id, status, version=None):
+        """更新状态并递增版本号
+           :param version: 期望的版本号，为None时不做比较
+           :return: 是否更新成功
+        """
+        return self._update(flow_instance_id, version, "status = %s", status)
+
+    def transfer_status(self, flow_instance_id, from_status, to_status):
+        """只有当前状态为from_status时才更新为to_status
+           :return: 是否更新成功
+        """
         now = datetime.datetime.now()
         return self._db.execute((
-            "update flow_instance set current_step = %s, "
-            "updated_on = %s where id = %s limit 1"
-        ), (current_step, now, flow_instance_id))
+            "update flow_instance set status = %s, updated_on = %s, "
+            "version = version + 1 where id = %s and status = %s limit 1"
+        ), (to_status, now, flow_instance_id, from_status)) == 1
+
+    def update_current_step(self, flow_instance_id, current_step, version):
+        """比较版本号并更新current_step
+           :return: 是否更新成功
+        """
+        return self._update(
+            flow_instance_id, version, "current_step = %s", current_step)
+
+    def increase_version(self, flow_instance_id, version):
+        """比较并递增版本号，在事务中执行时，更新成功后该行会被锁定到事务结束，
+           用于串行化对同一个flow instance的并发修改
+           :return: 是否更新成功
+        """
+        return self._update(flow_instance_id, version)
+
+    def _update(self, flow_instance_id, version, set_clause=None, *values):
+        now = datetime.datetime.now()
+        sql = "update flow_instance set {set_clause}updated_on = %s, " \
+            "version = version + 1 where id = %s".format(
+                set_clause=set_clause + ", " if set_clause else "")
+        args = list(values) + [now, flow_instance_id]
+        if version is not None:
+            sql += " and version = %s"
+            args.append(version)
+        return self._db.execute(sql + " limit 1", args) == 1
 
     def delete_by_instance_id(self, instance_id):
         if isinstance(instance_id, list):
@@ -0,0 +1,77 @@
+from acolyte.core.storage import AbstractDAO
+from acolyte.core.flow import FlowStatus
+
+
+class FlowInstanceCounterDAO(AbstractDAO):
+
+    """维护每个flow template处于init和running状态的实例数目，
+       只有设置了max_run_instance的模板才会计数
+    """
+
+    def __init__(self, db):
+        super().__init__(db)
+
+    def create(self, flow_template_id):
+        return self._db.execute((
+            "insert ignore into flow_instance_counter "
+            "(flow_template_id, running_num) values (%s, 0)"
+        ), (flow_template_id, ))
+
+    def query_running_num(self, flow_template_id):
+        """查询当前的实例数目，不存在计数时返回None
+        """
+        return self._db.query_one_field((
+            "select running_num from flow_instance_counter "
+            "where flow_template_id = %s"
+        ), (flow_template_id, ))
+
+    def init_by_instances(self, flow_template_id):
+        """根据现有实例初始化计数(在引入计数之前创建的模板)，已存在的计数不受影响，
+           需要在插入新实例之前调用，否则新实例会被重复计数
+        """
+        return self._db.execute((
+            "insert ignore into flow_instance_counter "
+            "(flow_template_id, running_num) "
+            "select %s, count(*) from flow_instance "
+            "where flow_template_id = %s and status in (%s, %s)"
+        ), (flow_template_id, flow_template_id,
+            FlowStatus.STATUS_INIT, FlowStatus.STATUS_RUNNING))
+
+    def acquire(self, flow_template_id, num, max_num):
+        """通过一条条件更新占用num个实例名额
+           :return: 是否占用成功，计数不存在时同样返回False
+        """
+        return self._db.execute((
+            "update flow_instance_counter "
+            "set running_num = running_num + %s "
+            "where flow_template_id = %s and running_num + %s <= %s"
+        ), (num, flow_template_id, num, max_num)) == 1
+
+    def release(self, flow_template_id, num=1):
+        return self._db.execute((
+            "update flow_instance_counter "
+            "set running_num = greatest(running_num - %s, 0) "
+            "where flow_template_id = %s"
+        ), (num, flow_template_id))
+
+    def release_by_instance_id(self, flow_instance_id):
+        """flow instance结束时释放其所占用的名额
+        """
+        return self._db.execute((
+            "update flow_instance_counter c "
+            "join flow_instance fi "
+            "on fi.flow_template_id = c.flow_template_id "
+            "set c.running_num = greatest(c.running_num - 1, 0) "
+            "where fi.id = %s"
+        ), (flow_instance_id, ))
+
+    def delete_by_template_id(self, flow_template_id):
+        if isinstance(flow_template_id, list):
+            holders = ",".join(("%s", ) * len(flow_template_id))
+            return self._db.execute((
+                "delete from flow_instance_counter "
+                "where flow_template_id in ({holders})"
+            ).format(holders=holders), flow_template_id)
+        return self._db.execute((
+            "delete from flow_instance_counter where flow_template_id = %s"
+        ), (flow_template_id, ))
@@ -20,36 +20,71 @@ class FlowTemplateDAO(AbstractDAO):
     """针对flow_template表的操作
     """
 
-    def __init__(self, db):
+    def __init__(self, db, cache=None):
+        """
+        :param db: 数据源
+        :param cache: EntityCache对象，指定后按ID的查询会优先从缓存读取
+        """
         super().__init__(db)
+        self._cache = cache
 
     def query_flow_template_by_id(self, template_id):
-        global _mapper
+        if self._cache is None:
+            return self._query_flow_template_by_id(template_id)
+        return self._cache.get(
+            "flow_template", template_id, self._query_flow_template_by_id)
+
+    def _query_flow_template_by_id(self, template_id):
         return self._db.query_one((
             "select * from flow_template where id = %s"
         ), (template_id,), _mapper)
 
+    def query_flow_templates_by_id_list(self, id_list, to_dict=False):
+        """根据ID列表来批量查询flow template，
+           指定了缓存时，只有未命中缓存的部分才会去查询数据库
+        """
+        id_list = list(id_list)
+        if not id_list:
+            return {} if to_dict else []
+        if self._cache is None:
+            templates = self._query_flow_templates_by_id_list(id_list)
+        else:
+            tpl_map = self._cache.get_many(
+                "flow_template", id_list,
+                self._query_flow_templates_by_id_list)
+            templates = [tpl_map[id_] for id_ in id_list if id_ in tpl_map]
+        if to_dict:
+            return {tpl.id: tpl for tpl in templates}
+        return templates
+
+    def _query_flow_templates_by_id_list(self, id_list):
+        holders = ",".join(("%s", ) * len(id_list))
+        return self._db.query_all((
+            "select * from flow_template "
+            "where id in ({holders})"
+        ).format(holders=holders), id_list, _mapper)
+
     def insert_flow_template(self, flow_meta, name, bind_args,
                              max_run_instance, creator, created_on):
-        with self._db.connection() as conn:
-            with conn.cursor() as csr:
-                csr.execute((
-                    "insert into `flow_template` "
-                    "(flow_meta, name, bind_args, max_run_instance, "
-                    "creator, created_on) values ("
-                    "%s, %s, %s, %s, %s, %s)"
-                ), (flow_meta, name, bind_args, max_run_instance,
-                    creator, created_on))
-                conn.commit()
-                return FlowTemplate(
-                    id_=csr.lastrowid,
-                    flow_meta=flow_meta,
-                    name=name,
-                    bind_args=bind_args,
-                    max_run_instance=max_run_instance,
-                    creator=creator,
-                    created_on=created_on
-                )
+        flow_template = self._db.insert((
+            "insert into `flow_template` "
+            "(flow_meta, name, bind_args, max_run_instance, "
+            "creator, created_on) values ("
+            "%s, %s, %s, %s, %s, %s)"
+        ), (flow_meta, name, bind_args, max_run_instance,
+            creator, created_on),
+            lambda id_: FlowTemplate(
+                id_=id_,
+                flow_meta=flow_meta,
+                name=name,
+                bind_args=bind_args,
+                max_run_instance=max_run_instance,
+                creator=creator,
+                created_on=created_on
+            ))
+        if self._cache is not None:
+            self._cache.invalidate("flow_template", flow_template.id)
+        return flow_template
 
     def is_name_existed(self, name):
         return self._db.execute((
@@ -59,15 +94,21 @@ class FlowTemplateDAO(AbstractDAO):
     def delete_by_id(self, tpl_id):
         if isinstance(tpl_id, list):
             holders = ",".join(("%s", ) * len(tpl_id))
-            return self._db.execute((
+            row_num = self._db.execute((
                 "delete from flow_template where id in ({holders})"
-            ).format(holders=holders), (tpl_id,))
+            ).format(holders=holders), tpl_id)
         else:
-            return self._db.execute((
+            row_num = self._db.execute((
                 "delete from flow_template where id = %s"
             ), (tpl_id,))
+        self._invalidate(tpl_id)
+        return row_num
 
     def query_all_templates(self):
         return self._db.query_all((
             "select * from flow_template"
         ), tuple(), _mapper)
+
+    def _invalidate(self, tpl_id):
+        if self._cache is not None:
+            self._cache.invalidate("flow_template", tpl_id)
@@ -1,7 +1,7 @@
 import datetime
 import simplejson as json
 from acolyte.core.storage import AbstractDAO
-from acolyte.core.job import JobActionData
+from acolyte.core.job import JobActionData, ActionStatus
 
 
 def _mapper(result):
@@ -11,6 +11,16 @@ def _mapper(result):
     return JobActionData(**result)
 
 
+# 不包含arguments和data两个大字段的列
+_LIGHT_COLUMNS = (
+    "id, job_instance_id, action, actor, status, created_on, updated_on")
+
+
+def _light_mapper(result):
+    result["id_"] = result.pop("id")
+    return JobActionData(arguments=None, data=None, **result)
+
+
 class JobActionDataDAO(AbstractDAO):
 
     def __init__(self, db):
@@ -22,34 +32,73 @@ class JobActionDataDAO(AbstractDAO):
             "where id = %s"
         ), (id_,), _mapper)
 
+    def query_by_id_for_update(self, id_):
+        """在当前事务中锁定并查询action记录
+        """
+        return self._db.query_one((
+            "select * from job_action_data "
+            "where id = %s for update"
+        ), (id_,), _mapper)
+
     def query_by_job_instance_id_and_action(self, job_instance_id, action):
         return self._db.query_one((
             "select * from job_action_data where "
             "job_instance_id = %s and action = %s limit 1"
         ), (job_instance_id, action), _mapper)
 
-    def insert(self, job_instance_id, action, actor, arguments, data):
+    def query_by_job_instance_id_list(self, job_instance_id_list,
+                                      with_data=True):
+        """批量查询多个job instance下的action数据，按ID排序
+           :param with_data: 是否加载并解析arguments和data，
+                             为False时这两个字段为None
+        """
+        job_instance_id_list = list(job_instance_id_list)
+        if not job_instance_id_list:
+            return []
+        holders = ",".join(("%s", ) * len(job_instance_id_list))
+        return self._db.query_all((
+            "select {columns} from job_action_data where "
+            "job_instance_id in ({holders}) order by id"
+        ).format(
+            columns="*" if with_data else _LIGHT_COLUMNS,
+            holders=holders
+        ), job_instance_id_list, _mapper if with_data else _light_mapper)
+
+    def query_by_job_instance_id_page(self, job_instance_id, offset_id,
+                                      limit, with_data=True):
+        """按ID键集分页查询某个job instance下的action数据
+           :param offset_id: 上一页最后一条记录的ID，为0时从头开始
+           :param limit: 每页的数目
+           :param with_data: 是否加载并解析arguments和data
+        """
+        return self._db.query_all((
+            "select {columns} from job_action_data where "
+            "job_instance_id = %s and id > %s order by id limit %s"
+        ).format(columns="*" if with_data else _LIGHT_COLUMNS),
+            (job_instance_id, offset_id or 0, limit),
+            _mapper if with_data else _light_mapper)
+
+    def insert(self, job_instance_id, action, actor, arguments, data,
+               status=ActionStatus.STATUS_FINISHED):
         now = datetime.datetime.now()
-        with self._db.connection() as conn:
-            with conn.cursor() as csr:
-                csr.execute((
-                    "insert into job_action_data ("
-                    "job_instance_id, action, actor, "
-                    "arguments, data, created_on, updated_on)"
-                    "values (%s, %s, %s, %s, %s, %s, %s)"
-                ), (job_instance_id, action, actor, json.dumps(arguments),
-                    json.dumps(data), now, now))
-                conn.commit()
-                return JobActionData(
-                    id_=csr.lastrowid,
-                    job_instance_id=job_instance_id,
-                    action=action,
-                    actor=actor,
-                    arguments=arguments,
-                    data=data,
-                    created_on=now,
-                    updated_on=now
-                )
+        return self._db.insert((
+            "insert into job_action_data ("
+            "job_instance_id, action, actor, "
+            "arguments, data, status, created_on, updated_on)"
+            "values (%s, %s, %s, %s, %s, %s, %s, %s)"
+        ), (job_instance_id, action, actor, json.dumps(arguments),
+            json.dumps(data), status, now, now),
+            lambda id_: JobActionData(
+                id_=id_,
+                job_instance_id=job_instance_id,
+                action=action,
+                actor=actor,
+                arguments=arguments,
+                data=data,
+                created_on=now,
+                updated_on=now,
+                status=status
+            ))
 
     def update_data(self, action_data_id, data):
         now = datetime.datetime.now()
@@ -59,10 +108,35 @@ class JobActionDataDAO(AbstractDAO):
             "where id = %s"
         ), (json.dumps(data), now, action_data_id))
 
+    def update_status(self, action_data_id, status, data=None):
+        """更新action的执行状态，指定了data时一并更新回填的数据
+        """
+        now = datetime.datetime.now()
+        if data is None:
+            return self._db.execute((
+                "update job_action_data set status = %s, "
+                "updated_on = %s where id = %s"
+            ), (status, now, action_data_id))
+        return self._db.execute((
+            "update job_action_data set status = %s, data = %s, "
+            "updated_on = %s where id = %s"
+        ), (status, json.dumps(data), now, action_data_id))
+
+    def transfer_status(self, action_data_id, from_status, to_status, data):
+        """只有当前状态为from_status时才更新状态以及回填的数据
+           :return: 是否更新成功
+        """
+        now = datetime.datetime.now()
+        return self._db.execute((
+            "update job_action_data set status = %s, data = %s, "
+            "updated_on = %s where id = %s and status = %s"
+        ), (to_status, json.dumps(data), now, action_data_id,
+            from_status)) == 1
+
     def delete_by_id(self, job_action_data_id):
         return self._db.execute((
             "delete from job_action_data where id = %s"
-        ), (job_action_data_id))
+        ), (job_action_data_id,))
 
     def delete_by_job_instance_id(self, job_instance_id):
         return self._db.execute((
@@ -26,32 +26,50 @@ class JobInstanceDAO(AbstractDAO):
 
     def insert(self, flow_instance_id, step_name, trigger_actor):
         now = datetime.datetime.now()
-        with self._db.connection() as conn:
-            with conn.cursor() as csr:
-                csr.execute((
-                    "insert into job_instance ("
-                    "flow_instance_id, step_name, status, trigger_actor, "
-                    "created_on, updated_on) values ("
-                    "%s, %s, %s, %s, %s, %s)"
-                ), (flow_instance_id, step_name, JobStatus.STATUS_RUNNING,
-                    trigger_actor, now, now))
-                conn.commit()
-                return JobInstance(
-                    id_=csr.lastrowid,
-                    flow_instance_id=flow_instance_id,
-                    step_name=step_name,
-                    status=JobStatus.STATUS_RUNNING,
-                    trigger_actor=trigger_actor,
-                    created_on=now,
-                    updated_on=now
-                )
+        return self._db.insert((
+            "insert into job_instance ("
+            "flow_instance_id, step_name, status, trigger_actor, "
+            "created_on, updated_on) values ("
+            "%s, %s, %s, %s, %s, %s)"
+        ), (flow_instance_id, step_name, JobStatus.STATUS_RUNNING,
+            trigger_actor, now, now),
+            lambda id_: JobInstance(
+                id_=id_,
+                flow_instance_id=flow_instance_id,
+                step_name=step_name,
+                status=JobStatus.STATUS_RUNNING,
+                trigger_actor=trigger_actor,
+                created_on=now,
+                updated_on=now
+            ))
 
     def query_by_flow_instance_id(self, flow_instance_id):
         return self._db.query_all((
             "select * from job_instance where "
-            "flow_instance_id = %s"
+            "flow_instance_id = %s order by id"
         ), (flow_instance_id, ), _mapper)
 
+    def query_by_flow_instance_id_list(self, flow_instance_id_list):
+        """批量查询多个flow instance下的job instance，按ID排序
+        """
+        flow_instance_id_list = list(flow_instance_id_list)
+        if not flow_instance_id_list:
+            return []
+        holders = ",".join(("%s", ) * len(flow_instance_id_list))
+        return self._db.query_all((
+            "select * from job_instance where "
+            "flow_instance_id in ({holders}) order by id"
+        ).format(holders=holders), flow_instance_id_list, _mapper)
+
+    def query_finished_steps(self, flow_instance_id):
+        """查询已经完成的step集合，使用加锁读以便看到其它事务最新提交的结果
+        """
+        rs = self._db.query_all((
+            "select distinct step_name from job_instance where "
+            "flow_instance_id = %s and status = %s lock in share mode"
+        ), (flow_instance_id, JobStatus.STATUS_FINISHED))
+        return frozenset(row["step_name"] for row in rs)
+
     def update_status(self, job_instance_id, status):
         now = datetime.datetime.now()
         return self._db.execute((
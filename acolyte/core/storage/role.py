@@ -12,9 +12,22 @@ def _mapper(result):
 
 class RoleDAO(AbstractDAO):
 
-    def __init__(self, db):
+    def __init__(self, db, cache=None):
+        """
+        :param db: 数据源
+        :param cache: EntityCache对象，指定后按ID的查询会优先从缓存读取
+        """
         super().__init__(db)
+        self._cache = cache
 
     def query_role_by_id(self, id_):
+        if self._cache is None:
+            return self._query_role_by_id(id_)
+        return self._cache.get("role", id_, self._query_role_by_id)
+
+    def _query_role_by_id(self, id_):
         return self._db.query_one(
             "select * from role where id = %s", (id_,), _mapper)
+
+    def query_all_roles(self):
+        return self._db.query_all("select * from role", tuple(), _mapper)
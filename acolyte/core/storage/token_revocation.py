@@ -0,0 +1,50 @@
+import datetime
+from acolyte.core.storage import AbstractDAO
+
+
+class TokenRevocationDAO(AbstractDAO):
+
+    """被吊销的token记录，各节点按照ID增量同步到本地
+    """
+
+    def __init__(self, db):
+        super().__init__(db)
+
+    def insert(self, token_id, user_id, expires_on):
+        now = datetime.datetime.now()
+        return self._db.insert((
+            "insert into token_revocation ("
+            "token_id, user_id, expires_on, created_on) values ("
+            "%s, %s, %s, %s)"
+        ), (token_id, user_id, expires_on, now))
+
+    def query_max_id(self):
+        return self._db.query_one_field(
+            "select ifnull(max(id), 0) from token_revocation", tuple())
+
+    def query_alive(self, now):
+        """查询所有尚未过期的吊销记录，用于节点启动时的全量加载
+        """
+        return self._db.query_all((
+            "select id, token_id, expires_on from token_revocation "
+            "where expires_on > %s"
+        ), (now,))
+
+    def query_after(self, last_id, limit=1000):
+        return self._db.query_all((
+            "select id, token_id, expires_on from token_revocation "
+            "where id > %s order by id limit %s"
+        ), (last_id, limit))
+
+    def query_by_id_list(self, id_list):
+        if not id_list:
+            return []
+        return self._db.query_all((
+            "select id, token_id, expires_on from token_revocation "
+            "where id in ({}) order by id"
+        ).format(",".join(["%s"] * len(id_list))), id_list)
+
+    def delete_before(self, expires_on):
+        return self._db.execute(
+            "delete from token_revocation where expires_on < %s",
+            (expires_on,))
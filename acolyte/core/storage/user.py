@@ -11,27 +11,54 @@ def _mapper(result):
 
 class UserDAO(AbstractDAO):
 
-    def __init__(self, db):
+    def __init__(self, db, cache=None):
+        """
+        :param db: 数据源
+        :param cache: EntityCache对象，指定后按ID的查询会优先从缓存读取
+        """
         super().__init__(db)
+        self._cache = cache
 
     def query_user_by_id(self, user_id):
-        global _mapper
+        if self._cache is None:
+            return self._query_user_by_id(user_id)
+        return self._cache.get("user", user_id, self._query_user_by_id)
+
+    def _query_user_by_id(self, user_id):
         return self._db.query_one((
             "select * from user where id = %s"
         ), (user_id,), _mapper)
 
     def query_users_by_id_list(self, id_list, to_dict=False):
-        """根据ID列表来批量查询用户信息
+        """根据ID列表来批量查询用户信息，
+           指定了缓存时，只有未命中缓存的用户才会去查询数据库
         """
-        global _mapper
+        id_list = list(id_list)
+        if not id_list:
+            return {} if to_dict else []
+        if self._cache is None:
+            users = self._query_users_by_id_list(id_list)
+        else:
+            user_map = self._cache.get_many(
+                "user", id_list, self._query_users_by_id_list)
+            users = [user_map[id_] for id_ in id_list if id_ in user_map]
+        if to_dict:
+            return {u.id: u for u in users}
+        return users
+
+    def _query_users_by_id_list(self, id_list):
         holders = ",".join(("%s", ) * len(id_list))
-        users = self._db.query_all((
+        return self._db.query_all((
             "select * from user "
             "where id in ({holders})"
         ).format(holders=holders), id_list, _mapper)
-        if to_dict:
-            return {u.id: u for u in users}
-        return users
+
+    def query_recent_users(self, limit):
+        """查询最近登录过的用户，用于缓存预热
+        """
+        return self._db.query_all((
+            "select * from user order by last_login_time desc limit %s"
+        ), (limit,), _mapper)
 
     def is_email_exist(self, email):
         return self._db.query_one(
@@ -39,31 +66,35 @@ class UserDAO(AbstractDAO):
 
     def insert_user(self, email, password, name, role):
         now = datetime.datetime.now()
-        with self._db.connection() as conn:
-            with conn.cursor() as csr:
-                csr.execute((
-                    "insert into user ("
-                    "email, password, name, role, "
-                    "created_on, last_login_time) values ("
-                    "%s, %s, %s, %s, %s, %s)"
-                ), (email, password, name, role, now, now))
-                conn.commit()
-                return User(csr.lastrowid,
-                            email, name, role, now, now)
+        user = self._db.insert((
+            "insert into user ("
+            "email, password, name, role, "
+            "created_on, last_login_time) values ("
+            "%s, %s, %s, %s, %s, %s)"
+        ), (email, password, name, role, now, now),
+            lambda id_: User(id_, email, name, role, now, now))
+        if self._cache is not None:
+            self._cache.invalidate("user", user.id)
+        return user
 
     def delete_by_id(self, user_id):
         if isinstance(user_id, list):
             holders = ",".join(("%s", ) * len(user_id))
-            return self._db.execute(
+            row_num = self._db.execute(
                 "delete from user where id in ({holders})".format(
                     holders=holders), user_id)
         else:
-            return self._db.execute(
+            row_num = self._db.execute(
                 "delete from user where id = %s", (user_id, ))
+        self._invalidate(user_id)
+        return row_num
 
     def query_user_by_email_and_password(self, email, password):
-        global _mapper
         return self._db.query_one((
             "select * from user "
             "where email = %s and password = %s"
         ), (email, password), _mapper)
+
+    def _invalidate(self, user_id):
+        if self._cache is not None:
+            self._cache.invalidate("user", user_id)
@@ -15,17 +15,43 @@ class UserTokenDAO(AbstractDAO):
     def __init__(self, db):
         super().__init__(db)
 
-    def upsert_token(self, user_id, token):
-        """如果用户ID不存在，则插入新纪录
-           如果已经存在，那么更新token
+    def upsert_token(self, user_id, token_id, session_data, expires_on):
+        """记录用户最近一次签发的token以及会话数据，一次写入完成
+           如果用户ID不存在，则插入新纪录，如果已经存在，那么覆盖，
+           被覆盖的旧token在同一条语句中通过会话变量取出，与写入在同一个行锁下完成
+           :return: 被覆盖的旧token及其过期时间，首次写入时返回None
         """
         now = datetime.datetime.now()
-        return self._db.execute((
-            "insert into user_token ("
-            "id, token, session_data, created_on) values ("
-            "%s, %s, '{}', %s) on duplicate key update "
-            "token = %s, session_data = '{}', created_on = %s"
-        ), (user_id, token, now, token, now))
+        session_data = json.dumps(session_data)
+
+        def callback(cursor):
+            cursor.execute((
+                "set @acolyte_last_token = null, "
+                "@acolyte_last_expires_on = null"
+            ), None)
+            # 赋值按照从左到右的顺序执行，第一个赋值取到的依然是旧值
+            cursor.execute((
+                "insert into user_token ("
+                "id, token, session_data, created_on, expires_on) values ("
+                "%s, %s, %s, %s, %s) on duplicate key update "
+                "session_data = if("
+                "(@acolyte_last_token := token) is null or "
+                "(@acolyte_last_expires_on := expires_on) is null, "
+                "values(session_data), values(session_data)), "
+                "token = values(token), "
+                "created_on = values(created_on), "
+                "expires_on = values(expires_on)"
+            ), (user_id, token_id, session_data, now, expires_on))
+            cursor.execute((
+                "select @acolyte_last_token as token, "
+                "cast(@acolyte_last_expires_on as datetime) as expires_on"
+            ), None)
+            return cursor.fetchone()
+
+        last_token = self._db.cursor_callback(callback)
+        if last_token is None or last_token["token"] is None:
+            return None
+        return last_token
 
     def query_token_by_id(self, user_id) -> str:
         return self._db.query_one_field((
@@ -33,22 +59,10 @@ class UserTokenDAO(AbstractDAO):
         ), (user_id,))
 
     def query_session_data(self, token):
-        global _session_data_mapper
         return self._db.query_one(
             "select id, session_data from user_token where token = %s",
             (token,), _session_data_mapper)
 
-    def save_session_data(self, token, **kwds):
-        session_data_rs = self.query_session_data(token)
-        if session_data_rs is None:
-            return
-        session_data = session_data_rs["session_data"]
-        session_data.update(kwds)
-        self._db.execute((
-            "update user_token set session_data = %s where "
-            "token = %s limit 1"
-        ), (json.dumps(session_data), token))
-
     def delete_by_token(self, token):
         self._db.execute(
             "delete from user_token where token = %s", (token,))
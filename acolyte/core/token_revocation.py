@@ -0,0 +1,142 @@
+import time
+import datetime
+import threading
+import collections
+from acolyte.util import log
+from acolyte.core.storage.token_revocation import TokenRevocationDAO
+
+
+class TokenRevocationList:
+
+    """被吊销token的进程内黑名单
+       token本身是无状态的，只有退出登录等吊销操作才会写入token_revocation表，
+       各节点启动时全量加载尚未过期的记录，之后通过后台线程按ID增量同步，
+       校验token时只需要查询本地的集合
+    """
+
+    # 每次同步读取的最大记录数目
+    BATCH_SIZE = 1000
+
+    # ID较小的事务可能晚于ID较大的事务提交，同步时跳过的ID会在该时间(秒)内被重新查询，
+    # 超过该时间仍未出现的ID视为所在的事务已经回滚
+    GAP_TIMEOUT = 60
+
+    # 最多跟踪的空缺ID数目，超过时放弃最早的空缺
+    MAX_GAPS = 1000
+
+    def __init__(self, db, poll_interval=5):
+        """
+        :param db: 数据源
+        :param poll_interval: 同步吊销记录的间隔(秒)，小于等于0则不启动同步线程
+        """
+        self.poll_interval = poll_interval
+        self._dao = TokenRevocationDAO(db)
+        self._revoked = {}  # token_id -> expires_on
+        self._lock = threading.Lock()
+        self._last_id = 0
+        self._gaps = collections.OrderedDict()  # 空缺的ID -> 发现的时间
+        self._last_purge_time = None
+        self._stopped = threading.Event()
+
+    def is_revoked(self, token_id):
+        return token_id in self._revoked
+
+    def revoke(self, token_id, user_id, expires_on):
+        """吊销token，本节点立即生效，其它节点在下一次同步之后生效
+           :param token_id: token编号
+           :param user_id: token所属用户
+           :param expires_on: token的过期时间，之后该记录就可以被清理掉了
+        """
+        with self._lock:
+            self._revoked[token_id] = expires_on
+        self._dao.insert(token_id, user_id, expires_on)
+
+    def start(self):
+        """全量加载并启动同步线程
+        """
+        # 先记录最大ID，加载期间新增的记录会在之后的同步中被读取
+        self._last_id = self._dao.query_max_id()
+        rows = self._dao.query_alive(datetime.datetime.now())
+        with self._lock:
+            for row in rows:
+                self._revoked[row["token_id"]] = row["expires_on"]
+        log.acolyte.info(
+            "token revocation list loaded: {} tokens".format(len(rows)))
+
+        if self.poll_interval > 0:
+            poll_thread = threading.Thread(
+                target=self._poll_loop, name="acolyte-token-revocation")
+            poll_thread.daemon = True
+            poll_thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _poll_loop(self):
+        while not self._stopped.wait(self.poll_interval):
+            try:
+                self.poll()
+            except Exception:
+                log.acolyte.exception("poll token revocation error")
+
+    def poll(self):
+        """读取新的吊销记录，并清理已经过期的记录
+        """
+        while True:
+            rows = self._dao.query_after(self._last_id, self.BATCH_SIZE)
+            if rows:
+                self._track_gaps(rows)
+                self._add(rows)
+            if len(rows) < self.BATCH_SIZE:
+                break
+        self._poll_gaps()
+        self._purge()
+
+    def _add(self, rows):
+        with self._lock:
+            for row in rows:
+                self._revoked[row["token_id"]] = row["expires_on"]
+
+    def _track_gaps(self, rows):
+        """记录两次读取之间跳过的ID，并推进_last_id
+        """
+        now = time.time()
+        for row in rows:
+            first_missing = max(
+                self._last_id + 1, row["id"] - self.MAX_GAPS)
+            for missing_id in range(first_missing, row["id"]):
+                self._gaps[missing_id] = now
+            self._last_id = row["id"]
+        while len(self._gaps) > self.MAX_GAPS:
+            self._gaps.popitem(last=False)
+
+    def _poll_gaps(self):
+        """重新查询空缺的ID，补上后来提交的吊销记录
+        """
+        if not self._gaps:
+            return
+        rows = self._dao.query_by_id_list(list(self._gaps))
+        for row in rows:
+            del self._gaps[row["id"]]
+        expire_time = time.time() - self.GAP_TIMEOUT
+        while self._gaps and \
+                next(iter(self._gaps.values())) < expire_time:
+            self._gaps.popitem(last=False)
+        self._add(rows)
+
+    def _purge(self):
+        # 过期的token即使不在黑名单中也无法通过校验
+        now = datetime.datetime.now()
+        with self._lock:
+            self._revoked = {
+                token_id: expires_on
+                for token_id, expires_on in self._revoked.items()
+                if expires_on > now
+            }
+
+        # 每小时最多清理一次数据库中的过期记录
+        if self._last_purge_time is not None and \
+                (now - self._last_purge_time).total_seconds() < 3600:
+            return
+        self._last_purge_time = now
+        self._dao.delete_before(now)
@@ -1,15 +1,18 @@
 """本模块包含跟用户相关的Facade接口
 """
 
-import time
-import random
+import datetime
 from acolyte.util.validate import (
     IntField,
     StrField,
     check,
     BadReq
 )
-from acolyte.util.sec import sha1
+from acolyte.util.sec import (
+    sha1,
+    new_token_id,
+    InvalidTokenException
+)
 from acolyte.core.service import AbstractService, Result
 from acolyte.core.storage.user import UserDAO
 from acolyte.core.storage.role import RoleDAO
@@ -18,16 +21,21 @@ from acolyte.core.storage.user_token import UserTokenDAO
 
 class UserService(AbstractService):
 
-    _TOKEN_SALT = "6f81900c31f7fd80bd"
+    # 推送凭证的用途以及有效期(秒)
+    STREAM_TICKET_PURPOSE = "flow_event_stream"
+    STREAM_TICKET_TTL = 60
 
     def __init__(self, service_container):
         super().__init__(service_container)
 
     def _after_register(self):
         self._db = self._("db")
-        self._user_dao = UserDAO(self._db)
-        self._role_dao = RoleDAO(self._db)
+        entity_cache = self._("entity_cache")
+        self._user_dao = UserDAO(self._db, entity_cache)
+        self._role_dao = RoleDAO(self._db, entity_cache)
         self._user_token_dao = UserTokenDAO(self._db)
+        self._token_signer = self._("token_signer")
+        self._token_revocation = self._("token_revocation")
 
     @check(
         StrField("email", required=True),
@@ -36,8 +44,9 @@ class UserService(AbstractService):
     def login(self, email: str, password: str) -> Result:
         """登录
         S1. 通过email和password检索用户
-        S2. 创建并获取新的token
-        S3. 存储相关用户数据到session_data
+        S2. 签发携带用户信息的token
+        S3. 一次写入记录本次签发的token以及会话数据
+        S4. 吊销该用户上一次签发的token，保证同一时间只有一个有效的会话
         """
         user = self._user_dao.query_user_by_email_and_password(
             email=email,
@@ -46,31 +55,24 @@ class UserService(AbstractService):
         if user is None:
             raise BadReq("no_match")
 
-        # do upsert
-        new_token = self._gen_new_token(user.id)
-        self._user_token_dao.upsert_token(user.id, new_token)
-
-        # save user basic info to session data
-        self._user_token_dao.save_session_data(
-            new_token, name=user.name, email=user.email)
+        session_data = {"name": user.name, "email": user.email}
+        token_id = new_token_id()
+        new_token, payload = self._token_signer.sign({
+            "id": user.id,
+            "jti": token_id,
+            "session_data": session_data,
+        })
+
+        last_token = self._user_token_dao.upsert_token(
+            user.id, token_id, session_data,
+            datetime.datetime.fromtimestamp(payload["exp"]))
+        if last_token is not None and \
+                last_token["expires_on"] > datetime.datetime.now():
+            self._token_revocation.revoke(
+                last_token["token"], user.id, last_token["expires_on"])
 
         return Result.ok(data={"id": user.id, "token": new_token})
 
-    def _gen_new_token(self, user_id: int):
-        """生成新token
-           规则: sha1({用户ID}{时间戳}{随机数}{salt})
-        """
-        return sha1((
-            "{user_id}"
-            "{timestamp_int}"
-            "{randnum}"
-            "{salt}"
-        ).format(
-            user_id=user_id,
-            timestamp_int=int(time.time()),
-            randnum=random.randint(10000, 99999),
-            salt=UserService._TOKEN_SALT))
-
     @check(
         StrField("email", required=True, regex=r'^[\w.-]+@[\w.-]+.\w+$'),
         StrField("password", required=True, min_len=6, max_len=20),
@@ -116,19 +118,72 @@ class UserService(AbstractService):
     @check(StrField("token", required=True))
     def check_token(self, token: str) -> Result:
         """检查token
-           S1. 查找token相关的用户信息
-           S2. 返回token关联简单会话数据
+           S1. 校验签名以及过期时间
+           S2. 检查token是否已经被吊销
+           S3. 返回token中携带的用户ID以及会话数据
+           整个过程都在内存中完成，不会访问数据库
+        """
+        return Result.ok(data=self._verify_token(token))
+
+    @check(StrField("token", required=True))
+    def issue_stream_ticket(self, token: str) -> Result:
+        """为推送接口签发短期凭证
+           浏览器中的EventSource无法设置请求头，只能通过URL参数传递凭证，
+           URL会出现在各种访问日志中，因此不能直接传递登录token，
+           凭证只能用于建立推送连接，并且很快过期，与登录token共用同一个吊销记录
+           :param token: 登录token
         """
-        session_data = self._user_token_dao.query_session_data(token)
-        if session_data is None:
+        payload = self._verify_payload(token, purpose=None)
+        ticket, _ = self._token_signer.sign({
+            "id": payload["id"],
+            "jti": payload["jti"],
+            "purpose": self.STREAM_TICKET_PURPOSE,
+        }, ttl=self.STREAM_TICKET_TTL)
+        return Result.ok(data={
+            "ticket": ticket,
+            "expires_in": self.STREAM_TICKET_TTL
+        })
+
+    @check(StrField("ticket", required=True))
+    def check_stream_ticket(self, ticket: str) -> Result:
+        """检查推送凭证，返回其中携带的用户ID
+        """
+        payload = self._verify_payload(
+            ticket, purpose=self.STREAM_TICKET_PURPOSE)
+        return Result.ok(data={"id": payload["id"]})
+
+    def _verify_token(self, token):
+        payload = self._verify_payload(token, purpose=None)
+        return {"id": payload["id"], "session_data": payload["session_data"]}
+
+    def _verify_payload(self, token, purpose):
+        """校验签名、过期时间、吊销记录以及用途，
+           登录token没有purpose，推送凭证不能当作登录token使用，反之亦然
+        """
+        try:
+            payload = self._token_signer.verify(token)
+        except InvalidTokenException:
+            raise BadReq("invalid_token")
+        if payload.get("purpose") != purpose:
+            raise BadReq("invalid_token")
+        if self._token_revocation.is_revoked(payload["jti"]):
             raise BadReq("invalid_token")
-        return Result.ok(data=session_data)
+        return payload
 
     def logout(self, token: str) -> Result:
         """退出
-           S1. 直接从数据库中删除token记录
+           S1. 吊销token，写入黑名单并同步到各个节点
+           S2. 删除该用户最近一次签发token的记录
         """
-        self._user_token_dao.delete_by_token(token)
+        try:
+            payload = self._token_signer.verify(token)
+        except InvalidTokenException:
+            # 不合法或者已经过期的token本身就无法通过校验
+            return Result.ok()
+        self._token_revocation.revoke(
+            payload["jti"], payload["id"],
+            datetime.datetime.fromtimestamp(payload["exp"]))
+        self._user_token_dao.delete_by_token(payload["jti"])
         return Result.ok()
 
     def profile(self, user_id: int) -> Result:
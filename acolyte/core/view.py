@@ -3,6 +3,7 @@ from abc import ABCMeta
 from acolyte.core.job import JobArg
 from acolyte.core.flow import FlowMeta
 from acolyte.core.mgr import AbstractManager
+from acolyte.exception import ObjectNotFoundException
 from acolyte.util.validate import (
     Field,
     IntField,
@@ -43,7 +44,12 @@ class FlowMetaView(ViewObject):
            :param flow_meta: flow meta对象
            :param job_mgr: 用于获取Job对象
         """
-        jobs = [JobRefView.from_job_ref(job_ref) for job_ref in flow_meta.jobs]
+        jobs = [
+            JobRefView.from_job_ref(
+                job_ref, flow_meta.get_prev_steps(job_ref.step_name),
+                _get_job(job_mgr, job_ref.job_name))
+            for job_ref in flow_meta.jobs
+        ]
         return cls(flow_meta.name, flow_meta.description, jobs)
 
     def __init__(self, name: str, description: str, jobs: list):
@@ -57,22 +63,45 @@ class FlowMetaView(ViewObject):
         self.jobs = jobs
 
 
+def _get_job(job_mgr, job_name):
+    try:
+        return job_mgr.get(job_name)
+    except ObjectNotFoundException:
+        return None
+
+
 class JobRefView(ViewObject):
 
     @classmethod
-    def from_job_ref(cls, job_ref) -> ViewObject:
-        return cls(job_ref.step_name, job_ref.job_name, job_ref.bind_args)
+    def from_job_ref(cls, job_ref, prev_steps=None, job=None) -> ViewObject:
+        """
+        :param job_ref: JobRef对象
+        :param prev_steps: 执行该步骤之前需要完成的步骤
+        :param job: 引用的Job对象，指定时包含各个action的参数声明
+        """
+        job_args = {} if job is None else {
+            action: [JobArgView.from_job_arg(job_arg) for job_arg in args]
+            for action, args in job.job_args.items()
+        }
+        return cls(job_ref.step_name, job_ref.job_name, job_ref.bind_args,
+                   sorted(prev_steps) if prev_steps is not None else [],
+                   job_args)
 
     def __init__(self, step_name: str, job_name: str,
-                 bind_args: dict):
+                 bind_args: dict, prev_steps: list = None,
+                 job_args: dict = None):
         """
         :param step_name: 步骤名称
         :param job_name: Job名称
         :param bind_args: 绑定参数
+        :param prev_steps: 执行该步骤之前需要完成的步骤
+        :param job_args: 各个action的参数声明，action -> JobArgView列表
         """
         self.step_name = step_name
         self.job_name = job_name
         self.bind_args = bind_args
+        self.prev_steps = prev_steps if prev_steps is not None else []
+        self.job_args = job_args if job_args is not None else {}
 
 
 class FieldInfoView(ViewObject):
@@ -225,3 +254,130 @@ class FlowSimpleInstanceView(ViewObject):
         self.updated_on = updated_on
         self.flow_template_info = flow_template_info
         self.creator_info = creator_info
+
+
+class FlowInstanceDetailsView(FlowSimpleInstanceView):
+
+    """FlowInstance详情，在简单视图的基础上包含了各个job的运行情况
+    """
+
+    def __init__(self, id_, status, description, current_step,
+                 created_on, updated_on, flow_template_info, creator_info,
+                 job_instances):
+        """
+        :param job_instances: JobInstanceView列表
+        """
+        super().__init__(id_, status, description, current_step,
+                         created_on, updated_on, flow_template_info,
+                         creator_info)
+        self.job_instances = job_instances
+
+
+class JobInstanceView(ViewObject):
+
+    """描述一个Job的运行实例及其执行过的action
+    """
+
+    @classmethod
+    def from_job_instance(cls, job_instance, actions):
+        return cls(
+            id_=job_instance.id,
+            step_name=job_instance.step_name,
+            status=job_instance.status,
+            trigger_actor=job_instance.trigger_actor,
+            created_on=job_instance.created_on,
+            updated_on=job_instance.updated_on,
+            actions=[JobActionStatusView.from_job_action_data(action)
+                     for action in actions]
+        )
+
+    def __init__(self, id_, step_name, status, trigger_actor,
+                 created_on, updated_on, actions):
+        """
+        :param id_: job instance编号
+        :param step_name: 对应的step名称
+        :param status: 运行状态
+        :param trigger_actor: 触发者
+        :param created_on: 创建时间
+        :param updated_on: 最近更新时间
+        :param actions: JobActionStatusView列表
+        """
+        self.id = id_
+        self.step_name = step_name
+        self.status = status
+        self.trigger_actor = trigger_actor
+        self.created_on = created_on
+        self.updated_on = updated_on
+        self.actions = actions
+
+
+class JobInstanceDetailsView(JobInstanceView):
+
+    """Job instance详情，action按ID分页返回
+    """
+
+    def __init__(self, id_, step_name, status, trigger_actor,
+                 created_on, updated_on, actions, next_offset_id):
+        """
+        :param next_offset_id: 查询下一页action时使用的offset_id，为None时表示没有下一页
+        """
+        super().__init__(id_, step_name, status, trigger_actor,
+                         created_on, updated_on, actions)
+        self.next_offset_id = next_offset_id
+
+
+class PageView(ViewObject):
+
+    """基于ID键集分页的查询结果
+    """
+
+    def __init__(self, items, next_offset_id):
+        """
+        :param items: 当前页的数据
+        :param next_offset_id: 查询下一页时使用的offset_id，为None时表示没有下一页
+        """
+        self.items = items
+        self.next_offset_id = next_offset_id
+
+
+class JobActionStatusView(ViewObject):
+
+    """描述一个Job Action的执行状态
+    """
+
+    @classmethod
+    def from_job_action_data(cls, action):
+        return cls(
+            id_=action.id,
+            job_instance_id=action.job_instance_id,
+            action=action.action,
+            actor=action.actor,
+            status=action.status,
+            arguments=action.arguments,
+            data=action.data,
+            created_on=action.created_on,
+            updated_on=action.updated_on
+        )
+
+    def __init__(self, id_, job_instance_id, action, actor, status,
+                 arguments, data, created_on, updated_on):
+        """
+        :param id_: action编号
+        :param job_instance_id: 隶属的job instance
+        :param action: action名称
+        :param actor: 执行者
+        :param status: 执行状态
+        :param arguments: 执行时使用的参数
+        :param data: 回填的数据，执行失败或出现异常时包含错误信息
+        :param created_on: 开始执行时间
+        :param updated_on: 最近更新时间
+        """
+        self.id = id_
+        self.job_instance_id = job_instance_id
+        self.action = action
+        self.actor = actor
+        self.status = status
+        self.arguments = arguments
+        self.data = data
+        self.created_on = created_on
+        self.updated_on = updated_on
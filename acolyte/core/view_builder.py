@@ -0,0 +1,107 @@
+"""本模块用于批量组装FlowInstance相关的视图
+
+   一页flow instance所关联的template、user以及job数据都通过IN查询一次性加载，
+   查询次数与一页中的记录数目无关
+"""
+
+import collections
+from acolyte.core.storage.flow_template import FlowTemplateDAO
+from acolyte.core.storage.user import UserDAO
+from acolyte.core.storage.job_instance import JobInstanceDAO
+from acolyte.core.storage.job_action_data import JobActionDataDAO
+from acolyte.core.view import (
+    UserSimpleView,
+    FlowTemplateSimpleView,
+    FlowSimpleInstanceView,
+    FlowInstanceDetailsView,
+    JobInstanceView
+)
+
+
+class FlowInstanceViewBuilder:
+
+    """批量构建FlowInstance视图
+
+       builder = FlowInstanceViewBuilder(db, entity_cache, flow_meta_mgr)
+       views = builder.build(flow_instances)
+       details = builder.build(flow_instances, with_jobs=True)
+    """
+
+    def __init__(self, db, entity_cache, flow_meta_mgr):
+        """
+        :param db: 数据源
+        :param entity_cache: EntityCache对象，template和user会优先从缓存读取
+        :param flow_meta_mgr: flow meta管理器
+        """
+        self._flow_meta_mgr = flow_meta_mgr
+        self._flow_tpl_dao = FlowTemplateDAO(db, entity_cache)
+        self._user_dao = UserDAO(db, entity_cache)
+        self._job_instance_dao = JobInstanceDAO(db)
+        self._job_action_dao = JobActionDataDAO(db)
+
+    def build(self, flow_instances, with_jobs=False):
+        """构建视图列表，顺序与flow_instances保持一致
+           :param flow_instances: FlowInstance列表
+           :param with_jobs: 是否包含job instance以及action数据，
+                             为True时返回FlowInstanceDetailsView
+        """
+        if not flow_instances:
+            return []
+
+        # 同一个template和user的视图只构建一次
+        templates = self._flow_tpl_dao.query_flow_templates_by_id_list(
+            {fi.flow_template_id for fi in flow_instances}, to_dict=True)
+        template_views = {
+            tpl_id: FlowTemplateSimpleView.from_flow_template(
+                tpl, self._flow_meta_mgr)
+            for tpl_id, tpl in templates.items()
+        }
+        users = self._user_dao.query_users_by_id_list(
+            {fi.initiator for fi in flow_instances}, to_dict=True)
+        user_views = {user_id: UserSimpleView.from_user(user)
+                      for user_id, user in users.items()}
+
+        if not with_jobs:
+            return [FlowSimpleInstanceView(
+                id_=fi.id,
+                status=fi.status,
+                description=fi.description,
+                current_step=fi.current_step,
+                created_on=fi.created_on,
+                updated_on=fi.updated_on,
+                flow_template_info=template_views.get(fi.flow_template_id),
+                creator_info=user_views.get(fi.initiator)
+            ) for fi in flow_instances]
+
+        job_views = self._build_job_views([fi.id for fi in flow_instances])
+        return [FlowInstanceDetailsView(
+            id_=fi.id,
+            status=fi.status,
+            description=fi.description,
+            current_step=fi.current_step,
+            created_on=fi.created_on,
+            updated_on=fi.updated_on,
+            flow_template_info=template_views.get(fi.flow_template_id),
+            creator_info=user_views.get(fi.initiator),
+            job_instances=job_views.get(fi.id, [])
+        ) for fi in flow_instances]
+
+    def _build_job_views(self, flow_instance_id_list):
+        """加载并按flow instance分组job视图，每张表只查询一次
+           :return: flow_instance_id -> JobInstanceView列表
+        """
+        job_instances = self._job_instance_dao.query_by_flow_instance_id_list(
+            flow_instance_id_list)
+        if not job_instances:
+            return {}
+
+        actions = collections.defaultdict(list)
+        for action in self._job_action_dao.query_by_job_instance_id_list(
+                [ji.id for ji in job_instances]):
+            actions[action.job_instance_id].append(action)
+
+        job_views = collections.defaultdict(list)
+        for ji in job_instances:
+            job_views[ji.flow_instance_id].append(
+                JobInstanceView.from_job_instance(ji, actions[ji.id]))
+        return job_views
@@ -55,6 +55,15 @@ class InvalidStatusException(EasemobFlowException):
         super().__init__(msg)
 
 
+class ConcurrentModificationException(EasemobFlowException):
+
+    """基于版本号的比较并更新失败，说明对象已经被其它请求修改
+    """
+
+    def __init__(self, msg):
+        super().__init__(msg)
+
+
 class InvalidArgumentException(EasemobFlowException):
 
     """当传递的参数不合法时抛出此异常
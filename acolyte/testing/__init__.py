@@ -6,9 +6,15 @@ from acolyte.testing.core.mgr_define import (
     job_mgr
 )
 from acolyte.util import db
+from acolyte.util.concurrent import BoundedExecutor
+from acolyte.util.sec import TokenSigner
 from acolyte.util import log
 from acolyte.util.json import to_json
 from acolyte.core.service import Result
+from acolyte.core.entity_cache import EntityCache
+from acolyte.core.token_revocation import TokenRevocationList
+from acolyte.core.flow_event_hub import FlowEventHub
+from acolyte.core.action_queue import ActionQueue
 from acolyte.core.flow_service import FlowService
 from acolyte.core.user_service import UserService
 from acolyte.core.job_service import JobService
@@ -32,6 +38,43 @@ class UnitTestBootstrap(AbstractBootstrap):
             service_obj=self._init_db(config)
         )
 
+        service_container.register(
+            service_id="action_executor",
+            service_obj=BoundedExecutor(max_workers=2, max_queue=2)
+        )
+
+        # 默认在本进程中执行后台action，队列由用例自行启用
+        service_container.register(
+            service_id="action_queue",
+            service_obj=ActionQueue(
+                service_container.get_service("db"), enabled=False)
+        )
+
+        # 测试中不启动轮询线程，也不做预热
+        service_container.register(
+            service_id="entity_cache",
+            service_obj=EntityCache(
+                service_container.get_service("db"), poll_interval=0)
+        )
+
+        service_container.register(
+            service_id="token_signer",
+            service_obj=TokenSigner("acolyte-unit-test", ttl=3600)
+        )
+
+        # 测试中不启动同步线程
+        service_container.register(
+            service_id="token_revocation",
+            service_obj=TokenRevocationList(
+                service_container.get_service("db"), poll_interval=0)
+        )
+
+        service_container.register(
+            service_id="flow_event_hub",
+            service_obj=FlowEventHub(
+                service_container.get_service("db"), poll_interval=0)
+        )
+
         service_container.register(
             service_id="job_manager",
             service_obj=job_mgr
@@ -61,7 +104,13 @@ class UnitTestBootstrap(AbstractBootstrap):
             "db": "easemob_flow",
         })
 
-        return db.ConnectionPool(db_connect_cfg, max_pool_size)
+        return db.ConnectionPool(
+            db_connect_cfg, max_pool_size,
+            min_pool_size=db_pool_cfg.get("min_pool_size", 0),
+            checkout_timeout=db_pool_cfg.get("checkout_timeout", 10),
+            max_idle_time=db_pool_cfg.get("max_idle_time", 600),
+            keepalive_interval=db_pool_cfg.get("keepalive_interval", 60)
+        )
 
 
 _test_bootstrap = UnitTestBootstrap()
@@ -74,7 +123,6 @@ class EasemobFlowTestCase(fixtures.TestWithFixtures):
     def _(self, service_id):
         """从容器中获取服务
         """
-        global _test_container
         return _test_container.get_service(service_id)
 
     def print_json(self, obj):
@@ -0,0 +1,130 @@
+import asyncio
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.core.service import Result
+from acolyte.api.admission import (
+    TokenBucket,
+    ConcurrencyLimiter,
+    AdmissionControl,
+    RequestRejectedException
+)
+
+
+class TokenBucketTestCase(EasemobFlowTestCase):
+
+    def testConsume(self):
+        """测试令牌的消耗与补充
+        """
+        bucket = TokenBucket(rate=2, burst=2)
+        now = bucket._last_time
+        self.assertEqual(bucket.consume(now), 0)
+        self.assertEqual(bucket.consume(now), 0)
+        self.assertAlmostEqual(bucket.consume(now), 0.5)
+
+        # 0.5秒之后补充了一个令牌
+        self.assertEqual(bucket.consume(now + 0.5), 0)
+        self.assertFalse(bucket.is_full(now + 0.5))
+        self.assertTrue(bucket.is_full(now + 10))
+
+
+class ConcurrencyLimiterTestCase(EasemobFlowTestCase):
+
+    def setUp(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+    def testAcquire(self):
+        """测试排队、名额转交以及等待队列已满
+        """
+        limiter = ConcurrencyLimiter(1, max_waiting=1, wait_timeout=None)
+
+        async def _test():
+            self.assertTrue(await limiter.acquire())
+            waiting = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0)
+            self.assertEqual(limiter.waiting, 1)
+
+            # 等待队列已满
+            self.assertFalse(await limiter.acquire())
+
+            # 释放的名额直接转交给等待者
+            limiter.release()
+            self.assertTrue(await waiting)
+            self.assertEqual(limiter.active, 1)
+            limiter.release()
+            self.assertEqual(limiter.active, 0)
+
+        self._loop.run_until_complete(_test())
+
+    def testWaitTimeout(self):
+        """测试排队超时
+        """
+        limiter = ConcurrencyLimiter(1, max_waiting=1, wait_timeout=0.05)
+
+        async def _test():
+            self.assertTrue(await limiter.acquire())
+            self.assertFalse(await limiter.acquire())
+            self.assertEqual(limiter.waiting, 0)
+            limiter.release()
+            self.assertEqual(limiter.active, 0)
+
+        self._loop.run_until_complete(_test())
+
+    def tearDown(self):
+        self._loop.close()
+
+
+class AdmissionControlTestCase(EasemobFlowTestCase):
+
+    def setUp(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+    def testUserLimit(self):
+        """测试单个用户的并发数目以及请求频率限制
+        """
+        admission = AdmissionControl(
+            "test", user_max_concurrency=1, user_rate=1, user_burst=2)
+
+        async def _test():
+            ticket = await admission.admit(1)
+
+            # 超过用户的并发数目
+            with self.assertRaises(RequestRejectedException) as raise_ctx:
+                await admission.admit(1)
+            self.assertEqual(raise_ctx.exception.result.status_code,
+                             Result.STATUS_TOO_MANY_REQUESTS)
+
+            # 其他用户不受影响
+            (await admission.admit(2)).release()
+
+            # 令牌已经用完
+            ticket.release()
+            ticket.release()
+            with self.assertRaises(RequestRejectedException) as raise_ctx:
+                await admission.admit(1)
+            self.assertEqual(raise_ctx.exception.result.reason,
+                             "too_many_requests")
+            self.assertEqual(raise_ctx.exception.retry_after, 1)
+
+        self._loop.run_until_complete(_test())
+
+    def testRouteLimit(self):
+        """测试路由并发已满时返回503
+        """
+        admission = AdmissionControl(
+            "test", max_concurrency=1, max_waiting=0, retry_after=3)
+
+        async def _test():
+            ticket = await admission.admit(1)
+            with self.assertRaises(RequestRejectedException) as raise_ctx:
+                await admission.admit(2)
+            self.assertEqual(raise_ctx.exception.result.status_code,
+                             Result.STATUS_SERVICE_UNAVAILABLE)
+            self.assertEqual(raise_ctx.exception.retry_after, 3)
+            ticket.release()
+            (await admission.admit(2)).release()
+
+        self._loop.run_until_complete(_test())
+
+    def tearDown(self):
+        self._loop.close()
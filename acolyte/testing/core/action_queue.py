@@ -0,0 +1,81 @@
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.core.action_queue import ActionQueue
+from acolyte.core.storage.action_queue import ActionQueueDAO
+
+
+class ActionQueueTestCase(EasemobFlowTestCase):
+
+    def setUp(self):
+        db = self._("db")
+        self._queue = ActionQueue(db, enabled=True, lease_time=300)
+        self._queue_dao = ActionQueueDAO(db)
+        self._queue_id_collector = []
+
+    def testClaimAndAck(self):
+        """测试领取与确认
+        """
+        self._queue_id_collector.append(self._queue.enqueue(99901))
+        self._queue_id_collector.append(self._queue.enqueue(99902))
+
+        tasks = self._queue.claim("worker_a", 10)
+        claimed = {task["job_action_id"]: task for task in tasks}
+        self.assertIn(99901, claimed)
+        self.assertIn(99902, claimed)
+        self.assertEqual(claimed[99901]["attempts"], 1)
+
+        # 租约未到期，其它worker无法领取
+        tasks = self._queue.claim("worker_b", 10)
+        self.assertNotIn(99901, [task["job_action_id"] for task in tasks])
+
+        # 非租约持有者的确认无效
+        self._queue.ack("worker_b", claimed[99901]["id"])
+        self._queue.ack("worker_a", claimed[99901]["id"])
+        self._queue.ack("worker_a", claimed[99902]["id"])
+        self.assertIsNone(self._("db").query_one(
+            "select id from action_queue where job_action_id = %s",
+            (99901, )))
+
+    def testLeaseExpired(self):
+        """测试worker崩溃之后租约到期的任务会被重新领取
+        """
+        crashed_queue = ActionQueue(self._("db"), enabled=True, lease_time=-1)
+        self._queue_id_collector.append(crashed_queue.enqueue(99903))
+
+        tasks = crashed_queue.claim("worker_a", 10)
+        self.assertIn(99903, [task["job_action_id"] for task in tasks])
+
+        tasks = self._queue.claim("worker_b", 10)
+        task = [t for t in tasks if t["job_action_id"] == 99903][0]
+        self.assertEqual(task["attempts"], 2)
+
+    def testLocalLease(self):
+        """测试进程内执行的后台action的租约
+        """
+        queue = ActionQueue(self._("db"), enabled=False, lease_time=300)
+        self._queue_id_collector.append(queue.lease_local(99904))
+
+        # 租约未到期，不会被清理
+        self.assertEqual(queue.expire_local(), 0)
+        queue.renew_local()
+
+        queue.release_local(99904)
+        self.assertIsNone(self._("db").query_one(
+            "select id from action_queue where job_action_id = %s",
+            (99904, )))
+
+    def testLocalLeaseExpired(self):
+        """测试进程崩溃之后不再续约的本地租约会被其它进程清理
+        """
+        crashed_queue = ActionQueue(
+            self._("db"), enabled=False, lease_time=-1)
+        self._queue_id_collector.append(crashed_queue.lease_local(99905))
+
+        queue = ActionQueue(self._("db"), enabled=False, lease_time=300)
+        self.assertGreaterEqual(queue.expire_local(), 1)
+        self.assertIsNone(self._("db").query_one(
+            "select id from action_queue where job_action_id = %s",
+            (99905, )))
+
+    def tearDown(self):
+        for queue_id in self._queue_id_collector:
+            self._queue_dao.delete_by_id(queue_id)
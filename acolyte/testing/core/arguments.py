@@ -0,0 +1,46 @@
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.testing.core.job import EchoJob
+from acolyte.core.job import JobRef
+from acolyte.core.flow import FlowTemplate
+from acolyte.core.arguments import compile_action_args
+from acolyte.util.validate import InvalidFieldException
+
+
+class ArgumentPlanTestCase(EasemobFlowTestCase):
+
+    def setUp(self):
+        self._job = EchoJob()
+        self._job_ref = JobRef("echo", "echo", trigger={"a": 1},
+                               multiply={"c": 3})
+        self._flow_template = FlowTemplate(
+            1, "test_flow", "test_tpl", {
+                "echo": {
+                    "trigger": {"b": 2},
+                    "multiply": {"c": 5}
+                }
+            }, 0, 1, None)
+
+    def testResolve(self):
+        """测试const、static以及auto参数的解析
+        """
+        plan = compile_action_args(
+            self._job, self._job_ref, self._flow_template, "trigger")
+        # const和static参数不会被请求参数覆盖
+        self.assertEqual(plan.resolve({"a": 100, "b": 100}), {"a": 1, "b": 2})
+
+        plan = compile_action_args(
+            self._job, self._job_ref, self._flow_template, "multiply")
+        # auto参数优先使用template的绑定值，请求中的参数会重新检查
+        self.assertEqual(plan.resolve({}), {"c": 5})
+        self.assertEqual(plan.resolve({"c": "7"}), {"c": 7})
+
+        with self.assertRaises(InvalidFieldException) as cm:
+            plan.resolve({"c": "x"})
+        self.assertEqual(cm.exception.field_name, "echo.multiply.c")
+        self.assertEqual(cm.exception.reason, "invalid_type")
+
+        plan = compile_action_args(
+            self._job, self._job_ref, self._flow_template, "minus")
+        with self.assertRaises(InvalidFieldException) as cm:
+            plan.resolve({"d": 1})
+        self.assertEqual(cm.exception.field_name, "echo.minus.e")
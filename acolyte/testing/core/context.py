@@ -23,5 +23,38 @@ class MySQLContextTestCase(EasemobFlowTestCase):
         del self._flow_ctx["id"]
         self.assertIsNone(self._flow_ctx["id"])
 
+    def testFlush(self):
+        """测试缓冲写入以及批量写回
+        """
+
+        self._flow_ctx.update({"id": 100, "name": "Sam", "age": 18})
+        del self._flow_ctx["age"]
+
+        # 尚未flush，数据库中没有任何数据
+        other_ctx = MySQLContext(
+            self._("FlowExecutorService"), self._("db"), 100086)
+        self.assertEqual(len(other_ctx), 0)
+
+        self._flow_ctx.flush()
+
+        other_ctx = MySQLContext(
+            self._("FlowExecutorService"), self._("db"), 100086)
+        self.assertEqual(other_ctx.get_many(["id", "name", "age"]), {
+            "id": "100",
+            "name": "Sam",
+            "age": None
+        })
+        self.assertIn("name", other_ctx)
+        self.assertNotIn("age", other_ctx)
+
+        # 覆盖已有的值并删除
+        other_ctx["name"] = "Jack"
+        del other_ctx["id"]
+        other_ctx.flush()
+
+        self._flow_ctx = MySQLContext(
+            self._("FlowExecutorService"), self._("db"), 100086)
+        self.assertEqual(dict(self._flow_ctx.items()), {"name": "Jack"})
+
     def tearDown(self):
         self._flow_ctx.destroy()
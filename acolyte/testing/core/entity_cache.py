@@ -0,0 +1,39 @@
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.core.entity_cache import EntityCache
+from acolyte.core.storage.user import UserDAO
+
+
+class EntityCacheTestCase(EasemobFlowTestCase):
+
+    def setUp(self):
+        db = self._("db")
+        # 模拟两个节点各自的缓存
+        self._cache_a = EntityCache(db, poll_interval=0)
+        self._cache_b = EntityCache(db, poll_interval=0)
+        self._cache_a.start()
+        self._cache_b.start()
+        self._user_dao_a = UserDAO(db, self._cache_a)
+        self._user_dao_b = UserDAO(db, self._cache_b)
+        self._user = self._user_dao_a.insert_user(
+            "cache_test@easemob.com", "123456", "cache", 1)
+
+    def testCrossNodeInvalidation(self):
+        """测试通过change_log在节点之间同步缓存失效
+        """
+        user = self._user_dao_b.query_user_by_id(self._user.id)
+        self.assertEqual(user.name, "cache")
+        users = self._user_dao_b.query_users_by_id_list(
+            [self._user.id, 0], to_dict=True)
+        self.assertEqual(list(users.keys()), [self._user.id])
+
+        # 节点A删除用户，节点B在轮询之前依旧从缓存中读取
+        self._user_dao_a.delete_by_id(self._user.id)
+        self.assertIsNotNone(self._user_dao_b.query_user_by_id(self._user.id))
+        self.assertIsNone(self._user_dao_a.query_user_by_id(self._user.id))
+
+        # 轮询之后节点B的缓存失效
+        self._cache_b.poll()
+        self.assertIsNone(self._user_dao_b.query_user_by_id(self._user.id))
+
+    def tearDown(self):
+        self._user_dao_a.delete_by_id(self._user.id)
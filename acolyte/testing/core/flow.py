@@ -0,0 +1,41 @@
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.core.job import JobRef, ParallelRef
+from acolyte.core.flow import StepGraph
+from acolyte.exception import InvalidArgumentException
+
+
+class StepGraphTestCase(EasemobFlowTestCase):
+
+    def testCompile(self):
+        """测试编译包含并行分支的jobs声明
+        """
+        graph = StepGraph((
+            JobRef("a", "job_A"),
+            ParallelRef(
+                JobRef("b", "job_B"),
+                (JobRef("c1", "job_C"), JobRef("c2", "job_C")),
+            ),
+            JobRef("d", "job_D"),
+        ))
+
+        self.assertEqual([job_ref.step_name for job_ref in graph.job_refs],
+                         ["a", "b", "c1", "c2", "d"])
+        self.assertEqual(graph.get_next_steps("start"), {"a"})
+        self.assertEqual(graph.get_next_steps("a"), {"b", "c1"})
+        self.assertEqual(graph.get_prev_steps("c2"), {"c1"})
+        self.assertEqual(graph.get_prev_steps("d"), {"b", "c2"})
+        self.assertEqual(graph.get_prev_steps("finish"), {"d"})
+        self.assertEqual(graph.get_ancestors("d"),
+                         {"start", "a", "b", "c1", "c2"})
+
+        # 以并行分支结尾，finish需要等待所有分支
+        graph = StepGraph((
+            ParallelRef(JobRef("a", "job_A"), JobRef("b", "job_B")),
+        ))
+        self.assertEqual(graph.get_prev_steps("finish"), {"a", "b"})
+
+    def testInvalidDeclaration(self):
+        with self.assertRaises(InvalidArgumentException):
+            StepGraph((JobRef("a", "job_A"), JobRef("a", "job_B")))
+        with self.assertRaises(InvalidArgumentException):
+            StepGraph((JobRef("start", "job_A"), ))
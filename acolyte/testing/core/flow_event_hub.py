@@ -0,0 +1,134 @@
+import asyncio
+import datetime
+import threading
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.util.lock import LockManager
+from acolyte.core.flow import FlowEvent, FlowEventType
+from acolyte.core.flow_event_hub import FlowEventHub
+
+
+def _event(id_, flow_instance_id, flow_template_id, initiator):
+    return FlowEvent(
+        id_, flow_instance_id, flow_template_id, initiator,
+        FlowEventType.STEP_FINISH, "echo", datetime.datetime.now())
+
+
+class FlowEventHubTestCase(EasemobFlowTestCase):
+
+    def setUp(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._hub = FlowEventHub(self._("db"), poll_interval=0)
+
+    def testDispatch(self):
+        """测试按频道分发事件
+        """
+        subscription = self._hub.subscribe([
+            (FlowEventHub.CHANNEL_FLOW_INSTANCE, 1),
+            (FlowEventHub.CHANNEL_INITIATOR, 7),
+        ])
+
+        async def _test():
+            # 在其它线程中分发，同时匹配两个频道的事件只会投递一次
+            dispatch_thread = threading.Thread(
+                target=self._hub.dispatch,
+                args=([_event(1, 1, 5, 3), _event(2, 9, 5, 8),
+                       _event(3, 1, 5, 7)],))
+            dispatch_thread.start()
+            dispatch_thread.join()
+            events = await subscription.get(1)
+            self.assertEqual([event.id for event in events], [1, 3])
+
+            # 没有事件时超时返回
+            self.assertEqual(await subscription.get(0.01), [])
+
+            subscription.close()
+            self.assertEqual(self._hub._subscriptions, {})
+
+        self._loop.run_until_complete(_test())
+
+    def testOverflow(self):
+        """测试积压的事件过多
+        """
+        subscription = self._hub.subscribe(
+            [(FlowEventHub.CHANNEL_FLOW_TEMPLATE, 5)], max_pending=1)
+
+        async def _test():
+            self._hub.dispatch([_event(1, 1, 5, 3), _event(2, 2, 5, 3)])
+            self.assertEqual(await subscription.get(1), [])
+            self.assertTrue(subscription.overflowed)
+            subscription.close()
+
+        self._loop.run_until_complete(_test())
+
+    def testOutOfOrderCommit(self):
+        """测试ID较小的事件晚于ID较大的事件提交
+        """
+        committed = []
+
+        class _DAO:
+
+            def query_max_id(self):
+                return 0
+
+            def query_after(self, last_id, limit):
+                return [event for event in committed if event.id > last_id]
+
+            def query_by_id_list(self, id_list):
+                return [event for event in committed if event.id in id_list]
+
+            def delete_before(self, created_on):
+                pass
+
+        received = []
+        self._hub._dao = _DAO()
+        self._hub.dispatch = received.extend
+        self._hub._last_purge_time = datetime.datetime.now()
+        self._hub.poll()
+
+        # 事件2先于事件1提交，事件1在下一次同步时被补上
+        committed.append(_event(2, 1, 5, 3))
+        self._hub.poll()
+        self.assertEqual([event.id for event in received], [2])
+        self.assertEqual(list(self._hub._gaps), [1])
+
+        committed.insert(0, _event(1, 1, 5, 3))
+        self._hub.poll()
+        self.assertEqual([event.id for event in received], [2, 1])
+        self.assertEqual(list(self._hub._gaps), [])
+
+        # 一直没有出现的ID在超时之后不再跟踪
+        committed.append(_event(4, 1, 5, 3))
+        self._hub.poll()
+        self.assertEqual(list(self._hub._gaps), [3])
+        self._hub._gaps[3] -= FlowEventHub.GAP_TIMEOUT + 1
+        self._hub.poll()
+        self.assertEqual(list(self._hub._gaps), [])
+        self.assertEqual([event.id for event in received], [2, 1, 4])
+
+    def testPurgeWithLock(self):
+        """测试其它进程正在清理时跳过本次清理
+        """
+        purged = []
+        self._hub._dao.delete_before = purged.append
+
+        # 模拟另一个节点持有清理锁
+        other_node = LockManager(self._("db")._connect)
+        self.assertTrue(other_node.acquire(FlowEventHub.PURGE_LOCK, 0))
+        try:
+            self._hub._purge()
+            self.assertEqual(purged, [])
+        finally:
+            other_node.release(FlowEventHub.PURGE_LOCK)
+            other_node.close()
+
+        self._hub._last_purge_time = None
+        self._hub._purge()
+        self.assertEqual(len(purged), 1)
+
+        # 一小时之内不会再次清理
+        self._hub._purge()
+        self.assertEqual(len(purged), 1)
+
+    def tearDown(self):
+        self._loop.close()
@@ -1,8 +1,15 @@
+import time
 from acolyte.testing import EasemobFlowTestCase
+from acolyte.core.flow import FlowStatus, FlowEventType
+from acolyte.core.job import ActionStatus
+from acolyte.core.service import Result
 from acolyte.core.storage.flow_template import FlowTemplateDAO
 from acolyte.core.storage.flow_instance import FlowInstanceDAO
+from acolyte.core.storage.flow_instance_counter import FlowInstanceCounterDAO
 from acolyte.core.storage.job_instance import JobInstanceDAO
 from acolyte.core.storage.job_action_data import JobActionDataDAO
+from acolyte.core.storage.flow_execution_state import FlowExecutionStateDAO
+from acolyte.core.storage.flow_event import FlowEventDAO
 
 
 class FlowExecutorServiceTestCase(EasemobFlowTestCase):
@@ -13,8 +20,10 @@ class FlowExecutorServiceTestCase(EasemobFlowTestCase):
         self._flow_service = self._("FlowService")
         self._flow_tpl_dao = FlowTemplateDAO(self._db)
         self._flow_instance_dao = FlowInstanceDAO(self._db)
+        self._flow_instance_counter_dao = FlowInstanceCounterDAO(self._db)
         self._job_instance_dao = JobInstanceDAO(self._db)
         self._job_action_data_dao = JobActionDataDAO(self._db)
+        self._flow_event_dao = FlowEventDAO(self._db)
 
         self._flow_tpl_id_collector = []
         self._flow_instance_id_collector = []
@@ -96,6 +105,85 @@ class FlowExecutorServiceTestCase(EasemobFlowTestCase):
         )
         self.assertResultBadRequest(rs, "too_many_instance")
 
+    def testStartFlows(self):
+        """测试批量启动flow实例
+        """
+
+        # 超出max_run_instance，一个实例也不会创建
+        rs = self._flow_exec.start_flows(
+            flow_template_id=self._tpl_id,
+            initiator=1,
+            flows=[
+                {"description": "batch 1", "start_flow_args": {"x": 1}},
+                {"description": "batch 2", "start_flow_args": {"x": 2}},
+            ]
+        )
+        self.assertResultBadRequest(rs, "too_many_instance")
+
+        rs = self._flow_service.create_flow_template(
+            flow_meta_name="test_flow",
+            name="sam_batch_start_test",
+            bind_args={},
+            max_run_instance=3,
+            creator=1
+        )
+        self.assertResultSuccess(rs)
+        tpl_id = rs.data.id
+        self._flow_tpl_id_collector.append(tpl_id)
+
+        # 其中一个实例的参数不合法
+        rs = self._flow_exec.start_flows(
+            flow_template_id=tpl_id,
+            initiator=1,
+            flows=[
+                {"description": "batch 1", "start_flow_args": {"x": 1}},
+                {"description": "batch 2", "start_flow_args": {"x": "a"}},
+            ]
+        )
+        self.assertResultBadRequest(rs, "flows.1.start.x_invalid_type")
+
+        rs = self._flow_exec.start_flows(
+            flow_template_id=tpl_id,
+            initiator=1,
+            flows=[{"description": "batch"}]
+        )
+        self.assertResultSuccess(rs)
+        self._flow_instance_id_collector.append(rs.data[0].data.id)
+
+        rs = self._flow_exec.start_flows(
+            flow_template_id=tpl_id,
+            initiator=1,
+            flows=[
+                {"description": "batch {}".format(i),
+                 "start_flow_args": {"x": i}}
+                for i in range(2)
+            ]
+        )
+        self.assertResultSuccess(rs)
+        self.assertEqual(len(rs.data), 2)
+        for idx, item in enumerate(rs.data):
+            self.assertResultSuccess(item)
+            self._flow_instance_id_collector.append(item.data.id)
+            flow_instance = self._flow_instance_dao.query_by_instance_id(
+                item.data.id)
+            self.assertEqual(flow_instance.description, "batch {}".format(idx))
+            self.assertEqual(flow_instance.status, FlowStatus.STATUS_RUNNING)
+
+        rs = self._flow_exec.start_flows(
+            flow_template_id=tpl_id,
+            initiator=1,
+            flows=[{"description": "batch"}]
+        )
+        self.assertResultBadRequest(rs, "too_many_instance")
+
+        # 缺少description
+        rs = self._flow_exec.start_flows(
+            flow_template_id=tpl_id,
+            initiator=1,
+            flows=[{"start_flow_args": {}}]
+        )
+        self.assertResultBadRequest(rs, "flows.0.description_empty")
+
     def testHandleJobActions(self):
         """测试Job Action的处理流程
         """
@@ -404,13 +492,314 @@ class FlowExecutorServiceTestCase(EasemobFlowTestCase):
         )
         self.assertResultBadRequest(rs, "invalid_status")
 
+        # flow终止之后释放了名额，可以再次启动
+        rs = self._flow_exec.start_flow(
+            flow_template_id=self._tpl_id,
+            initiator=1,
+            description="测试flow instance",
+            start_flow_args={"x": 5, "y": 6}
+        )
+        self.assertResultSuccess(rs)
+        self._flow_instance_id_collector.append(rs.data.id)
+
+    def testConcurrentModification(self):
+        """测试基于版本号的并发控制
+        """
+        rs = self._flow_exec.start_flow(
+            flow_template_id=self._tpl_id,
+            initiator=1,
+            description="测试flow instance",
+            start_flow_args={"x": 5, "y": 6}
+        )
+        self.assertResultSuccess(rs)
+        flow_instance_id = rs.data.id
+        self._flow_instance_id_collector.append(flow_instance_id)
+
+        # 模拟一个与其它请求并发、在对方提交之前加载了状态的请求
+        stale_state = FlowExecutionStateDAO(self._db).query_state(
+            flow_instance_id, 1)
+
+        rs = self._flow_exec.handle_job_action(
+            flow_instance_id=flow_instance_id,
+            target_step="echo",
+            target_action="trigger",
+            actor=1,
+            action_args={}
+        )
+        self.assertResultSuccess(rs)
+
+        rs = self._flow_exec._handle_job_action_in_batch(
+            flow_instance_id, "echo", "trigger", 1, {}, stale_state, None)
+        self.assertEqual(rs.status_code, Result.STATUS_CONFLICT)
+        self.assertEqual(rs.reason, "concurrent_modification")
+
+        # 冲突的请求没有留下任何记录
+        job_instances = self._job_instance_dao.query_by_flow_instance_id(
+            flow_instance_id)
+        self.assertEqual(len(job_instances), 1)
+        flow_instance = self._flow_instance_dao.query_by_instance_id(
+            flow_instance_id)
+        self.assertEqual(
+            flow_instance.version, stale_state.flow_instance.version + 1)
+
+    def testParallelFlow(self):
+        """测试包含并行分支的flow
+        """
+        rs = self._flow_service.create_flow_template(
+            flow_meta_name="test_parallel_flow",
+            name="sam_parallel_test",
+            bind_args={},
+            max_run_instance=0,
+            creator=1
+        )
+        self.assertResultSuccess(rs)
+        self._flow_tpl_id_collector.append(rs.data.id)
+
+        rs = self._flow_exec.start_flow(
+            flow_template_id=rs.data.id,
+            initiator=1,
+            description="parallel flow",
+            start_flow_args={}
+        )
+        self.assertResultSuccess(rs)
+        flow_instance_id = rs.data.id
+        self._flow_instance_id_collector.append(flow_instance_id)
+
+        def _trigger(step):
+            return self._flow_exec.handle_job_action(
+                flow_instance_id=flow_instance_id,
+                target_step=step,
+                target_action="trigger",
+                actor=1,
+                action_args={"x": 1, "y": 2}
+            )
+
+        # job_B、job_C都依赖job_A
+        self.assertResultBadRequest(_trigger("job_B"), "invalid_target_step")
+        self.assertResultSuccess(_trigger("job_A"))
+
+        # job_B完成后，job_D依旧需要等待job_C
+        self.assertResultSuccess(_trigger("job_B"))
+        rs = _trigger("job_D")
+        self.assertResultBadRequest(rs, "invalid_target_step")
+
+        self.assertResultSuccess(_trigger("job_C"))
+        flow_instance = self._flow_instance_dao.query_by_instance_id(
+            flow_instance_id)
+        self.assertEqual(flow_instance.current_steps, {"job_B", "job_C"})
+
+        # 汇合之后整个flow完成
+        self.assertResultSuccess(_trigger("job_D"))
+        flow_instance = self._flow_instance_dao.query_by_instance_id(
+            flow_instance_id)
+        self.assertEqual(flow_instance.current_step, "job_D")
+        self.assertEqual(flow_instance.status, FlowStatus.STATUS_FINISHED)
+
+    def testHandleJobActionBatch(self):
+        """测试对多个flow instance批量执行action
+        """
+        rs = self._flow_service.create_flow_template(
+            flow_meta_name="test_parallel_flow",
+            name="sam_batch_test",
+            bind_args={},
+            max_run_instance=0,
+            creator=1
+        )
+        self.assertResultSuccess(rs)
+        self._flow_tpl_id_collector.append(rs.data.id)
+        tpl_id = rs.data.id
+
+        flow_instance_ids = []
+        for _ in range(3):
+            rs = self._flow_exec.start_flow(
+                flow_template_id=tpl_id,
+                initiator=1,
+                description="batch flow",
+                start_flow_args={}
+            )
+            self.assertResultSuccess(rs)
+            flow_instance_ids.append(rs.data.id)
+        self._flow_instance_id_collector.extend(flow_instance_ids)
+
+        def _batch_trigger(id_list, step):
+            return self._flow_exec.handle_job_action_batch(
+                flow_instance_ids=id_list,
+                target_step=step,
+                target_action="trigger",
+                actor=1,
+                action_args={"x": 1, "y": 2}
+            )
+
+        # 不存在的实例不影响其它实例的执行
+        rs = _batch_trigger(flow_instance_ids + [100086], "job_A")
+        self.assertResultSuccess(rs)
+        self.assertEqual(
+            [item["flow_instance_id"] for item in rs.data],
+            flow_instance_ids + [100086])
+        for item in rs.data[:3]:
+            self.assertResultSuccess(item["result"])
+        self.assertResultBadRequest(
+            rs.data[3]["result"], "invalid_flow_instance")
+
+        # 重复执行
+        rs = _batch_trigger(flow_instance_ids, "job_A")
+        for item in rs.data:
+            self.assertEqual(
+                item["result"].status_code, Result.STATUS_BADREQUEST)
+
+        for flow_instance_id in flow_instance_ids:
+            flow_instance = self._flow_instance_dao.query_by_instance_id(
+                flow_instance_id)
+            self.assertEqual(flow_instance.current_step, "job_A")
+
+        # 空列表
+        rs = _batch_trigger([], "job_B")
+        self.assertResultBadRequest(
+            rs, "flow_instance_ids_less_than_min_length")
+
+    def testBackgroundAction(self):
+        """测试在后台执行的action
+        """
+        rs = self._flow_service.create_flow_template(
+            flow_meta_name="test_background_flow",
+            name="sam_background_test",
+            bind_args={},
+            max_run_instance=0,
+            creator=1
+        )
+        self.assertResultSuccess(rs)
+        self._flow_tpl_id_collector.append(rs.data.id)
+        tpl_id = rs.data.id
+
+        def _start_and_trigger(seconds):
+            rs = self._flow_exec.start_flow(
+                flow_template_id=tpl_id,
+                initiator=1,
+                description="background flow",
+                start_flow_args={}
+            )
+            self.assertResultSuccess(rs)
+            flow_instance_id = rs.data.id
+            self._flow_instance_id_collector.append(flow_instance_id)
+            rs = self._flow_exec.handle_job_action(
+                flow_instance_id=flow_instance_id,
+                target_step="sleepy",
+                target_action="trigger",
+                actor=1,
+                action_args={"seconds": seconds}
+            )
+            return flow_instance_id, rs
+
+        def _wait_action(action_id):
+            job_service = self._("JobService")
+            for _ in range(50):
+                rs = job_service.get_action_status(action_id)
+                self.assertResultSuccess(rs)
+                if rs.data.status != ActionStatus.STATUS_RUNNING:
+                    return rs.data
+                time.sleep(0.1)
+            self.fail("action {} is still running".format(action_id))
+
+        # 请求立即返回running状态
+        flow_instance_id, rs = _start_and_trigger(1)
+        self.assertResultSuccess(rs)
+        self.assertEqual(rs.data["status"], ActionStatus.STATUS_RUNNING)
+
+        # 后台执行完毕后整个flow完成
+        action = _wait_action(rs.data["action_id"])
+        self.assertEqual(action.status, ActionStatus.STATUS_FINISHED)
+        flow_instance = self._flow_instance_dao.query_by_instance_id(
+            flow_instance_id)
+        self.assertEqual(flow_instance.status, FlowStatus.STATUS_FINISHED)
+
+        # 出现异常的情况，允许重来
+        flow_instance_id, rs = _start_and_trigger(-1)
+        action = _wait_action(rs.data["action_id"])
+        self.assertEqual(action.status, ActionStatus.STATUS_EXCEPTION)
+        self.assertIn("ValueError", action.data["error"])
+
+        rs = self._flow_exec.handle_job_action(
+            flow_instance_id=flow_instance_id,
+            target_step="sleepy",
+            target_action="trigger",
+            actor=1,
+            action_args={"seconds": 0}
+        )
+        action = _wait_action(rs.data["action_id"])
+        self.assertEqual(action.status, ActionStatus.STATUS_FINISHED)
+
+        # 不存在的action
+        rs = self._("JobService").get_action_status(100086)
+        self.assertResultBadRequest(rs, "action_not_found")
+
+    def testFlowEvents(self):
+        """测试状态变更时记录事件
+        """
+        last_id = self._flow_event_dao.query_max_id()
+        rs = self._flow_exec.start_flow(
+            flow_template_id=self._tpl_id,
+            initiator=1,
+            description="测试flow instance",
+            start_flow_args={"x": 5, "y": 6}
+        )
+        self.assertResultSuccess(rs)
+        flow_instance = rs.data
+        self._flow_instance_id_collector.append(flow_instance.id)
+
+        rs = self._flow_exec.handle_job_action(
+            flow_instance_id=flow_instance.id,
+            target_step="echo",
+            target_action="trigger",
+            actor=1,
+            action_args={}
+        )
+        self.assertResultSuccess(rs)
+
+        # 执行失败的action不会留下事件
+        rs = self._flow_exec.handle_job_action(
+            flow_instance_id=flow_instance.id,
+            target_step="old_man",
+            target_action="trigger",
+            actor=1,
+            action_args={}
+        )
+        self.assertResultBadRequest(rs, "invalid_target_step")
+
+        events = [
+            event for event in self._flow_event_dao.query_after(last_id)
+            if event.flow_instance_id == flow_instance.id]
+        self.assertEqual(
+            [(event.event_type, event.step) for event in events],
+            [(FlowEventType.FLOW_START, ""),
+             (FlowEventType.STEP_TRIGGER, "echo")])
+        self.assertEqual(events[0].flow_template_id, self._tpl_id)
+        self.assertEqual(events[0].initiator, 1)
+
+        # hub从数据库同步事件并分发给订阅者
+        hub = self._("flow_event_hub")
+        hub._last_id = last_id
+        received = []
+        hub.dispatch = received.extend
+        hub.poll()
+        self.assertEqual(
+            [event.id for event in received
+             if event.flow_instance_id == flow_instance.id],
+            [event.id for event in events])
+        del hub.dispatch
+        hub._last_id = None
+        hub._gaps.clear()
+
     def tearDown(self):
         # 各种清数据
         if self._flow_tpl_id_collector:
             self._flow_tpl_dao.delete_by_id(self._flow_tpl_id_collector)
+            self._flow_instance_counter_dao.delete_by_template_id(
+                self._flow_tpl_id_collector)
         if self._flow_instance_id_collector:
             self._flow_instance_dao.delete_by_instance_id(
                 self._flow_instance_id_collector)
+            self._flow_event_dao.delete_by_flow_instance_id(
+                self._flow_instance_id_collector)
             for flow_instance_id in self._flow_instance_id_collector:
                 job_instance_lst = self._job_instance_dao.\
                     query_by_flow_instance_id(flow_instance_id)
@@ -0,0 +1,54 @@
+import simplejson
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.testing.core.mgr_define import (
+    TestFlowMeta,
+    TestParallelFlowMeta,
+    job_mgr
+)
+from acolyte.core.mgr import DictBasedManager
+from acolyte.core.service import Result, PreparedResult
+from acolyte.core.flow_meta_catalog import FlowMetaCatalog
+
+
+class FlowMetaCatalogTestCase(EasemobFlowTestCase):
+
+    def setUp(self):
+        # 使用独立的manager，避免影响其它用例
+        self._flow_meta_mgr = DictBasedManager()
+        self._flow_meta_mgr.register("test_flow", TestFlowMeta())
+        self._catalog = FlowMetaCatalog(self._flow_meta_mgr, job_mgr)
+
+    def testGet(self):
+        """测试从目录中获取预先构建好的结果
+        """
+        rs = self._catalog.get("test_flow")
+        self.assertIsInstance(rs, PreparedResult)
+        self.assertEqual(rs.status_code, Result.STATUS_SUCCESS)
+        self.assertEqual(rs.data.name, "test_flow")
+
+        # 包含job参数声明
+        echo = [job for job in rs.data.jobs if job.step_name == "echo"][0]
+        self.assertTrue(echo.job_args)
+
+        body = simplejson.loads(rs.body.decode("utf-8"))
+        self.assertEqual(body["data"]["name"], "test_flow")
+
+        # 没有变化时返回同一个对象
+        self.assertIs(self._catalog.get("test_flow"), rs)
+        self.assertIsNone(self._catalog.get("heheda"))
+
+    def testRebuild(self):
+        """测试manager发生变化之后重建目录
+        """
+        all_rs = self._catalog.all()
+        self.assertEqual([view.name for view in all_rs.data], ["test_flow"])
+        self.assertIs(self._catalog.all(), all_rs)
+
+        self._flow_meta_mgr.register(
+            "test_parallel_flow", TestParallelFlowMeta())
+        new_all_rs = self._catalog.all()
+        self.assertEqual(
+            sorted(view.name for view in new_all_rs.data),
+            ["test_flow", "test_parallel_flow"])
+        self.assertNotEqual(new_all_rs.etag, all_rs.etag)
+        self.assertIsNotNone(self._catalog.get("test_parallel_flow"))
@@ -1,6 +1,7 @@
 from acolyte.core.service import Result
 from acolyte.testing import EasemobFlowTestCase
 from acolyte.core.storage.flow_template import FlowTemplateDAO
+from acolyte.core.storage.flow_instance import FlowInstanceDAO
 
 
 class FlowServiceTestCase(EasemobFlowTestCase):
@@ -9,7 +10,9 @@ class FlowServiceTestCase(EasemobFlowTestCase):
         self.flow_service = self._("FlowService")
         self.flow_meta_mgr = self._("flow_meta_manager")
         self.flow_tpl_dao = FlowTemplateDAO(self._("db"))
+        self.flow_instance_dao = FlowInstanceDAO(self._("db"))
         self._flow_tpl_collector = []
+        self._flow_instance_collector = []
 
     def test_get_all_flow_meta(self):
         """测试获取所有的flow meta对象信息
@@ -197,6 +200,103 @@ class FlowServiceTestCase(EasemobFlowTestCase):
         self.assertResultSuccess(rs)
         self.assertEqual(len(rs.data), 1)
 
+    def testGetFlowInstanceByPage(self):
+        """测试基于ID的分页查询flow instance
+        """
+        rs = self.flow_service.create_flow_template(
+            flow_meta_name="test_flow",
+            name="sam_test",
+            bind_args={
+                "echo": {
+                    "trigger": {
+                        "b": 2
+                    },
+                    "multiply": {
+                        "c": 3
+                    },
+                    "minus": {
+                        "d": 11,
+                        "e": 12
+                    }
+                }
+            },
+            max_run_instance=0,
+            creator=1
+        )
+        tpl_id = rs.data.id
+        self._flow_tpl_collector.append(tpl_id)
+
+        for i in range(5):
+            flow_instance = self.flow_instance_dao.insert(
+                tpl_id, 1, "instance {}".format(i))
+            self._flow_instance_collector.append(flow_instance.id)
+        self.flow_instance_dao.update_status(
+            self._flow_instance_collector[-1], "running")
+
+        # 正序翻页
+        rs = self.flow_service.get_flow_instance_by_template(
+            tpl_id, limit=2)
+        self.assertResultSuccess(rs)
+        self.assertEqual([fi.id for fi in rs.data.items],
+                         self._flow_instance_collector[:2])
+        self.assertEqual(rs.data.next_offset_id,
+                         self._flow_instance_collector[1])
+        self.assertEqual(rs.data.items[0].creator_info.id, 1)
+
+        rs = self.flow_service.get_flow_instance_by_template(
+            tpl_id, offset_id=rs.data.next_offset_id, limit=3)
+        self.assertEqual([fi.id for fi in rs.data.items],
+                         self._flow_instance_collector[2:])
+        self.assertEqual(rs.data.next_offset_id,
+                         self._flow_instance_collector[-1])
+
+        rs = self.flow_service.get_flow_instance_by_template(
+            tpl_id, offset_id=rs.data.next_offset_id, limit=3)
+        self.assertEqual(rs.data.items, [])
+        self.assertIsNone(rs.data.next_offset_id)
+
+        # 倒序翻页
+        rs = self.flow_service.get_flow_instance_by_template(
+            tpl_id, offset_id=self._flow_instance_collector[2],
+            limit=10, order="desc")
+        self.assertEqual([fi.id for fi in rs.data.items],
+                         self._flow_instance_collector[1::-1])
+        self.assertIsNone(rs.data.next_offset_id)
+
+        # 按状态过滤
+        rs = self.flow_service.get_flow_instance_by_template_and_status(
+            tpl_id, "running")
+        self.assertEqual([fi.id for fi in rs.data.items],
+                         self._flow_instance_collector[-1:])
+
+        rs = self.flow_service.get_flow_instance_by_status(
+            "init", offset_id=self._flow_instance_collector[0], limit=100)
+        self.assertEqual(
+            [fi.id for fi in rs.data.items
+             if fi.id in self._flow_instance_collector],
+            self._flow_instance_collector[1:4])
+
+        # 参数不合法
+        rs = self.flow_service.get_flow_instance_by_status("heheda")
+        self.assertResultBadRequest(rs, "status_invalid_format")
+        rs = self.flow_service.get_flow_instance_by_template(
+            tpl_id, limit=1000)
+        self.assertResultBadRequest(rs, "limit_more_than_max")
+        rs = self.flow_service.get_flow_instance_by_template(
+            tpl_id, order="random")
+        self.assertResultBadRequest(rs, "order_invalid_format")
+
+        # 获取单个flow instance
+        rs = self.flow_service.get_flow_instance(
+            self._flow_instance_collector[0])
+        self.assertResultSuccess(rs)
+        self.assertEqual(rs.data.flow_template_info.id, tpl_id)
+        self.assertEqual(rs.data.job_instances, [])
+        rs = self.flow_service.get_flow_instance(100086)
+        self.assertResultBadRequest(rs, "flow_instance_not_found")
+
     def tearDown(self):
+        for flow_instance_id in self._flow_instance_collector:
+            self.flow_instance_dao.delete_by_instance_id(flow_instance_id)
         if self._flow_tpl_collector:
             self.flow_tpl_dao.delete_by_id(self._flow_tpl_collector)
@@ -1,6 +1,8 @@
+import time
 from acolyte.core.job import (
     AbstractJob,
     JobArg,
+    background_action,
 )
 from acolyte.core.service import Result
 from acolyte.util.validate import IntField, StrField
@@ -83,6 +85,29 @@ class OldManJob(AbstractJob):
         return Result.bad_request("old_man_angry", msg="I'm angry!")
 
 
+class SleepyJob(AbstractJob):
+
+    """Mock Job 需要长时间运行的Job，trigger会在后台执行
+    """
+
+    def __init__(self):
+        super().__init__("sleepy", "sleepy job", job_args={
+            "trigger": [
+                JobArg("seconds", IntField("seconds", required=True),
+                       JobArg.MARK_AUTO, "睡眠时间"),
+            ]
+        })
+
+    @background_action
+    def on_trigger(self, context, seconds):
+        if seconds < 0:
+            raise ValueError("seconds must not be negative")
+        time.sleep(seconds)
+        context["slept"] = seconds
+        context.finish()
+        return Result.ok(data=seconds)
+
+
 def letter_job_meta(letter):
 
     class LetterJobMeta(type):
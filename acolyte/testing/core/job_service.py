@@ -0,0 +1,91 @@
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.core.storage.job_instance import JobInstanceDAO
+from acolyte.core.storage.job_action_data import JobActionDataDAO
+
+
+class JobServiceTestCase(EasemobFlowTestCase):
+
+    def setUp(self):
+        db = self._("db")
+        self._job_service = self._("JobService")
+        self._job_instance_dao = JobInstanceDAO(db)
+        self._job_action_data_dao = JobActionDataDAO(db)
+
+        # 直接构造一条flow instance的时间线
+        self._flow_instance_id = 100086
+        self._start = self._job_instance_dao.insert(
+            self._flow_instance_id, "start", 1)
+        self._echo = self._job_instance_dao.insert(
+            self._flow_instance_id, "echo", 1)
+        self._actions = [
+            self._job_action_data_dao.insert(
+                self._start.id, "trigger", 1, {}, {}),
+            self._job_action_data_dao.insert(
+                self._echo.id, "trigger", 1, {"b": 2}, {}),
+            self._job_action_data_dao.insert(
+                self._echo.id, "multiply", 1, {"c": 3}, {"result": 6}),
+            self._job_action_data_dao.insert(
+                self._echo.id, "minus", 1, {"d": 11}, {"result": -5}),
+        ]
+
+    def testGetJobInstanceListByFlowInstance(self):
+        """测试获取flow instance的job时间线
+        """
+        rs = self._job_service.get_job_instance_list_by_flow_instance(
+            self._flow_instance_id)
+        self.assertResultSuccess(rs)
+        self.assertEqual([ji.step_name for ji in rs.data], ["start", "echo"])
+        self.assertEqual([a.action for a in rs.data[1].actions],
+                         ["trigger", "multiply", "minus"])
+        # 默认不加载arguments和data
+        self.assertIsNone(rs.data[1].actions[1].data)
+        self.assertIsNone(rs.data[1].actions[1].arguments)
+
+        rs = self._job_service.get_job_instance_list_by_flow_instance(
+            self._flow_instance_id, with_data="true")
+        self.assertResultSuccess(rs)
+        self.assertEqual(rs.data[1].actions[1].data, {"result": 6})
+        self.assertEqual(rs.data[1].actions[1].arguments, {"c": 3})
+
+        rs = self._job_service.get_job_instance_list_by_flow_instance(
+            self._flow_instance_id, with_data="heheda")
+        self.assertResultBadRequest(rs, "with_data_invalid_type")
+
+        rs = self._job_service.get_job_instance_list_by_flow_instance(
+            100087)
+        self.assertResultSuccess(rs)
+        self.assertEqual(rs.data, [])
+
+    def testGetJobInstanceDetails(self):
+        """测试分页获取job instance详情
+        """
+        rs = self._job_service.get_job_instance_details(
+            self._echo.id, limit=2)
+        self.assertResultSuccess(rs)
+        self.assertEqual(rs.data.step_name, "echo")
+        self.assertEqual([a.action for a in rs.data.actions],
+                         ["trigger", "multiply"])
+        self.assertEqual(rs.data.actions[1].data, {"result": 6})
+        self.assertEqual(rs.data.next_offset_id, self._actions[2].id)
+
+        rs = self._job_service.get_job_instance_details(
+            self._echo.id, offset_id=rs.data.next_offset_id, limit=2,
+            with_data=False)
+        self.assertResultSuccess(rs)
+        self.assertEqual([a.action for a in rs.data.actions], ["minus"])
+        self.assertIsNone(rs.data.actions[0].data)
+        self.assertIsNone(rs.data.next_offset_id)
+
+        rs = self._job_service.get_job_instance_details(100086)
+        self.assertResultBadRequest(rs, "job_instance_not_found")
+
+        rs = self._job_service.get_job_instance_details(
+            self._echo.id, limit=1000)
+        self.assertResultBadRequest(rs, "limit_more_than_max")
+
+    def tearDown(self):
+        for job_instance in (self._start, self._echo):
+            self._job_action_data_dao.delete_by_job_instance_id(
+                job_instance.id)
+        self._job_instance_dao.delete_by_flow_instance_id(
+            self._flow_instance_id)
@@ -8,9 +8,10 @@ from acolyte.testing.core.job import (
     BJob,
     CJob,
     DJob,
+    SleepyJob,
 )
 from acolyte.core.mgr import DictBasedManager
-from acolyte.core.job import JobRef
+from acolyte.core.job import JobRef, ParallelRef
 from acolyte.core.flow import FlowMeta
 from acolyte.util.validate import (
     IntField,
@@ -69,18 +70,77 @@ class TestFlowMeta(FlowMeta):
     def on_finish(self, context):
         print("the whole workflow finished")
 
+
+class TestParallelFlowMeta(FlowMeta):
+
+    """job_B和job_C并行执行，job_D需要等待两者都完成
+    """
+
+    def __init__(self):
+        super().__init__(
+            name="test_parallel_flow",
+            description="just a test flow with parallel branches",
+            jobs=(
+                JobRef(step_name="job_A", job_name="job_A"),
+                ParallelRef(
+                    JobRef(step_name="job_B", job_name="job_B"),
+                    JobRef(step_name="job_C", job_name="job_C"),
+                ),
+                JobRef(step_name="job_D", job_name="job_D"),
+            )
+        )
+
+    def on_start(self, context):
+        print("start the parallel workflow")
+
+    def on_stop(self, context):
+        print("the parallel workflow stopped")
+
+    def on_finish(self, context):
+        print("the parallel workflow finished")
+
+
+class TestBackgroundFlowMeta(FlowMeta):
+
+    """只包含一个在后台执行的step
+    """
+
+    def __init__(self):
+        super().__init__(
+            name="test_background_flow",
+            description="just a test flow with background action",
+            jobs=(
+                JobRef(step_name="sleepy", job_name="sleepy"),
+            )
+        )
+
+    def on_start(self, context):
+        print("start the background workflow")
+
+    def on_stop(self, context):
+        print("the background workflow stopped")
+
+    def on_finish(self, context):
+        print("the background workflow finished")
+
 # 构建测试使用的容器
 
 
 flow_meta_mgr = DictBasedManager()
 test_flow_meta = TestFlowMeta()
 flow_meta_mgr.register(test_flow_meta.name, test_flow_meta)
+test_parallel_flow_meta = TestParallelFlowMeta()
+flow_meta_mgr.register(
+    test_parallel_flow_meta.name, test_parallel_flow_meta)
+test_background_flow_meta = TestBackgroundFlowMeta()
+flow_meta_mgr.register(
+    test_background_flow_meta.name, test_background_flow_meta)
 
 job_mgr = DictBasedManager()
 echo_job = EchoJob()
 job_mgr.register(echo_job.name, echo_job)
 old_man_job = OldManJob()
 job_mgr.register(old_man_job.name, old_man_job)
-for job_type in (AJob, BJob, CJob, DJob):
+for job_type in (AJob, BJob, CJob, DJob, SleepyJob):
     job = job_type()
     job_mgr.register(job.name, job)
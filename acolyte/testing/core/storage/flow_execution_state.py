@@ -0,0 +1,63 @@
+import datetime
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.core.job import JobStatus
+from acolyte.core.storage.flow_template import FlowTemplateDAO
+from acolyte.core.storage.flow_instance import FlowInstanceDAO
+from acolyte.core.storage.job_instance import JobInstanceDAO
+from acolyte.core.storage.job_action_data import JobActionDataDAO
+from acolyte.core.storage.flow_execution_state import FlowExecutionStateDAO
+
+
+class FlowExecutionStateDAOTestCase(EasemobFlowTestCase):
+
+    def setUp(self):
+        db = self._("db")
+        self._flow_tpl_dao = FlowTemplateDAO(db)
+        self._flow_instance_dao = FlowInstanceDAO(db)
+        self._job_instance_dao = JobInstanceDAO(db)
+        self._job_action_data_dao = JobActionDataDAO(db)
+        self._dao = FlowExecutionStateDAO(db)
+
+        self._tpl = self._flow_tpl_dao.insert_flow_template(
+            "test_flow", "state_test", {}, 0, 1,
+            datetime.datetime.now())
+        self._flow_instance = self._flow_instance_dao.insert(
+            self._tpl.id, 1, "test state")
+        self._job_instance = self._job_instance_dao.insert(
+            self._flow_instance.id, "job_A", 1)
+        self._job_action_data_dao.insert(
+            self._job_instance.id, "trigger", 1, {}, {})
+
+    def testQueryState(self):
+        """测试一次性加载执行状态
+        """
+        state = self._dao.query_state(self._flow_instance.id, 1)
+        self.assertEqual(state.flow_instance.id, self._flow_instance.id)
+        self.assertEqual(state.flow_template.id, self._tpl.id)
+        self.assertTrue(state.actor_existed)
+
+        job_instance = state.get_job_instance("job_A")
+        self.assertEqual(job_instance.id, self._job_instance.id)
+        self.assertEqual(job_instance.status, JobStatus.STATUS_RUNNING)
+        self.assertTrue(state.is_action_executed("job_A", "trigger"))
+        self.assertFalse(state.is_action_executed("job_A", "multiply"))
+        self.assertIsNone(state.get_job_instance("job_B"))
+
+        # 状态对象不可修改
+        with self.assertRaises(AttributeError):
+            state.flow_template = None
+
+        # 不存在的actor
+        state = self._dao.query_state(self._flow_instance.id, 100086)
+        self.assertFalse(state.actor_existed)
+
+        # 不存在的flow instance
+        self.assertIsNone(self._dao.query_state(0, 1))
+
+    def tearDown(self):
+        self._flow_tpl_dao.delete_by_id(self._tpl.id)
+        self._flow_instance_dao.delete_by_instance_id(self._flow_instance.id)
+        self._job_instance_dao.delete_by_flow_instance_id(
+            self._flow_instance.id)
+        self._job_action_data_dao.delete_by_job_instance_id(
+            self._job_instance.id)
@@ -0,0 +1,54 @@
+import datetime
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.core.flow import FlowStatus
+from acolyte.core.storage.flow_template import FlowTemplateDAO
+from acolyte.core.storage.flow_instance import FlowInstanceDAO
+from acolyte.core.storage.flow_instance_counter import FlowInstanceCounterDAO
+
+
+class FlowInstanceCounterDAOTestCase(EasemobFlowTestCase):
+
+    def setUp(self):
+        db = self._("db")
+        self._flow_tpl_dao = FlowTemplateDAO(db)
+        self._flow_instance_dao = FlowInstanceDAO(db)
+        self._dao = FlowInstanceCounterDAO(db)
+
+        self._tpl = self._flow_tpl_dao.insert_flow_template(
+            "test_flow", "counter_test", {}, 2, 1,
+            datetime.datetime.now())
+        self._flow_instance = self._flow_instance_dao.insert(
+            self._tpl.id, 1, "test counter")
+
+    def testAcquireAndRelease(self):
+        """测试名额的占用与释放
+        """
+
+        # 尚无计数时无法占用，需要先根据现有实例初始化
+        self.assertIsNone(self._dao.query_running_num(self._tpl.id))
+        self.assertFalse(self._dao.acquire(self._tpl.id, 1, 2))
+        self._dao.init_by_instances(self._tpl.id)
+        self.assertEqual(self._dao.query_running_num(self._tpl.id), 1)
+
+        # 重复初始化不会覆盖已有的计数
+        self.assertTrue(self._dao.acquire(self._tpl.id, 1, 2))
+        self._dao.init_by_instances(self._tpl.id)
+        self.assertEqual(self._dao.query_running_num(self._tpl.id), 2)
+        self.assertFalse(self._dao.acquire(self._tpl.id, 1, 2))
+
+        # 实例结束之后释放
+        self._flow_instance_dao.transfer_status(
+            self._flow_instance.id, FlowStatus.STATUS_INIT,
+            FlowStatus.STATUS_FINISHED)
+        self._dao.release_by_instance_id(self._flow_instance.id)
+        self.assertEqual(self._dao.query_running_num(self._tpl.id), 1)
+        self.assertTrue(self._dao.acquire(self._tpl.id, 1, 2))
+
+        # 不会减为负数
+        self._dao.release(self._tpl.id, 10)
+        self.assertEqual(self._dao.query_running_num(self._tpl.id), 0)
+
+    def tearDown(self):
+        self._flow_tpl_dao.delete_by_id(self._tpl.id)
+        self._flow_instance_dao.delete_by_instance_id(self._flow_instance.id)
+        self._dao.delete_by_template_id(self._tpl.id)
@@ -0,0 +1,89 @@
+import datetime
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.core.token_revocation import TokenRevocationList
+
+
+class TokenRevocationListTestCase(EasemobFlowTestCase):
+
+    def setUp(self):
+        db = self._("db")
+        # 模拟两个节点各自的黑名单
+        self._list_a = TokenRevocationList(db, poll_interval=0)
+        self._list_b = TokenRevocationList(db, poll_interval=0)
+        self._list_a.start()
+        self._list_b.start()
+
+    def testCrossNodeRevocation(self):
+        """测试吊销记录在节点之间同步
+        """
+        expires_on = datetime.datetime.now() + datetime.timedelta(hours=1)
+        self._list_a.revoke("a" * 32, 1, expires_on)
+        self.assertTrue(self._list_a.is_revoked("a" * 32))
+
+        # 同步之前节点B不知道
+        self.assertFalse(self._list_b.is_revoked("a" * 32))
+        self._list_b.poll()
+        self.assertTrue(self._list_b.is_revoked("a" * 32))
+
+        # 新启动的节点会加载尚未过期的记录
+        list_c = TokenRevocationList(self._("db"), poll_interval=0)
+        list_c.start()
+        self.assertTrue(list_c.is_revoked("a" * 32))
+
+    def testOutOfOrderCommit(self):
+        """测试ID较小的记录晚于ID较大的记录提交
+        """
+        expires_on = datetime.datetime.now() + datetime.timedelta(hours=1)
+        committed = []
+
+        class _DAO:
+
+            def query_after(self, last_id, limit):
+                return [row for row in committed if row["id"] > last_id]
+
+            def query_by_id_list(self, id_list):
+                return [row for row in committed if row["id"] in id_list]
+
+            def delete_before(self, expires_on):
+                pass
+
+        self._list_b._dao = _DAO()
+        self._list_b._last_id = 0
+        self._list_b._last_purge_time = datetime.datetime.now()
+
+        # 记录2先于记录1提交，记录1在下一次同步时被补上
+        committed.append({"id": 2, "token_id": "d" * 32,
+                          "expires_on": expires_on})
+        self._list_b.poll()
+        self.assertTrue(self._list_b.is_revoked("d" * 32))
+        self.assertFalse(self._list_b.is_revoked("c" * 32))
+        self.assertEqual(list(self._list_b._gaps), [1])
+
+        committed.insert(0, {"id": 1, "token_id": "c" * 32,
+                             "expires_on": expires_on})
+        self._list_b.poll()
+        self.assertTrue(self._list_b.is_revoked("c" * 32))
+        self.assertFalse(self._list_b._gaps)
+
+        # 一直没有出现的ID超时之后不再查询
+        committed.append({"id": 4, "token_id": "e" * 32,
+                          "expires_on": expires_on})
+        self._list_b.poll()
+        self.assertEqual(list(self._list_b._gaps), [3])
+        self._list_b._gaps[3] -= TokenRevocationList.GAP_TIMEOUT + 1
+        self._list_b.poll()
+        self.assertFalse(self._list_b._gaps)
+
+    def testPurgeExpired(self):
+        """测试清理已经过期的吊销记录
+        """
+        expires_on = datetime.datetime.now() - datetime.timedelta(seconds=1)
+        self._list_a.revoke("b" * 32, 1, expires_on)
+        self.assertTrue(self._list_a.is_revoked("b" * 32))
+        self._list_a.poll()
+        self.assertFalse(self._list_a.is_revoked("b" * 32))
+
+    def tearDown(self):
+        self._("db").execute(
+            "delete from token_revocation where token_id in (%s, %s, %s)",
+            ("a" * 32, "b" * 32, "c" * 32))
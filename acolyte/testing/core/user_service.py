@@ -17,10 +17,46 @@ class UserServiceTestCase(EasemobFlowTestCase):
         self.assertResultSuccess(rs)
         self.assertEqual(rs.data["id"], 1)
 
+        # 再次登录之后，上一次签发的token失效
+        last_token = rs.data["token"]
+        rs = self._user_service.login("chihz3800@163.com", "123456")
+        self.assertResultSuccess(rs)
+        self.assertResultBadRequest(
+            self._user_service.check_token(last_token), "invalid_token")
+        self.assertResultSuccess(
+            self._user_service.check_token(rs.data["token"]))
+
         # 账号密码不匹配
         rs = self._user_service.login("chihz3800@163.com", "654321")
         self.assertResultBadRequest(rs, "no_match")
 
+    def testStreamTicket(self):
+        """测试推送凭证的签发与校验
+        """
+        rs = self._user_service.login("chihz3800@163.com", "123456")
+        self.assertResultSuccess(rs)
+        token = rs.data["token"]
+
+        rs = self._user_service.issue_stream_ticket(token)
+        self.assertResultSuccess(rs)
+        ticket = rs.data["ticket"]
+        rs = self._user_service.check_stream_ticket(ticket)
+        self.assertResultSuccess(rs)
+        self.assertEqual(rs.data["id"], 1)
+
+        # 推送凭证与登录token不能互相替代
+        self.assertResultBadRequest(
+            self._user_service.check_token(ticket), "invalid_token")
+        self.assertResultBadRequest(
+            self._user_service.check_stream_ticket(token), "invalid_token")
+        self.assertResultBadRequest(
+            self._user_service.issue_stream_ticket(ticket), "invalid_token")
+
+        # 退出登录之后，已经签发的推送凭证同样失效
+        self._user_service.logout(token)
+        self.assertResultBadRequest(
+            self._user_service.check_stream_ticket(ticket), "invalid_token")
+
     def testAddUser(self):
         """测试添加用户操作的各种情况
         """
@@ -94,6 +130,10 @@ class UserServiceTestCase(EasemobFlowTestCase):
         rs = self._user_service.check_token("你们啊！naive！")
         self.assertResultBadRequest(rs, "invalid_token")
 
+        # 被篡改的token
+        rs = self._user_service.check_token(token[:-2] + "xx")
+        self.assertResultBadRequest(rs, "invalid_token")
+
     def testLogout(self):
         """测试退出接口
         """
@@ -0,0 +1,84 @@
+import datetime
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.core.view import FlowSimpleInstanceView, FlowInstanceDetailsView
+from acolyte.core.view_builder import FlowInstanceViewBuilder
+from acolyte.core.storage.flow_template import FlowTemplateDAO
+from acolyte.core.storage.flow_instance import FlowInstanceDAO
+from acolyte.core.storage.job_instance import JobInstanceDAO
+from acolyte.core.storage.job_action_data import JobActionDataDAO
+
+
+class FlowInstanceViewBuilderTestCase(EasemobFlowTestCase):
+
+    def setUp(self):
+        db = self._("db")
+        self._builder = FlowInstanceViewBuilder(
+            db, self._("entity_cache"), self._("flow_meta_manager"))
+        self._flow_tpl_dao = FlowTemplateDAO(db)
+        self._flow_instance_dao = FlowInstanceDAO(db)
+        self._job_instance_dao = JobInstanceDAO(db)
+        self._job_action_data_dao = JobActionDataDAO(db)
+
+        self._flow_tpl = self._flow_tpl_dao.insert_flow_template(
+            "test_flow", "view_builder_test", "{}", 0, 1,
+            datetime.datetime.now())
+        self._flow_instances = [
+            self._flow_instance_dao.insert(
+                self._flow_tpl.id, 1, "instance {}".format(i))
+            for i in range(3)
+        ]
+        self._job_instances = []
+
+    def testBuild(self):
+        """测试批量构建flow instance视图
+        """
+        views = self._builder.build(self._flow_instances)
+        self.assertEqual(len(views), 3)
+        for fi, view in zip(self._flow_instances, views):
+            self.assertIsInstance(view, FlowSimpleInstanceView)
+            self.assertEqual(view.id, fi.id)
+            self.assertEqual(view.flow_template_info.id, self._flow_tpl.id)
+            self.assertEqual(view.flow_template_info.flow_meta_name,
+                             "test_flow")
+            self.assertEqual(view.creator_info.id, 1)
+
+        self.assertEqual(self._builder.build([]), [])
+
+    def testBuildWithJobs(self):
+        """测试构建包含job数据的详情视图
+        """
+        first, second, _ = self._flow_instances
+        start = self._job_instance_dao.insert(first.id, "start", 1)
+        echo = self._job_instance_dao.insert(first.id, "echo", 1)
+        self._job_instances.extend((start, echo))
+        self._job_action_data_dao.insert(
+            start.id, "trigger", 1, {}, {"a": 1})
+        self._job_action_data_dao.insert(
+            echo.id, "trigger", 1, {"b": 2}, {})
+        self._job_action_data_dao.insert(
+            echo.id, "multiply", 1, {"c": 3}, {"result": 6})
+
+        views = self._builder.build(
+            [first, second], with_jobs=True)
+        self.assertEqual(len(views), 2)
+        self.assertIsInstance(views[0], FlowInstanceDetailsView)
+
+        job_views = views[0].job_instances
+        self.assertEqual([jv.step_name for jv in job_views],
+                         ["start", "echo"])
+        self.assertEqual([a.action for a in job_views[0].actions],
+                         ["trigger"])
+        self.assertEqual([a.action for a in job_views[1].actions],
+                         ["trigger", "multiply"])
+        self.assertEqual(job_views[1].actions[1].data, {"result": 6})
+
+        self.assertEqual(views[1].job_instances, [])
+
+    def tearDown(self):
+        for job_instance in self._job_instances:
+            self._job_action_data_dao.delete_by_job_instance_id(
+                job_instance.id)
+        for fi in self._flow_instances:
+            self._job_instance_dao.delete_by_flow_instance_id(fi.id)
+            self._flow_instance_dao.delete_by_instance_id(fi.id)
+        self._flow_tpl_dao.delete_by_id(self._flow_tpl.id)
@@ -0,0 +1,33 @@
+import time
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.util.cache import LRUCache
+
+
+class LRUCacheTestCase(EasemobFlowTestCase):
+
+    def testLRU(self):
+        """测试超出容量时淘汰最久未被访问的条目
+        """
+        cache = LRUCache(max_size=2, ttl=0)
+        cache.put(1, "a")
+        cache.put(2, "b")
+        self.assertEqual(cache.get(1), "a")
+
+        # 2最久未被访问，被淘汰
+        cache.put(3, "c")
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get_many([1, 2, 3]), {1: "a", 3: "c"})
+        self.assertEqual(len(cache), 2)
+
+        cache.invalidate(1)
+        self.assertIsNone(cache.get(1))
+
+    def testTTL(self):
+        """测试条目过期
+        """
+        cache = LRUCache(max_size=10, ttl=0.1)
+        cache.put_many({1: "a", 2: "b"})
+        self.assertEqual(cache.get(1), "a")
+        time.sleep(0.2)
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.get_many([1, 2]), {})
@@ -0,0 +1,38 @@
+import threading
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.util.concurrent import BoundedExecutor, ExecutorFullException
+
+
+class BoundedExecutorTestCase(EasemobFlowTestCase):
+
+    def setUp(self):
+        self._executor = BoundedExecutor(max_workers=1, max_queue=1)
+
+    def testReject(self):
+        """测试任务数目达到上限时拒绝新的任务
+        """
+        event = threading.Event()
+        f1 = self._executor.submit(event.wait)
+        f2 = self._executor.submit(lambda: 1 + 1)
+        self.assertTrue(self._executor.is_full())
+
+        with self.assertRaises(ExecutorFullException):
+            self._executor.submit(lambda: 1 + 1)
+
+        # 任务完成之后可以继续提交
+        event.set()
+        f1.result()
+        self.assertEqual(f2.result(), 2)
+        self.assertEqual(self._executor.submit(lambda: 3).result(), 3)
+
+    def testShutdownTimeout(self):
+        """测试等待任务完成时的超时
+        """
+        event = threading.Event()
+        self._executor.submit(event.wait)
+        self.assertFalse(self._executor.shutdown(wait=True, timeout=0.1))
+        event.set()
+        self.assertTrue(self._executor.shutdown(wait=True, timeout=1))
+
+    def tearDown(self):
+        self._executor.shutdown()
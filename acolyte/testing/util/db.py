@@ -1,7 +1,19 @@
 import time
 import threading
 from acolyte.testing import EasemobFlowTestCase
-from acolyte.util.db import ConnectionPool
+from acolyte.util.db import (
+    ConnectionPool,
+    ConnectionPoolTimeoutException
+)
+
+_connect_config = {
+    "host": "localhost",
+    "port": 3306,
+    "user": "root",
+    "password": "",
+    "db": "easemob_flow",
+    "charset": "utf8"
+}
 
 
 class DBPoolTestCase(EasemobFlowTestCase):
@@ -48,7 +60,6 @@ class DBPoolTestCase(EasemobFlowTestCase):
         def _fight_for_lock(sleep_time):
             """锁争夺
             """
-            nonlocal pool
             nonlocal count
             with pool.lock("nidaye"):
                 print("Thread '{thread_name}' get the lock!".format(
@@ -68,3 +79,67 @@ class DBPoolTestCase(EasemobFlowTestCase):
         with cdt:
             while count < 5:
                 cdt.wait()
+
+    def testElasticPool(self):
+        """测试连接的按需创建、归还以及获取超时
+        """
+        pool = ConnectionPool(_connect_config, max_pool_size=2,
+                              checkout_timeout=0.5, keepalive_interval=0)
+
+        # 连接按需创建
+        self.assertEqual(pool.size, 0)
+
+        # 出现异常时连接依然会被归还
+        with self.assertRaises(ValueError):
+            with pool.connection():
+                raise ValueError("oops")
+        self.assertEqual(pool.size, 1)
+        self.assertEqual(pool.idle_size, 1)
+
+        # 所有连接都被占用时，等待超时后抛出异常
+        with pool.connection(), pool.connection():
+            self.assertEqual(pool.size, 2)
+            with self.assertRaises(ConnectionPoolTimeoutException):
+                with pool.connection():
+                    pass
+
+        self.assertEqual(pool.idle_size, 2)
+        pool.close_all()
+        self.assertEqual(pool.size, 0)
+
+    def testTransaction(self):
+        """测试事务的提交、回滚以及嵌套加入
+        """
+        pool = ConnectionPool(_connect_config, max_pool_size=2,
+                              keepalive_interval=0)
+        insert_sql = (
+            "insert into flow_context (flow_instance_id, k, v) "
+            "values (%s, %s, %s)"
+        )
+        query_sql = (
+            "select v from flow_context where "
+            "flow_instance_id = %s and k = %s"
+        )
+
+        try:
+            # 出现异常，整个事务回滚
+            with self.assertRaises(ValueError):
+                with pool.transaction():
+                    pool.execute(insert_sql, (100087, "a", "1"))
+                    raise ValueError("oops")
+            self.assertIsNone(pool.query_one_field(query_sql, (100087, "a")))
+
+            # 嵌套的事务加入外层事务，始终只使用一个连接
+            with pool.transaction() as conn:
+                pool.execute(insert_sql, (100087, "a", "1"))
+                with pool.transaction() as inner_conn:
+                    self.assertIs(conn, inner_conn)
+                    pool.execute(insert_sql, (100087, "b", "2"))
+                self.assertEqual(pool.size, 1)
+            self.assertEqual(
+                pool.query_one_field(query_sql, (100087, "b")), "2")
+        finally:
+            pool.execute(
+                "delete from flow_context where flow_instance_id = %s",
+                (100087,))
+            pool.close_all()
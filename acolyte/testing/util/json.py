@@ -0,0 +1,64 @@
+import datetime
+import simplejson
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.util.json import to_json, to_json_bytes
+from acolyte.core.service import Result
+from acolyte.core.view import UserSimpleView, FlowTemplateSimpleView
+
+
+class _Point:
+
+    def __init__(self, x, y=None):
+        self.x = x
+        if y is not None:
+            self.y = y
+
+
+class _Custom:
+
+    def _to_dict(self):
+        return {"custom": True}
+
+
+class JsonTestCase(EasemobFlowTestCase):
+
+    def testToJsonBytes(self):
+        """测试序列化视图对象
+        """
+        now = datetime.datetime(2017, 3, 8, 12, 30, 5, 123)
+        rs = Result.ok(data={
+            "user": UserSimpleView(1, "sam@example.com", "山姆"),
+            "template": FlowTemplateSimpleView(2, "test_flow", "tpl"),
+            "time": now,
+        })
+        data = to_json_bytes(rs)
+        self.assertIsInstance(data, bytes)
+        self.assertEqual(data.decode("utf-8"), to_json(rs))
+        self.assertEqual(simplejson.loads(data.decode("utf-8")), {
+            "status_code": 200,
+            "reason": None,
+            "msg": None,
+            "data": {
+                "user": {"id": 1, "email": "sam@example.com", "name": "山姆"},
+                "template": {"id": 2, "flow_meta_name": "test_flow",
+                             "name": "tpl"},
+                "time": "2017-03-08 12:30:05",
+            }
+        })
+
+    def testAttributesChanged(self):
+        """测试同一类型的实例属性不一致以及属性类型发生变化
+        """
+        now = datetime.datetime(2017, 3, 8, 12, 30, 5)
+        points = [_Point(now, 1), _Point(None, 2), _Point(3), _Point(now)]
+        self.assertEqual(simplejson.loads(to_json_bytes(points)), [
+            {"x": "2017-03-08 12:30:05", "y": 1},
+            {"x": None, "y": 2},
+            {"x": 3},
+            {"x": "2017-03-08 12:30:05"},
+        ])
+
+    def testToDict(self):
+        """测试自定义的_to_dict方法
+        """
+        self.assertEqual(to_json(_Custom()), '{"custom": true}')
@@ -0,0 +1,113 @@
+import threading
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.util.lock import (
+    LockManager,
+    LockTimeoutException,
+    LockNotHeldException
+)
+
+
+class LockManagerTestCase(EasemobFlowTestCase):
+
+    def setUp(self):
+        pool = self._("db")
+        # 模拟两个节点
+        self._mgr_a = LockManager(pool._connect, default_timeout=1)
+        self._mgr_b = LockManager(pool._connect, default_timeout=1)
+
+    def _acquire_in_thread(self, mgr, lock_key, timeout):
+        result = []
+        t = threading.Thread(
+            target=lambda: result.append(mgr.acquire(lock_key, timeout)))
+        t.start()
+        t.join()
+        return result[0]
+
+    def _try_lock_in_thread(self, mgr, lock_key):
+        """在其它线程中尝试获取并立即释放
+        """
+        result = []
+
+        def _try_lock():
+            result.append(mgr.acquire(lock_key, 0))
+            if result[0]:
+                mgr.release(lock_key)
+
+        t = threading.Thread(target=_try_lock)
+        t.start()
+        t.join()
+        return result[0]
+
+    def testTryLock(self):
+        """测试进程内以及跨进程的非阻塞获取
+        """
+        self.assertTrue(self._mgr_a.acquire("acolyte_test_lock", 0))
+
+        # 同一个线程可以重入
+        self.assertTrue(self._mgr_a.acquire("acolyte_test_lock", 0))
+        self.assertTrue(self._mgr_a.is_held("acolyte_test_lock"))
+
+        # 进程内其它线程
+        self.assertFalse(
+            self._acquire_in_thread(self._mgr_a, "acolyte_test_lock", 0))
+        # 其它节点
+        self.assertFalse(self._mgr_b.acquire("acolyte_test_lock", 0.2))
+
+        self._mgr_a.release("acolyte_test_lock")
+        self.assertFalse(self._mgr_b.acquire("acolyte_test_lock", 0))
+        self._mgr_a.release("acolyte_test_lock")
+        self.assertTrue(self._mgr_b.acquire("acolyte_test_lock", 0))
+        self._mgr_b.release("acolyte_test_lock")
+
+        with self.assertRaises(LockNotHeldException):
+            self._mgr_b.release("acolyte_test_lock")
+
+        stats = self._mgr_b.stats.snapshot()
+        self.assertEqual(stats["acquired"], 1)
+        self.assertEqual(stats["timeouts"], 2)
+
+    def testLockContext(self):
+        """测试超时以及出现异常时的释放
+        """
+        with self._mgr_a.lock("acolyte_test_lock"):
+            with self.assertRaises(LockTimeoutException):
+                with self._mgr_b.lock("acolyte_test_lock", timeout=0.2):
+                    pass
+
+        with self.assertRaises(ValueError):
+            with self._mgr_a.lock("acolyte_test_lock"):
+                raise ValueError()
+        self.assertFalse(self._mgr_a.is_held("acolyte_test_lock"))
+
+        with self._mgr_b.lock("acolyte_test_lock", timeout=0):
+            pass
+
+    def testIndependentKeys(self):
+        """测试不同的锁之间互不影响
+        """
+        self.assertTrue(self._mgr_a.acquire("acolyte_test_lock", 0))
+        self.assertTrue(
+            self._try_lock_in_thread(self._mgr_a, "acolyte_test_lock_2"))
+        self.assertFalse(
+            self._try_lock_in_thread(self._mgr_a, "acolyte_test_lock"))
+        self._mgr_a.release("acolyte_test_lock")
+
+    def testLostLock(self):
+        """测试专用连接断开之后锁的丢失
+        """
+        self.assertTrue(self._mgr_a.acquire("acolyte_test_lock", 0))
+        self.assertTrue(self._mgr_a.verify("acolyte_test_lock"))
+
+        # 连接断开，MySQL锁随之释放
+        self._mgr_a._holdings()["acolyte_test_lock"].conn.close()
+        self.assertFalse(self._mgr_a.verify("acolyte_test_lock"))
+        self.assertFalse(self._mgr_a.is_held("acolyte_test_lock"))
+        self.assertTrue(
+            self._try_lock_in_thread(self._mgr_b, "acolyte_test_lock"))
+
+        self._mgr_a.release("acolyte_test_lock")
+        self.assertEqual(self._mgr_a.stats.snapshot()["lost"], 1)
+
+    def tearDown(self):
+        self._mgr_a.close()
+        self._mgr_b.close()
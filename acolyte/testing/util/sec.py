@@ -0,0 +1,53 @@
+from acolyte.testing import EasemobFlowTestCase
+from acolyte.util.sec import TokenSigner, InvalidTokenException
+
+
+class TokenSignerTestCase(EasemobFlowTestCase):
+
+    def setUp(self):
+        self._signer = TokenSigner("test-secret", ttl=60)
+
+    def testSignAndVerify(self):
+        """测试签发并校验token
+        """
+        token, payload = self._signer.sign(
+            {"id": 1, "session_data": {"name": "山姆"}}, now=1000)
+        self.assertEqual(payload["iat"], 1000)
+        self.assertEqual(payload["exp"], 1060)
+
+        payload = self._signer.verify(token, now=1059)
+        self.assertEqual(payload["id"], 1)
+        self.assertEqual(payload["session_data"], {"name": "山姆"})
+
+        # 已经过期
+        with self.assertRaises(InvalidTokenException):
+            self._signer.verify(token, now=1060)
+
+    def testSignWithTTL(self):
+        """测试签发时指定有效期
+        """
+        token, payload = self._signer.sign({"id": 1}, now=1000, ttl=10)
+        self.assertEqual(payload["exp"], 1010)
+        self._signer.verify(token, now=1009)
+        with self.assertRaises(InvalidTokenException):
+            self._signer.verify(token, now=1010)
+
+    def testInvalidToken(self):
+        """测试格式错误、被篡改以及密钥不一致的token
+        """
+        token, _ = self._signer.sign({"id": 1})
+        body, signature = token.split(".")
+
+        for invalid_token in (
+            "你们啊！naive！",
+            "中.文",
+            None,
+            body,
+            body + "." + signature[:-1],
+            body[:-1] + "." + signature,
+        ):
+            with self.assertRaises(InvalidTokenException):
+                self._signer.verify(invalid_token)
+
+        with self.assertRaises(InvalidTokenException):
+            TokenSigner("other-secret").verify(token)
@@ -0,0 +1,10 @@
+import simplejson as json
+
+
+def load_config(config_file):
+    """读取JSON格式的配置文件，未指定时返回空配置
+    """
+    if config_file is None:
+        return {}
+    with open(config_file, "r") as f:
+        return json.load(f)
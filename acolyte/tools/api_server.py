@@ -0,0 +1,301 @@
+"""API服务的启动入口，以prefork的方式运行多个worker进程:
+
+   acolyte-api --config /etc/acolyte.json --port 8888 --processes 8
+
+   主进程只负责绑定端口以及管理worker，不会初始化任何服务，
+   数据库连接池、缓存等资源都由worker在fork之后自行创建。
+   启用--reuse-port时，各worker通过SO_REUSEPORT各自绑定端口，由内核分配连接。
+
+   信号:
+   SIGHUP          重新读取配置并平滑重启，先启动新的worker，再通知旧的worker退出
+   SIGTERM/SIGINT  通知所有worker处理完正在进行的请求之后退出
+
+   worker异常退出时会被主进程自动拉起
+"""
+
+import os
+import time
+import signal
+import asyncio
+import argparse
+from tornado.netutil import bind_sockets
+from tornado.process import cpu_count
+from acolyte.util import log
+from acolyte.util.sec import new_token_id
+from acolyte.tools import load_config
+
+
+class PreforkServer:
+
+    """管理API worker进程
+    """
+
+    def __init__(self, config_file, options):
+        """
+        :param config_file: 配置文件，平滑重启时会重新读取
+        :param options: 命令行参数，优先于配置文件中的rest_api配置
+        """
+        self._config_file = config_file
+        self._options = options
+        self._config = None
+        self._rest_api_cfg = None
+        self._sockets = None
+        # 未配置token.secret时由主进程生成，所有worker共享，平滑重启时保持不变
+        self._token_secret = None
+
+        self._generation = 0
+        self._workers = {}  # pid -> (generation, start time)
+        self._retiring = {}  # pid -> 强制结束的时间
+        self._spawn_after = 0
+
+        self._reload = False
+        self._stopping = False
+
+        self._load_config()
+
+    def _load_config(self):
+        config = load_config(self._config_file)
+        rest_api_cfg = dict(config.get("rest_api", {}))
+        for key, value in self._options.items():
+            if value is not None:
+                rest_api_cfg[key] = value
+        rest_api_cfg.setdefault("address", "")
+        rest_api_cfg.setdefault("port", 8888)
+        rest_api_cfg.setdefault("processes", 0)
+        rest_api_cfg.setdefault("reuse_port", False)
+        rest_api_cfg.setdefault("graceful_timeout", 30)
+        if rest_api_cfg["processes"] <= 0:
+            rest_api_cfg["processes"] = cpu_count()
+        config["rest_api"] = rest_api_cfg
+
+        log.load_logger_config(config)
+
+        token_cfg = dict(config.get("token", {}))
+        if not token_cfg.get("secret"):
+            if self._token_secret is None:
+                self._token_secret = new_token_id()
+            token_cfg["secret"] = self._token_secret
+            log.acolyte.warning((
+                "token.secret is not configured, use a random secret "
+                "shared by workers, tokens will be invalid after the "
+                "master restarts"))
+        config["token"] = token_cfg
+        self._config = config
+        self._rest_api_cfg = rest_api_cfg
+
+    def run(self):
+        rest_api_cfg = self._rest_api_cfg
+        if not rest_api_cfg["reuse_port"]:
+            # 在fork之前绑定端口，所有worker共享同一个监听socket
+            self._sockets = bind_sockets(
+                rest_api_cfg["port"], rest_api_cfg["address"])
+
+        signal.signal(signal.SIGHUP, self._on_reload)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+
+        log.acolyte.info((
+            "acolyte api master {pid} listening on {address}:{port}, "
+            "{processes} workers"
+        ).format(pid=os.getpid(), **rest_api_cfg))
+
+        while True:
+            self._reap()
+            if self._stopping:
+                if not self._workers:
+                    break
+            elif self._reload:
+                self._reload = False
+                self._do_reload()
+            else:
+                self._maintain()
+            self._kill_timeout_workers()
+            time.sleep(0.2)
+
+        log.acolyte.info("acolyte api master {} exit".format(os.getpid()))
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    def _on_stop(self, signum, frame):
+        if self._stopping:
+            return
+        self._stopping = True
+        self._retire(list(self._workers))
+
+    def _maintain(self):
+        """补齐当前配置所需的worker数目
+        """
+        current_workers = [
+            pid for pid, (generation, _) in self._workers.items()
+            if generation == self._generation]
+        missing = self._rest_api_cfg["processes"] - len(current_workers)
+        if missing <= 0 or time.time() < self._spawn_after:
+            return
+        for _ in range(missing):
+            self._spawn()
+
+    def _do_reload(self):
+        try:
+            self._load_config()
+        except Exception:
+            log.acolyte.exception("reload config error, keep old workers")
+            return
+        old_workers = list(self._workers)
+        self._generation += 1
+        self._spawn_after = 0
+        log.acolyte.info("reloading, generation = {}".format(self._generation))
+        self._maintain()
+        self._retire(old_workers)
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 0
+            try:
+                _run_worker(self._config, self._sockets)
+            except Exception:
+                log.acolyte.exception(
+                    "api worker {} error".format(os.getpid()))
+                exit_code = 1
+            finally:
+                os._exit(exit_code)
+        self._workers[pid] = (self._generation, time.time())
+
+    def _retire(self, pids):
+        deadline = time.time() + self._rest_api_cfg["graceful_timeout"] + 5
+        for pid in pids:
+            if pid in self._retiring:
+                continue
+            self._retiring[pid] = deadline
+            self._kill(pid, signal.SIGTERM)
+
+    def _kill(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _kill_timeout_workers(self):
+        now = time.time()
+        for pid, deadline in list(self._retiring.items()):
+            if now > deadline:
+                log.acolyte.warning(
+                    "api worker {} graceful timeout, kill it".format(pid))
+                self._kill(pid, signal.SIGKILL)
+                self._retiring[pid] = now + 5
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self._workers.pop(pid, None)
+            if worker is None:
+                continue
+            if self._retiring.pop(pid, None) is not None:
+                continue
+
+            # 非预期的退出，如果刚启动就退出了，延迟一段时间再拉起，避免频繁fork
+            generation, start_time = worker
+            log.acolyte.warning(
+                "api worker {} exit unexpectedly, status = {}".format(
+                    pid, status))
+            if time.time() - start_time < 1:
+                self._spawn_after = time.time() + 1
+
+
+def _run_worker(config, sockets):
+    """worker进程的入口，在fork之后才初始化服务以及导入handler
+    """
+    # 终端关闭时由主进程统一处理
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+
+    from tornado.ioloop import IOLoop
+    from tornado.httpserver import HTTPServer
+    from acolyte.api import BaseAPIHandler
+    from acolyte.api.app import make_app
+
+    rest_api_cfg = config["rest_api"]
+    if sockets is None:
+        sockets = bind_sockets(
+            rest_api_cfg["port"], rest_api_cfg["address"], reuse_port=True)
+
+    async def serve():
+        server = HTTPServer(make_app(config), xheaders=True)
+        server.add_sockets(sockets)
+
+        stopped = asyncio.Event()
+        loop = asyncio.get_event_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(signum, stopped.set)
+        log.acolyte.info("api worker {} started".format(os.getpid()))
+
+        await stopped.wait()
+
+        # 停止接收新的连接，等待正在处理的请求完成
+        server.stop()
+        deadline = loop.time() + rest_api_cfg["graceful_timeout"]
+        while BaseAPIHandler.inflight > 0 and loop.time() < deadline:
+            await asyncio.sleep(0.1)
+        await server.close_all_connections()
+
+        # 超时被放弃的请求以及后台action依然在线程池中执行，共享同一个截止时间
+        await loop.run_in_executor(
+            None, _drain_executors, max(deadline - loop.time(), 0))
+        log.acolyte.info("api worker {} exit".format(os.getpid()))
+
+    IOLoop.current().run_sync(serve)
+
+
+def _drain_executors(timeout):
+    """等待路由线程池以及后台action线程池中的任务执行完毕，
+       尚未开始执行的后台action会被取消并记为exception
+       :param timeout: 最长等待时间(秒)
+    """
+    from acolyte.api import BaseAPIHandler
+    from acolyte.api.route import EXECUTORS
+
+    deadline = time.time() + timeout
+    # 路由线程池中的请求可能还会分发后台action，因此先关闭路由线程池
+    for name, executor in EXECUTORS.items():
+        if not executor.shutdown(
+                wait=True, timeout=max(deadline - time.time(), 0)):
+            log.acolyte.warning(
+                "executor '{}' is still busy when worker exit".format(name))
+
+    flow_executor = BaseAPIHandler.service_container.get_service(
+        "FlowExecutorService")
+    flow_executor.drain_actions(max(deadline - time.time(), 0))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="acolyte api server")
+    parser.add_argument("--config", default=None, help="JSON格式的配置文件")
+    parser.add_argument("--address", default=None, help="监听地址")
+    parser.add_argument("--port", type=int, default=None, help="监听端口")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="worker进程数目，0为CPU核数")
+    parser.add_argument("--reuse-port", action="store_true", default=None,
+                        help="各worker通过SO_REUSEPORT独立绑定端口")
+    parser.add_argument("--graceful-timeout", type=int, default=None,
+                        help="worker退出时等待请求完成的最长时间(秒)")
+    args = parser.parse_args(argv)
+
+    server = PreforkServer(args.config, {
+        "address": args.address,
+        "port": args.port,
+        "processes": args.processes,
+        "reuse_port": args.reuse_port,
+        "graceful_timeout": args.graceful_timeout
+    })
+    server.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""对比响应序列化的性能，不需要数据库:
+
+   python -m acolyte.tools.bench_json --size 1000 --rounds 50
+
+   legacy为旧的逐对象反射 + to_json().encode()，
+   compiled为按类型缓存编码函数的to_json_bytes()
+"""
+
+import time
+import argparse
+import datetime
+import simplejson
+from acolyte.util.time import common_fmt_dt
+from acolyte.util.json import to_json_bytes
+from acolyte.core.service import Result
+from acolyte.core.view import (
+    UserSimpleView,
+    FlowTemplateView,
+    FlowTemplateSimpleView,
+    FlowSimpleInstanceView,
+    PageView
+)
+
+
+def _legacy_default(obj):
+    if isinstance(obj, datetime.datetime):
+        return common_fmt_dt(obj)
+    return obj.__dict__
+
+
+def legacy_to_json_bytes(obj):
+    return simplejson.dumps(
+        obj, default=_legacy_default, ensure_ascii=False).encode("utf-8")
+
+
+def build_template_list(size):
+    return Result.ok(data=[FlowTemplateView(
+        id_=i,
+        flow_meta="test_flow",
+        name="template_{}".format(i),
+        bind_args={"echo": {"trigger": {"b": i}, "multiply": {"c": 3}}},
+        max_run_instance=10,
+        creator_info=UserSimpleView(1, "sam@example.com", "山姆")
+    ) for i in range(size)])
+
+
+def build_instance_page(size):
+    now = datetime.datetime.now()
+    tpl_view = FlowTemplateSimpleView(1, "test_flow", "template")
+    user_view = UserSimpleView(1, "sam@example.com", "山姆")
+    return Result.ok(data=PageView([FlowSimpleInstanceView(
+        id_=i,
+        status="running",
+        description="第{}个实例".format(i),
+        current_step="echo",
+        created_on=now - datetime.timedelta(seconds=i),
+        updated_on=now,
+        flow_template_info=tpl_view,
+        creator_info=user_view
+    ) for i in range(size)], size))
+
+
+def bench(func, obj, rounds):
+    func(obj)  # 预热，编码函数在这里生成
+    begin = time.perf_counter()
+    for _ in range(rounds):
+        func(obj)
+    return (time.perf_counter() - begin) / rounds * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="json serializer benchmark")
+    parser.add_argument("--size", type=int, default=1000,
+                        help="每个列表中的对象数目")
+    parser.add_argument("--rounds", type=int, default=50, help="重复次数")
+    args = parser.parse_args(argv)
+
+    cases = (
+        ("template list", build_template_list(args.size)),
+        ("instance page", build_instance_page(args.size)),
+    )
+    for name, obj in cases:
+        if legacy_to_json_bytes(obj) != to_json_bytes(obj):
+            raise AssertionError("output mismatch: {}".format(name))
+        legacy = bench(legacy_to_json_bytes, obj, args.rounds)
+        compiled = bench(to_json_bytes, obj, args.rounds)
+        print((
+            "{name:<15} size={size}  legacy {legacy:8.3f} ms  "
+            "compiled {compiled:8.3f} ms  speedup {speedup:.2f}x"
+        ).format(name=name, size=args.size, legacy=legacy,
+                 compiled=compiled, speedup=legacy / compiled))
+
+
+if __name__ == "__main__":
+    main()
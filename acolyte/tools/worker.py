@@ -0,0 +1,49 @@
+"""action worker的启动入口，从持久化的action队列中领取后台action并执行:
+
+   acolyte-worker --config /etc/acolyte.json --concurrency 8
+"""
+
+import signal
+import argparse
+from acolyte.tools import load_config
+from acolyte.core.bootstrap import EasemobFlowBootstrap
+from acolyte.core.action_queue import ActionWorker
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="acolyte action worker")
+    parser.add_argument("--config", default=None, help="JSON格式的配置文件")
+    parser.add_argument("--concurrency", type=int, default=None,
+                        help="同时执行的action数目")
+    parser.add_argument("--poll-interval", type=float, default=None,
+                        help="队列为空时的轮询间隔(秒)")
+    parser.add_argument("--name", default=None, help="worker标识")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    worker_cfg = config.get("action_worker", {})
+
+    bootstrap = EasemobFlowBootstrap()
+    bootstrap.start(config)
+    container = bootstrap.service_container
+
+    worker = ActionWorker(
+        flow_executor=container.get_service("FlowExecutorService"),
+        action_queue=container.get_service("action_queue"),
+        concurrency=args.concurrency or worker_cfg.get("concurrency", 4),
+        poll_interval=args.poll_interval or worker_cfg.get(
+            "poll_interval", 1),
+        name=args.name
+    )
+
+    def _stop(signum, frame):
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
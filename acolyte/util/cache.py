@@ -0,0 +1,94 @@
+"""本模块包含进程内缓存方面的工具
+"""
+
+import time
+import threading
+import collections
+
+
+class LRUCache:
+
+    """线程安全的LRU缓存，同时支持过期时间
+       超出max_size时会淘汰最久未被访问的条目
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        """
+        :param max_size: 最多缓存的条目数
+        :param ttl: 条目的存活时间(秒)，小于等于0表示永不过期
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = collections.OrderedDict()  # key -> (expire_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _expire_at(self):
+        if self.ttl <= 0:
+            return None
+        return time.time() + self.ttl
+
+    def _get(self, key, now):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expire_at, value = item
+        if expire_at is not None and expire_at <= now:
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return item
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._get(key, time.time())
+            if item is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            return item[1]
+
+    def get_many(self, keys):
+        """批量获取，只返回命中的部分
+           :param keys: key列表
+           :return: 命中的key到值的字典
+        """
+        result = {}
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                item = self._get(key, now)
+                if item is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    result[key] = item[1]
+        return result
+
+    def put(self, key, value):
+        with self._lock:
+            self._put(key, value, self._expire_at())
+
+    def put_many(self, mapping):
+        with self._lock:
+            expire_at = self._expire_at()
+            for key, value in mapping.items():
+                self._put(key, value, expire_at)
+
+    def _put(self, key, value, expire_at):
+        self._data[key] = (expire_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,87 @@
+"""本模块包含并发执行方面的工具
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from acolyte.exception import EasemobFlowException
+
+
+class BoundedExecutor:
+
+    """有界的线程池，正在执行和排队等待的任务总数超过上限时，新提交的任务会被直接拒绝，
+       避免在负载过高时无限制地堆积任务
+    """
+
+    def __init__(self, max_workers, max_queue=0):
+        """
+        :param max_workers: 最大工作线程数目
+        :param max_queue: 最多允许排队等待的任务数目
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        """正在执行以及排队等待的任务数目
+        """
+        return self._pending
+
+    def is_full(self):
+        return self._pending >= self.max_workers + self.max_queue
+
+    def submit(self, fn, *args, **kwds):
+        """提交任务，返回Future对象
+           :raise ExecutorFullException: 任务数目达到上限
+        """
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorFullException(self.max_workers, self.max_queue)
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(fn, *args, **kwds)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def shutdown(self, wait=True, timeout=None):
+        """关闭线程池，不再接受新的任务
+           :param wait: 是否等待已经提交的任务执行完毕
+           :param timeout: 最长等待时间(秒)，None表示一直等待
+           :return: 已经提交的任务是否都已执行完毕，不等待时返回False
+        """
+        if not wait:
+            self._executor.shutdown(wait=False)
+            return self._pending == 0
+        if timeout is None:
+            self._executor.shutdown(wait=True)
+            return True
+        # ThreadPoolExecutor.shutdown不支持超时，在单独的线程中等待
+        waiter = threading.Thread(
+            target=self._executor.shutdown, name="acolyte-executor-shutdown")
+        waiter.daemon = True
+        waiter.start()
+        waiter.join(timeout)
+        return not waiter.is_alive()
+
+
+class ExecutorFullException(EasemobFlowException):
+
+    """BoundedExecutor中的任务数目达到上限时抛出此异常
+    """
+
+    def __init__(self, max_workers, max_queue):
+        super().__init__((
+            "Executor is full, max_workers = {max_workers}, "
+            "max_queue = {max_queue}"
+        ).format(max_workers=max_workers, max_queue=max_queue))
@@ -1,55 +1,256 @@
 import time
+import threading
+import collections
 import pymysql
-from queue import Queue
 from contextlib import contextmanager
 from acolyte.util import log
+from acolyte.util.lock import LockManager
+from acolyte.exception import EasemobFlowException
 
 
 class ConnectionPool:
 
-    """
-    基于Queue的数据库连接池
+    """弹性的数据库连接池
+       连接会在需要时才被创建，连接数目在min_pool_size和max_pool_size之间浮动，
+       后台线程负责对空闲连接进行保活，并回收空闲时间过长的连接
+
+       通过transaction()可以开启一个绑定在当前线程上的事务，
+       事务期间该线程上所有通过连接池执行的操作都会使用同一个连接，
+       并在事务结束时统一提交或者回滚
     """
 
-    def __init__(self, config, max_pool_size=20):
+    def __init__(self, config, max_pool_size=20, min_pool_size=0,
+                 checkout_timeout=10, max_idle_time=600,
+                 keepalive_interval=60, lock_max_idle=16, lock_timeout=10):
+        """
+        :param config: 数据库连接配置
+        :param max_pool_size: 最大连接数目
+        :param min_pool_size: 最少保持的连接数目
+        :param checkout_timeout: 获取连接时的最长等待时间(秒)
+        :param max_idle_time: 连接最长空闲时间(秒)，超出的连接会被回收
+        :param keepalive_interval: 保活间隔(秒)，小于等于0则不启动后台线程
+        :param lock_max_idle: 分布式锁最多保留的空闲专用连接数目
+        :param lock_timeout: 分布式锁的默认等待时间(秒)
+        """
         self.config = config
         self.max_pool_size = max_pool_size
-        self._initialize_pool()
-        log.acolyte.info(
-            "init pool config: max_pool_size = {}".format(max_pool_size))
-
-    def _initialize_pool(self):
-        self.pool = Queue(maxsize=self.max_pool_size)
-        for _ in range(0, self.max_pool_size):
-            conn = _PooledMySQLConnection(**self.config)
-            self.pool.put_nowait(conn)
-            log.acolyte.debug((
-                "init db connection "
-                "host = {host}, port = {port}, "
-                "user = {user}, db = {db}"
-            ).format(**self.config))
+        self.min_pool_size = min(min_pool_size, max_pool_size)
+        self.checkout_timeout = checkout_timeout
+        self.max_idle_time = max_idle_time
+        self.keepalive_interval = keepalive_interval
+
+        self._idle = collections.deque()  # 空闲连接，后进先出
+        self._size = 0  # 已经创建的连接数目
+        self._cond = threading.Condition()
+        self._closed = threading.Event()
+        self._local = threading.local()  # 保存当前线程的事务连接
+        # 分布式锁使用独立于连接池的专用连接
+        self.lock_manager = LockManager(
+            self._connect, lock_max_idle, lock_timeout)
+
+        if keepalive_interval > 0:
+            keepalive_thread = threading.Thread(
+                target=self._keepalive_loop, name="acolyte-db-keepalive")
+            keepalive_thread.daemon = True
+            keepalive_thread.start()
+
+        log.acolyte.info((
+            "init pool config: min_pool_size = {}, max_pool_size = {}, "
+            "checkout_timeout = {}"
+        ).format(self.min_pool_size, max_pool_size, checkout_timeout))
+
+    @property
+    def size(self):
+        """当前已经创建的连接数目
+        """
+        return self._size
+
+    @property
+    def idle_size(self):
+        """当前空闲的连接数目
+        """
+        return len(self._idle)
 
     @contextmanager
     def connection(self):
-        #  returns a db instance when one is available else waits until one is
-        connection = self.pool.get(True)
-        yield connection
-        self.return_connection(connection)
+        """借出一个连接，无论执行成功与否都会归还，
+           如果执行中出现了连接层面的错误，那么该连接会被废弃掉
+           如果当前线程处于事务中，那么直接返回事务所使用的连接
+        """
+        tx_conn = getattr(self._local, "tx_conn", None)
+        if tx_conn is not None:
+            yield tx_conn
+            return
+
+        conn = self._checkout()
+        try:
+            yield conn
+        except BaseException as e:
+            if _is_broken_connection_error(e) or not conn.safe_rollback():
+                self._discard(conn)
+            else:
+                self._checkin(conn)
+            raise
+        else:
+            self._checkin(conn)
+
+    @contextmanager
+    def transaction(self):
+        """开启一个事务，正常退出时提交，出现异常时回滚
+           如果当前线程已经处于事务中，那么直接加入外层事务，由外层事务负责提交
+
+           with pool.transaction():
+               dao_a.insert(...)
+               dao_b.update(...)
+        """
+        tx_conn = getattr(self._local, "tx_conn", None)
+        if tx_conn is not None:
+            yield tx_conn
+            return
+
+        with self.connection() as conn:
+            self._local.tx_conn = conn
+            try:
+                yield conn
+                conn.commit()
+            finally:
+                self._local.tx_conn = None
+
+    def in_transaction(self):
+        """当前线程是否处于事务当中
+        """
+        return getattr(self._local, "tx_conn", None) is not None
 
     def return_connection(self, db):
-        return self.pool.put_nowait(db)
+        return self._checkin(db)
 
     def close_all(self):
-        while not self.is_empty():
-            self.pool.get().close()
+        """关闭所有空闲连接，正在被使用的连接会在归还时关闭
+        """
+        self._closed.set()
+        self.lock_manager.close()
+        with self._cond:
+            while self._idle:
+                self._idle.pop().close()
+                self._size -= 1
+            self._cond.notify_all()
 
     def is_empty(self):
-        return self.pool.empty()
+        return not self._idle
+
+    def _checkout(self):
+        deadline = time.time() + self.checkout_timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_pool_size:
+                    # 占一个名额，在锁外面去建立连接
+                    self._size += 1
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise ConnectionPoolTimeoutException(
+                        self.checkout_timeout, self.max_pool_size)
+                self._cond.wait(remaining)
+
+        try:
+            return self._connect()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _connect(self):
+        conn = _PooledMySQLConnection(**self.config)
+        log.acolyte.debug((
+            "init db connection "
+            "host = {host}, port = {port}, "
+            "user = {user}, db = {db}"
+        ).format(**self.config))
+        return conn
+
+    def _checkin(self, conn):
+        conn.touch()
+        with self._cond:
+            if self._closed.is_set():
+                conn.close()
+                self._size -= 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        log.acolyte.warning("discard a broken db connection")
+
+    def _keepalive_loop(self):
+        while not self._closed.wait(self.keepalive_interval):
+            try:
+                self._keepalive()
+            except Exception:
+                log.acolyte.exception("db pool keepalive error")
+
+    def _keepalive(self):
+        """S1. 回收空闲时间超过max_idle_time的连接，但至少保留min_pool_size个
+           S2. 对空闲时间超过keepalive_interval的连接执行ping
+           S3. 如果连接数目不足min_pool_size，那么在后台补足
+        """
+        now = time.time()
+        evicted, to_ping = [], []
+
+        with self._cond:
+            keep = collections.deque()
+            # 从最久未被使用的连接开始检查
+            while self._idle:
+                conn = self._idle.popleft()
+                idle_time = now - conn.last_used
+                if idle_time >= self.max_idle_time and \
+                        self._size > self.min_pool_size:
+                    self._size -= 1
+                    evicted.append(conn)
+                elif idle_time >= self.keepalive_interval:
+                    to_ping.append(conn)
+                else:
+                    keep.append(conn)
+            self._idle = keep
+
+        for conn in evicted:
+            conn.close()
+
+        for conn in to_ping:
+            if conn.ping():
+                self._checkin(conn)
+            else:
+                self._discard(conn)
+
+        while not self._closed.is_set():
+            with self._cond:
+                if self._size >= self.min_pool_size:
+                    break
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            self._checkin(conn)
+
+        if evicted:
+            log.acolyte.debug(
+                "evict {} idle db connections".format(len(evicted)))
 
     def query_one(self, sql, args, mapper=None):
 
         def callback(cursor):
-            nonlocal sql, args
             num = cursor.execute(sql, args)
             if num:
                 return cursor.fetchone()
@@ -71,7 +272,6 @@ class ConnectionPool:
     def query_all(self, sql, args, mapper=None):
 
         def callback(cursor):
-            nonlocal sql, args
             num = cursor.execute(sql, args)
             if num:
                 return cursor.fetchall()
@@ -86,31 +286,41 @@ class ConnectionPool:
     def execute(self, sql, args):
 
         def callback(cursor):
-            nonlocal sql, args
             num = cursor.execute(sql, args)
             return num
         row_num = self.cursor_callback(callback)
         return row_num
 
+    def insert(self, sql, args, mapper=None):
+        """执行insert语句，返回自增ID，
+           如果指定了mapper，那么返回mapper对自增ID的转换结果
+        """
+
+        def callback(cursor):
+            cursor.execute(sql, args)
+            return cursor.lastrowid
+        last_id = self.cursor_callback(callback)
+
+        if mapper is None:
+            return last_id
+        return mapper(last_id)
+
     def cursor_callback(self, callback):
         with self.connection() as conn:
             with conn.cursor() as cursor:
                 rs = callback(cursor)
-                conn.commit()
+                # 处于事务中时，由事务统一提交
+                if not self.in_transaction():
+                    conn.commit()
                 return rs
 
-    @contextmanager
-    def lock(self, lock_key, wait_timeout=-1):
-        """基于MySQL的分布式锁，详情请参见mysql的get_lock函数
+    def lock(self, lock_key, wait_timeout=None):
+        """基于MySQL的分布式锁，详情请参见LockManager
            :param lock_key: 锁关键字，通过该关键字来标识一个锁
-           :param wait_timeout: 等待超时时间，如果为负数，那么永不超时
+           :param wait_timeout: 等待超时时间，负数表示永不超时，None表示使用默认超时时间
+           :raise LockTimeoutException: 在超时时间内没能获取到锁
         """
-        with self.connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("select get_lock(%s, %s)",
-                               (lock_key, wait_timeout))
-                yield
-                cursor.execute("select release_lock(%s)", (lock_key,))
+        return self.lock_manager.lock(lock_key, wait_timeout)
 
 
 class _PooledMySQLConnection:
@@ -119,8 +329,7 @@ class _PooledMySQLConnection:
     """
 
     def __init__(self, host, port, user, password, db,
-                 charset="utf8", cursorclass=pymysql.cursors.DictCursor,
-                 ping_interval=60):
+                 charset="utf8", cursorclass=pymysql.cursors.DictCursor):
 
         self._connection = pymysql.connect(
             host=host,
@@ -130,26 +339,33 @@ class _PooledMySQLConnection:
             db=db,
             charset=charset,
             cursorclass=pymysql.cursors.DictCursor)
-        self._last_ping = time.time()
-        self._ping_interval = ping_interval
+        self.last_used = time.time()
 
-    def _ping(self):
-        if time.time() - self._last_ping >= self._ping_interval:
-            need_re_connect = False
-            try:
-                with self._connection.cursor() as csr:
-                    csr.execute("SELECT 1", tuple())
-                    result = csr.fetchone()
-                    if not result:
-                        need_re_connect = True
-            except pymysql.err.OperationalError:
-                need_re_connect = True
+    def touch(self):
+        """记录最近一次被使用的时间
+        """
+        self.last_used = time.time()
 
-            if need_re_connect:
-                self._connection.connect()
+    def ping(self):
+        """检查连接是否可用，如果断开则尝试重连，返回连接最终是否可用
+        """
+        try:
+            self._connection.ping(reconnect=True)
+        except pymysql.err.Error:
+            return False
+        self.touch()
+        return True
+
+    def safe_rollback(self):
+        """回滚未提交的数据，返回连接是否依旧可用
+        """
+        try:
+            self._connection.rollback()
+        except pymysql.err.Error:
+            return False
+        return True
 
     def cursor(self):
-        self._ping()
         return self._connection.cursor()
 
     def commit(self):
@@ -160,3 +376,33 @@ class _PooledMySQLConnection:
 
     def rollback(self):
         return self._connection.rollback()
+
+
+# 表示连接已经断开的MySQL客户端错误码
+_CONNECTION_LOST_ERRORS = {
+    2003,  # Can't connect to MySQL server
+    2006,  # MySQL server has gone away
+    2013,  # Lost connection to MySQL server during query
+    2055,  # Lost connection to MySQL server at '%s', system error: %d
+}
+
+
+def _is_broken_connection_error(e):
+    """判断异常是否是由于连接本身损坏而引起的
+    """
+    if isinstance(e, pymysql.err.InterfaceError):
+        return True
+    return isinstance(e, pymysql.err.OperationalError) and \
+        bool(e.args) and e.args[0] in _CONNECTION_LOST_ERRORS
+
+
+class ConnectionPoolTimeoutException(EasemobFlowException):
+
+    """在checkout_timeout时间内无法从连接池中获取到连接时抛出此异常
+    """
+
+    def __init__(self, checkout_timeout, max_pool_size):
+        super().__init__((
+            "Can't get a db connection in {timeout} seconds, "
+            "all {max_pool_size} connections are in use."
+        ).format(timeout=checkout_timeout, max_pool_size=max_pool_size))
@@ -1,19 +1,105 @@
+"""本模块负责将Result、ViewObject以及领域对象序列化为json
+
+   每个类型第一次被序列化时，会根据实例的属性生成一个专用的编码函数并缓存起来，
+   之后同类型的对象只需要查一次字典即可完成转换，不再逐个对象地反射和做类型判断
+"""
+
+import json as std_json
 import simplejson
 import datetime
-from acolyte.util.time import common_fmt_dt
-from acolyte.core.service import ViewObject
+import threading
+from acolyte.util.time import COMMON_DATETIME_FORMAT
+
 
+def fmt_dt(dt):
+    """与common_fmt_dt输出一致，但是避免了strftime的格式解析开销
+    """
+    if dt.year < 1000:
+        return dt.strftime(COMMON_DATETIME_FORMAT)
+    return str(dt)[:19]
 
-def _default(obj):
-    if isinstance(obj, ViewObject) and hasattr(obj, "_to_dict"):
-        return obj._to_dict
-    if isinstance(obj, datetime.datetime):
-        return common_fmt_dt(obj)
 
+def _encode_dict(obj):
     return obj.__dict__
 
 
+class _EncoderCache:
+
+    """类型 -> 编码函数的缓存
+    """
+
+    def __init__(self):
+        self._encoders = {
+            datetime.datetime: fmt_dt,
+        }
+        self._lock = threading.Lock()
+
+    def encode(self, obj):
+        """作为simplejson的default回调，将对象转换为json兼容的结构，
+           其中嵌套的对象会由simplejson再次回调
+        """
+        try:
+            encoder = self._encoders[obj.__class__]
+        except KeyError:
+            encoder = self._compile(obj)
+        return encoder(obj)
+
+    def _compile(self, obj):
+        clazz = obj.__class__
+        to_dict = getattr(clazz, "_to_dict", None)
+        if callable(to_dict):
+            encoder = to_dict
+        elif isinstance(obj, datetime.datetime):
+            encoder = fmt_dt
+        elif hasattr(obj, "__dict__"):
+            encoder = _compile_attrs_encoder(obj)
+        else:
+            raise TypeError(
+                "Object of type {} is not JSON serializable".format(
+                    clazz.__name__))
+        with self._lock:
+            self._encoders[clazz] = encoder
+        return encoder
+
+
+def _compile_attrs_encoder(sample):
+    """根据样本实例的属性生成编码函数，
+       样本中为datetime的属性会在编码函数中直接格式化，
+       其它属性原样交给simplejson，非datetime时的取值也不受影响
+    """
+    dt_names = tuple(
+        name for name, value in sample.__dict__.items()
+        if isinstance(value, datetime.datetime))
+    if not dt_names:
+        return _encode_dict
+
+    def _encode(obj):
+        d = dict(obj.__dict__)
+        for name in dt_names:
+            value = d.get(name)
+            if value.__class__ is datetime.datetime:
+                d[name] = fmt_dt(value)
+        return d
+
+    return _encode
+
+
+_encoder_cache = _EncoderCache()
+
+# 输出给客户端时使用的encoder，可以被多个线程共享，
+# 对于包含非ASCII字符的嵌套dict，标准库的C encoder明显快于simplejson，
+# 视图对象都是树形结构，因此不需要做循环引用检查
+_response_encoder = std_json.JSONEncoder(
+    default=_encoder_cache.encode, ensure_ascii=False, check_circular=False)
+
+
 def to_json(obj, sort_keys=False, indent=None, ensure_ascii=False):
-    return simplejson.dumps(obj, default=_default,
+    return simplejson.dumps(obj, default=_encoder_cache.encode,
                             sort_keys=sort_keys, indent=indent,
                             ensure_ascii=ensure_ascii)
+
+
+def to_json_bytes(obj):
+    """序列化为UTF-8编码的json，用于输出HTTP响应
+    """
+    return _response_encoder.encode(obj).encode("utf-8")
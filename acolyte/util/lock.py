@@ -0,0 +1,353 @@
+"""本模块包含基于MySQL get_lock的分布式锁
+
+   同一个进程内对同一个锁的竞争先由该锁对应的进程内锁解决，只有竞争胜出的线程才会去访问数据库，
+   不同的锁之间互不影响。每个被持有的锁都独占一条独立于连接池的专用连接，
+   持锁期间不会占用连接池的名额，释放之后专用连接会被放回空闲列表中复用
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from acolyte.util import log
+from acolyte.exception import EasemobFlowException
+
+
+class LockManager:
+
+    """分布式锁管理器
+
+       lock_mgr = LockManager(pool._connect)
+       with lock_mgr.lock("my_lock", timeout=5):
+           ...
+
+       if lock_mgr.acquire("my_lock", timeout=0):
+           try:
+               ...
+           finally:
+               lock_mgr.release("my_lock")
+    """
+
+    def __init__(self, connect, max_idle=16, default_timeout=10):
+        """
+        :param connect: 用于创建专用连接的函数
+        :param max_idle: 最多保留的空闲专用连接数目
+        :param default_timeout: 未指定超时时间时的默认等待时间(秒)
+        """
+        self._connect = connect
+        self.max_idle = max_idle
+        self.default_timeout = default_timeout
+        self._mutex = threading.Lock()
+        self._key_locks = {}  # lock_key -> _KeyLock，没有线程使用时删除
+        self._idle = []  # 空闲的专用连接
+        self._local = threading.local()  # 当前线程持有的锁 key -> _Holding
+        self._stats = LockStats()
+
+    @property
+    def stats(self):
+        return self._stats
+
+    def is_held(self, lock_key):
+        """当前线程是否持有该锁，只检查本地的记录，不会访问数据库
+        """
+        holding = self._holdings().get(lock_key)
+        return holding is not None and holding.valid
+
+    def verify(self, lock_key):
+        """确认当前线程持有的MySQL锁依然有效，长时间持有锁的操作可以在关键步骤之前调用，
+           专用连接出错或者锁已经丢失时返回False，之后is_held同样返回False
+        """
+        holding = self._holdings().get(lock_key)
+        if holding is None or not holding.valid:
+            return False
+        try:
+            rs = _select(holding.conn, (
+                "select is_used_lock(%s) = connection_id() as r"
+            ), (lock_key, ))
+        except Exception:
+            log.acolyte.exception(
+                "verify lock '{}' error".format(lock_key))
+            holding.invalidate()
+            return False
+        if rs != 1:
+            holding.invalidate()
+            return False
+        return True
+
+    def acquire(self, lock_key, timeout=None):
+        """获取锁，同一个线程可以重复获取同一个锁
+           :param lock_key: 锁关键字
+           :param timeout: 等待时间(秒)，0表示不等待，负数表示永不超时，
+                           None表示使用default_timeout
+           :return: 是否获取成功
+        """
+        holdings = self._holdings()
+        holding = holdings.get(lock_key)
+        if holding is not None:
+            holding.count += 1
+            return True
+
+        if timeout is None:
+            timeout = self.default_timeout
+        start = time.time()
+        key_lock = self._ref_key_lock(lock_key)
+        conn = None
+        try:
+            # 先在进程内竞争
+            if timeout < 0:
+                acquired = key_lock.lock.acquire()
+            else:
+                acquired = key_lock.lock.acquire(timeout=timeout)
+            if acquired:
+                try:
+                    if timeout < 0:
+                        remaining = -1
+                    else:
+                        remaining = max(timeout - (time.time() - start), 0)
+                    conn = self._get_lock(lock_key, remaining)
+                finally:
+                    if conn is None:
+                        key_lock.lock.release()
+        finally:
+            if conn is None:
+                self._unref_key_lock(lock_key, key_lock)
+
+        wait_time = time.time() - start
+        if conn is None:
+            self._stats.record_timeout(wait_time)
+            return False
+
+        self._stats.record_acquire(wait_time)
+        holdings[lock_key] = _Holding(key_lock, conn)
+        return True
+
+    def release(self, lock_key):
+        """释放锁，重复获取的锁需要释放同样的次数
+        """
+        holdings = self._holdings()
+        holding = holdings.get(lock_key)
+        if holding is None:
+            raise LockNotHeldException(lock_key)
+
+        holding.count -= 1
+        if holding.count > 0:
+            return
+
+        del holdings[lock_key]
+        try:
+            if holding.valid:
+                self._release_lock(lock_key, holding)
+            if not holding.valid:
+                self._stats.record_lost()
+                log.acolyte.error((
+                    "lock '{}' was lost before release, "
+                    "the dedicated connection is broken"
+                ).format(lock_key))
+        finally:
+            holding.key_lock.lock.release()
+            self._unref_key_lock(lock_key, holding.key_lock)
+            self._stats.record_release(time.time() - holding.acquired_at)
+
+    @contextmanager
+    def lock(self, lock_key, timeout=None):
+        """获取锁并保证在退出时释放
+           :raise LockTimeoutException: 在超时时间内没能获取到锁
+        """
+        if not self.acquire(lock_key, timeout):
+            raise LockTimeoutException(lock_key, timeout)
+        try:
+            yield
+        finally:
+            self.release(lock_key)
+
+    def close(self):
+        """关闭所有空闲的专用连接，被持有的连接会在释放时放回空闲列表
+        """
+        with self._mutex:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            _close_quietly(conn)
+
+    def _ref_key_lock(self, lock_key):
+        with self._mutex:
+            key_lock = self._key_locks.get(lock_key)
+            if key_lock is None:
+                key_lock = self._key_locks[lock_key] = _KeyLock()
+            key_lock.refs += 1
+            return key_lock
+
+    def _unref_key_lock(self, lock_key, key_lock):
+        with self._mutex:
+            key_lock.refs -= 1
+            if key_lock.refs == 0:
+                del self._key_locks[lock_key]
+
+    def _get_lock(self, lock_key, timeout):
+        """通过专用连接获取MySQL锁
+           :return: 获取成功时返回持有该锁的连接，超时返回None
+        """
+        while True:
+            with self._mutex:
+                conn = self._idle.pop() if self._idle else None
+            reused = conn is not None
+            if conn is None:
+                conn = self._connect()
+            try:
+                rs = _select(conn, "select get_lock(%s, %s) as r",
+                             (lock_key, timeout))
+                break
+            except Exception:
+                _close_quietly(conn)
+                # 空闲的连接可能已经被服务端断开，换一条连接重试
+                if not reused:
+                    raise
+
+        # 0为超时，NULL为出错
+        if rs == 1:
+            return conn
+        self._checkin(conn)
+        return None
+
+    def _release_lock(self, lock_key, holding):
+        try:
+            rs = _select(holding.conn, "select release_lock(%s) as r",
+                         (lock_key, ))
+        except Exception:
+            log.acolyte.exception(
+                "release lock '{}' error".format(lock_key))
+            holding.invalidate()
+            return
+        if rs != 1:
+            # 连接曾经断开重连，锁早已被MySQL释放
+            holding.invalidate()
+            return
+        self._checkin(holding.conn)
+
+    def _checkin(self, conn):
+        with self._mutex:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        _close_quietly(conn)
+
+    def _holdings(self):
+        holdings = getattr(self._local, "holdings", None)
+        if holdings is None:
+            holdings = self._local.holdings = {}
+        return holdings
+
+
+def _select(conn, sql, args):
+    with conn.cursor() as cursor:
+        cursor.execute(sql, args)
+        return cursor.fetchone()["r"]
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+class _KeyLock:
+
+    """单个锁关键字的进程内锁，refs为正在等待以及持有该锁的线程数目
+    """
+
+    __slots__ = ("lock", "refs")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.refs = 0
+
+
+class _Holding:
+
+    """当前线程对一个锁的持有情况，conn为持有MySQL锁的专用连接
+    """
+
+    __slots__ = ("key_lock", "conn", "count", "acquired_at", "valid")
+
+    def __init__(self, key_lock, conn):
+        self.key_lock = key_lock
+        self.conn = conn
+        self.count = 1
+        self.acquired_at = time.time()
+        self.valid = True
+
+    def invalidate(self):
+        """专用连接出错，MySQL会自动释放该连接持有的锁
+        """
+        self.valid = False
+        _close_quietly(self.conn)
+
+
+class LockStats:
+
+    """锁的等待时间与持有时间统计，单位为秒
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.timeouts = 0
+        self.lost = 0
+        self.total_wait_time = 0
+        self.max_wait_time = 0
+        self.total_hold_time = 0
+        self.max_hold_time = 0
+
+    def record_acquire(self, wait_time):
+        with self._lock:
+            self.acquired += 1
+            self.total_wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def record_timeout(self, wait_time):
+        with self._lock:
+            self.timeouts += 1
+            self.total_wait_time += wait_time
+            self.max_wait_time = max(self.max_wait_time, wait_time)
+
+    def record_release(self, hold_time):
+        with self._lock:
+            self.total_hold_time += hold_time
+            self.max_hold_time = max(self.max_hold_time, hold_time)
+
+    def record_lost(self):
+        with self._lock:
+            self.lost += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "acquired": self.acquired,
+                "timeouts": self.timeouts,
+                "lost": self.lost,
+                "total_wait_time": self.total_wait_time,
+                "max_wait_time": self.max_wait_time,
+                "total_hold_time": self.total_hold_time,
+                "max_hold_time": self.max_hold_time,
+            }
+
+
+class LockTimeoutException(EasemobFlowException):
+
+    """在超时时间内没能获取到锁时抛出此异常
+    """
+
+    def __init__(self, lock_key, timeout):
+        super().__init__(
+            "Can't acquire lock '{lock_key}' in {timeout} seconds".format(
+                lock_key=lock_key, timeout=timeout))
+
+
+class LockNotHeldException(EasemobFlowException):
+
+    """释放当前线程并未持有的锁时抛出此异常
+    """
+
+    def __init__(self, lock_key):
+        super().__init__(
+            "Lock '{lock_key}' is not held by current thread".format(
+                lock_key=lock_key))
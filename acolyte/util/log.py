@@ -49,6 +49,9 @@ def create_logger(logger_name, handlers, level=logging.INFO,
     """
     logger = logging.getLogger(logger_name)
     logger.setLevel(level)
+    # 重复加载配置时替换掉之前的handler，避免日志重复输出
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
     for handler in handlers:
         handler.setFormatter(logging.Formatter(LOG_FORMATTER))
         logger.addHandler(handler)
@@ -1,6 +1,95 @@
+import os
+import hmac
+import time
+import base64
 import hashlib
+import simplejson as json
+from acolyte.exception import EasemobFlowException
 
 
 def sha1(text):
     sh = hashlib.sha1(text.encode())
     return sh.hexdigest()
+
+
+def new_token_id():
+    """生成随机的token编号，32位十六进制字符串
+    """
+    return os.urandom(16).hex()
+
+
+class TokenSigner:
+
+    """基于HMAC-SHA256的无状态token，token中携带了会话数据以及过期时间，
+       校验时只需要计算签名，不需要访问任何存储
+
+       格式: base64url(payload json).base64url(签名)
+    """
+
+    def __init__(self, secret, ttl=86400 * 7):
+        """
+        :param secret: 签名密钥，同一个集群中的所有节点必须一致
+        :param ttl: token的有效期(秒)
+        """
+        if isinstance(secret, str):
+            secret = secret.encode("utf-8")
+        self._secret = secret
+        self.ttl = ttl
+
+    def sign(self, payload, now=None, ttl=None):
+        """签发token，会在payload中加入签发时间iat以及过期时间exp
+           :param payload: 会话数据，必须可以被序列化为json
+           :param ttl: 本次签发的有效期(秒)，为None时使用默认的有效期
+           :return: (token, 包含了iat和exp的payload)
+        """
+        now = int(time.time() if now is None else now)
+        ttl = self.ttl if ttl is None else ttl
+        payload = dict(payload, iat=now, exp=now + ttl)
+        body = _b64encode(json.dumps(
+            payload, separators=(",", ":"), sort_keys=True).encode("utf-8"))
+        return "{}.{}".format(body, self._signature(body)), payload
+
+    def verify(self, token, now=None):
+        """校验token并返回其中的payload
+           :raise InvalidTokenException: token格式错误、签名不匹配或者已经过期
+        """
+        try:
+            token.encode("ascii")
+            body, signature = token.split(".")
+        except (AttributeError, ValueError):
+            # 包含非ASCII字符时抛出的UnicodeEncodeError也是ValueError
+            raise InvalidTokenException("malformed token")
+
+        if not hmac.compare_digest(signature, self._signature(body)):
+            raise InvalidTokenException("signature mismatch")
+
+        try:
+            payload = json.loads(_b64decode(body).decode("utf-8"))
+            exp = payload["exp"]
+        except (ValueError, TypeError, KeyError):
+            raise InvalidTokenException("malformed payload")
+
+        if exp <= (time.time() if now is None else now):
+            raise InvalidTokenException("token expired")
+        return payload
+
+    def _signature(self, body):
+        return _b64encode(hmac.new(
+            self._secret, body.encode("ascii"), hashlib.sha256).digest())
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class InvalidTokenException(EasemobFlowException):
+
+    """token不合法时抛出此异常
+    """
+
+    def __init__(self, msg):
+        super().__init__(msg)
@@ -1,5 +1,6 @@
 import re
 import locale
+import inspect
 from functools import wraps
 from typing import Any
 from types import FunctionType
@@ -17,10 +18,10 @@ class Field:
     """该类型对象用于描述一个字段的类型、转换规则、验证逻辑等等
     """
 
-    def __init__(self, name: str, type_: type, required: bool=True,
-                 default: Any=None,
-                 value_of: type or FunctionType or None=None,
-                 check_logic: FunctionType or None=None):
+    def __init__(self, name: str, type_: type, required: bool = True,
+                 default: Any = None,
+                 value_of: type or FunctionType or None = None,
+                 check_logic: FunctionType or None = None):
         """
         :param name: 字段名称
         :param type_: 期待类型
@@ -103,10 +104,11 @@ class IntField(Field):
     """该类型对象用于描述一个整数值的验证规则
     """
 
-    def __init__(self, name: str, required: bool=True,
-                 default: int=0, value_of: type or FunctionType or None=int,
-                 min_: int or None=None, max_: int or None=None,
-                 check_logic: FunctionType or None=None):
+    def __init__(self, name: str, required: bool = True,
+                 default: int = 0,
+                 value_of: type or FunctionType or None = int,
+                 min_: int or None = None, max_: int or None = None,
+                 check_logic: FunctionType or None = None):
         """
         :param min: 最小值
         :param max: 最大值
@@ -150,11 +152,12 @@ class StrField(Field):
     """该类型对象用于描述一个字符串值的验证规则
     """
 
-    def __init__(self, name: str, required: bool=True,
-                 default: int=0, value_of: type or FunctionType or None=str,
-                 min_len: int or None=None, max_len: int or None=None,
-                 regex: str or None=None,
-                 check_logic: FunctionType or None=None):
+    def __init__(self, name: str, required: bool = True,
+                 default: int = 0,
+                 value_of: type or FunctionType or None = str,
+                 min_len: int or None = None, max_len: int or None = None,
+                 regex: str or None = None,
+                 check_logic: FunctionType or None = None):
         """
         :param min_length: 允许的最小长度
         :param max_length: 允许的最大长度
@@ -260,61 +263,96 @@ class BadReq(Exception):
         return self._args
 
 
+def bad_req_result(service, mtd_name, e, messages=messages):
+    """将BadReq异常转换为Result对象，消息从service对应方法的消息集合中获取，
+       用于没有被check修饰，但需要复用某个方法错误消息的场景
+       :param service: service对象
+       :param mtd_name: 消息所属的方法名称
+       :param e: BadReq异常
+       :param messages: 消息集合
+    """
+    loc, _ = locale.getlocale(locale.LC_ALL)
+    msg = messages[loc][service.__class__.__name__][mtd_name][e.reason]
+    if e.args:
+        msg = msg.format(**e.args)
+
+    return Result.bad_request(e.reason, msg=msg)
+
+
 def check(*fields, messages=messages,
           default_validate_messages=default_validate_messages):
-    """该decorator用在service对象方法上验证参数
+    """该decorator用在service对象方法上验证参数，
+       被修饰的方法也可以是coroutine
        :param fields: 参数规则声明
        :pram messages: 消息集合
     """
 
     fields_dict = {f.name: f for f in fields}
 
+    def _check_args(args, kwds):
+        # 组装并验证参数
+        new_args = [field(arg_val)
+                    for field, arg_val in zip(fields, args)]
+        new_kwds = {arg_name: fields_dict[arg_name](arg_val)
+                    for arg_name, arg_val in kwds.items()}
+        return new_args, new_kwds
+
+    def _invalid_field_result(self, f, e):
+        full_reason = "{field_name}_{reason}".format(
+            field_name=e.field_name, reason=e.reason)
+        loc, _ = locale.getlocale(locale.LC_ALL)
+        service_id = self.__class__.__name__
+        mtd_name = f.__name__
+
+        # 先从用户messages集合中获取
+        msg = get_from_nested_dict(
+            messages, loc, service_id, mtd_name, full_reason)
+        if msg is None:
+            # 用户messages集合取不到再取默认的
+            msg = default_validate_messages[loc][e.reason]
+            if e.expect is not None or e.expect != "":
+                msg = msg.format(
+                    field_name=e.field_name, expect=e.expect)
+            else:
+                msg = msg.format(field_name=e.field_name)
+        else:
+            if e.expect is not None or e.expect != "":
+                msg = msg.format(expect=e.expect)
+
+        return Result.bad_request(full_reason, msg=msg)
+
+    def _bad_req_result(self, f, e):
+        return bad_req_result(self, f.__name__, e, messages)
+
     def _check(f):
 
+        if inspect.iscoroutinefunction(f):
+
+            @wraps(f)
+            async def _async_func(self, *args, **kwds):
+                try:
+                    new_args, new_kwds = _check_args(args, kwds)
+                except InvalidFieldException as e:
+                    return _invalid_field_result(self, f, e)
+                else:
+                    try:
+                        return await f(self, *new_args, **new_kwds)
+                    except BadReq as e:
+                        return _bad_req_result(self, f, e)
+
+            return _async_func
+
         @wraps(f)
         def _func(self, *args, **kwds):
-            nonlocal fields_dict
-
             try:
-                # 组装并验证参数
-                new_args = [field(arg_val)
-                            for field, arg_val in zip(fields, args)]
-                new_kwds = {arg_name: fields_dict[arg_name](arg_val)
-                            for arg_name, arg_val in kwds.items()}
+                new_args, new_kwds = _check_args(args, kwds)
             except InvalidFieldException as e:
-                full_reason = "{field_name}_{reason}".format(
-                    field_name=e.field_name, reason=e.reason)
-                loc, _ = locale.getlocale(locale.LC_ALL)
-                service_id = self.__class__.__name__
-                mtd_name = f.__name__
-
-                # 先从用户messages集合中获取
-                msg = get_from_nested_dict(
-                    messages, loc, service_id, mtd_name, full_reason)
-                if msg is None:
-                    # 用户messages集合取不到再取默认的
-                    msg = default_validate_messages[loc][e.reason]
-                    if e.expect is not None or e.expect != "":
-                        msg = msg.format(
-                            field_name=e.field_name, expect=e.expect)
-                    else:
-                        msg = msg.format(field_name=e.field_name)
-                else:
-                    if e.expect is not None or e.expect != "":
-                        msg = msg.format(expect=e.expect)
-
-                return Result.bad_request(full_reason, msg=msg)
+                return _invalid_field_result(self, f, e)
             else:
                 try:
                     return f(self, *new_args, **new_kwds)
                 except BadReq as e:
-                    loc, _ = locale.getlocale(locale.LC_ALL)
-                    msg = messages[loc][
-                        self.__class__.__name__][f.__name__][e.reason]
-                    if e.args:
-                        msg = msg.format(**e.args)
-
-                    return Result.bad_request(e.reason, msg=msg)
+                    return _bad_req_result(self, f, e)
 
         return _func
 
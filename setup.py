@@ -2,7 +2,7 @@ import setuptools
 from acolyte import VERSION
 
 install_requires = [
-    "tornado >= 4.4.0",
+    "tornado >= 5.0",
     "simplejson >= 3.8.2",
     "PyMySQL >= 0.7.9",
     "fixtures >= 3.0.0",
@@ -24,7 +24,8 @@ setuptools.setup(
     install_requires=install_requires,
     entry_points={
         "console_scripts": [
-
+            "acolyte-worker = acolyte.tools.worker:main",
+            "acolyte-api = acolyte.tools.api_server:main",
         ],
         "acolyte.job": [
             "programmer = acolyte.builtin_ext.mooncake:ProgrammerJob",
@@ -0,0 +1,12 @@
+DROP TABLE IF EXISTS `action_queue`;
+CREATE TABLE `action_queue` (
+  id int primary key auto_increment comment "队列编号",
+  job_action_id int not null comment "待执行的job action",
+  lease_owner varchar(64) not null default "" comment "当前持有租约的worker",
+  lease_expire datetime not null comment "租约到期时间，到期后可以被其它worker领取",
+  attempts int not null default 0 comment "已经被领取的次数",
+  created_on datetime not null comment "入队时间",
+  unique key uk_job_action_id (job_action_id),
+  key idx_lease_expire (lease_expire),
+  key idx_lease_owner (lease_owner)
+) engine=InnoDB, default charset utf8;
@@ -0,0 +1,8 @@
+DROP TABLE IF EXISTS `change_log`;
+CREATE TABLE `change_log` (
+  id int primary key auto_increment comment "变更编号",
+  entity varchar(32) not null comment "发生变更的实体类型",
+  entity_id int not null comment "发生变更的实体ID",
+  created_on datetime not null comment "变更时间",
+  key idx_created_on (created_on)
+) engine=InnoDB, default charset utf8;
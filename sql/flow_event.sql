@@ -0,0 +1,14 @@
+DROP TABLE IF EXISTS `flow_event`;
+CREATE TABLE `flow_event` (
+  id int primary key auto_increment comment "事件编号，各节点据此增量同步",
+  flow_instance_id int not null comment "所属的flow instance",
+  flow_template_id int not null comment "flow instance所属的flow template",
+  initiator int not null comment "flow instance的发起人",
+  event_type varchar(32) not null comment "事件类型",
+  step varchar(255) not null default "" comment "事件相关的step",
+  created_on datetime not null comment "事件发生时间",
+  key idx_created_on (created_on),
+  key idx_flow_instance_id (flow_instance_id, id),
+  key idx_flow_template_id (flow_template_id, id),
+  key idx_initiator (initiator, id)
+) engine=InnoDB, default charset utf8;
@@ -3,9 +3,13 @@ CREATE TABLE `flow_instance` (
   id int primary key auto_increment comment "运行实例ID",
   flow_template_id int not null comment "隶属的flow_template",
   initiator int not null comment "flow发起人",
-  current_step varchar(32) not null comment "当前执行到的step",
+  current_step varchar(255) not null comment "当前执行到的step，并行执行时以逗号分隔",
   status varchar(32) not null comment "flow执行状态",
   description varchar(1000) not null comment "flow描述",
   created_on datetime not null comment "flow instance创建时间",
-  updated_on datetime not null comment "最近更新时间"
+  updated_on datetime not null comment "最近更新时间",
+  version int not null default 0 comment "版本号，每次状态变化时递增，用于乐观并发控制",
+  key idx_status (status, id),
+  key idx_template (flow_template_id, id),
+  key idx_template_status (flow_template_id, status, id)
 ) engine=InnoDB, default charset utf8;
@@ -0,0 +1,5 @@
+DROP TABLE IF EXISTS `flow_instance_counter`;
+CREATE TABLE `flow_instance_counter` (
+  flow_template_id int primary key comment "对应的flow template",
+  running_num int not null default 0 comment "处于init和running状态的实例数目"
+) engine=InnoDB, default charset utf8;
@@ -6,6 +6,9 @@ CREATE TABLE `job_action_data` (
   actor int not null comment "该动作执行人",
   arguments text not null comment "执行该action所需的参数",
   data text not null comment "执行该动作后回填的数据",
+  status varchar(20) not null default "finished" comment "执行状态",
   created_on datetime not null comment "开始执行时间",
-  finished_on datetime not null comment "结束时间"
+  updated_on datetime not null comment "最近更新时间",
+  key idx_job_instance_action (job_instance_id, action),
+  key idx_job_instance_id (job_instance_id, id)
 ) engine=InnoDB, default charset utf8;
@@ -0,0 +1,9 @@
+DROP TABLE IF EXISTS `token_revocation`;
+CREATE TABLE `token_revocation` (
+  id int primary key auto_increment comment "吊销记录编号，各节点据此增量同步",
+  token_id char(32) not null comment "被吊销的token编号",
+  user_id int not null comment "token所属用户",
+  expires_on datetime not null comment "token本身的过期时间，过期之后记录即可清理",
+  created_on datetime not null comment "吊销时间",
+  key idx_expires_on (expires_on)
+) engine=InnoDB, default charset utf8;
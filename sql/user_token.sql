@@ -1,7 +1,8 @@
 DROP TABLE IF EXISTS `user_token`;
 create table user_token(
   id int primary key comment "用户ID",
-  token char(40) not null comment "token",
+  token char(32) not null comment "最近一次签发的token编号",
   session_data varchar(1000) not null comment "会话数据",
-  created_on datetime not null comment "创建时间"
-) engine=memory, default charset utf8;
\ No newline at end of file
+  created_on datetime not null comment "创建时间",
+  expires_on datetime not null comment "过期时间"
+) engine=InnoDB, default charset utf8;